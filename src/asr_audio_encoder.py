@@ -0,0 +1,74 @@
+import io
+import numpy as np
+
+# 音声データの圧縮（FLAC, OGG_OPUS）に使用するライブラリ
+# LINEAR16のまま送信する場合は不要
+try:
+	import soundfile
+except ImportError:
+	soundfile = None
+
+#
+# 音声認識に送信する音声データを逐次圧縮するクラス
+# マイク入力（LINEAR16）を少しずつ受け取り、圧縮済みのデータを少しずつ返す
+#
+class StreamingAudioEncoder(object):
+
+	# 音声認識の符号化方式とsoundfileのフォーマットの対応
+	FORMATS = {
+		'FLAC': ('FLAC', 'PCM_16'),
+		'OGG_OPUS': ('OGG', 'OPUS'),
+	}
+
+	# 符号化方式とサンプリングレートを指定する
+	def __init__(self, encoding, rate, channels=1):
+
+		if soundfile is None:
+			raise ImportError('音声データの圧縮には soundfile が必要です（pip install soundfile）')
+
+		if encoding not in self.FORMATS:
+			raise ValueError('未対応の符号化方式です: %s' % encoding)
+
+		self.encoding = encoding
+
+		# 圧縮データの書き込み先
+		# 圧縮ライブラリがヘッダを書き換えるためにシークすることがあるのでメモリ上のファイルとする
+		self._out = io.BytesIO()
+
+		# 送信済みのバイト数
+		self._sent = 0
+
+		fmt, subtype = self.FORMATS[encoding]
+		self._file = soundfile.SoundFile(
+			self._out, mode='w',
+			samplerate=rate, channels=channels,
+			format=fmt, subtype=subtype
+		)
+
+	# LINEAR16の音声データを受け取り、新たに得られた圧縮データを返す
+	# 圧縮はブロック単位で行われるため、空のデータが返ることもある
+	def encode(self, data):
+
+		samples = np.frombuffer(data, dtype=np.int16)
+		self._file.write(samples)
+		self._file.flush()
+
+		return self._read_new_data()
+
+	# 残りのデータを圧縮して返す（発話終了時に呼び出す）
+	def finish(self):
+
+		# close時にヘッダが書き換えられることがあるが、送信済みの部分は対象外とする
+		self._file.close()
+		return self._read_new_data()
+
+	# まだ送信していない圧縮データを取り出す
+	def _read_new_data(self):
+
+		buff = self._out.getbuffer()
+		end = len(buff)
+		data = bytes(buff[self._sent:end])
+		buff.release()
+		self._sent = end
+
+		return data
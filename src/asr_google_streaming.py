@@ -12,6 +12,9 @@ import pyaudio
 # 入力音声データを保持するデータキュー
 from six.moves import queue
 
+# 送信する音声データの圧縮
+from asr_audio_encoder import StreamingAudioEncoder
+
 #
 # Google Streaming ASRを用いて音声認識を行うクラス群
 #
@@ -72,7 +75,7 @@ class MicrophoneStream(object):
 			chunk = self.buff.get()
 			if chunk is None:
 				return
-			data = [chunk]
+			chunks = [chunk]
 
 			# まだキューにデータが残っていれば全て取得する
 			while True:
@@ -80,12 +83,16 @@ class MicrophoneStream(object):
 					chunk = self.buff.get(block=False)
 					if chunk is None:
 						return
-					data.append(chunk)
+					chunks.append(chunk)
 				except queue.Empty:
 					break
 			
 			# yieldにすることでキューのデータを随時取得できるようにする
-			yield b''.join(data)
+			# データが１つだけならコピーせずにそのまま渡し、複数あれば１回のコピーで連結する
+			if len(chunks) == 1:
+				yield chunks[0]
+			else:
+				yield b''.join(chunks)
 
 	# 終了時の処理
 	# 音声認識を終了したいときにはこの関数を呼び出す
@@ -112,7 +119,10 @@ class GoogleStreamingASR(object):
 
 	# 音声認識インタフェースを初期化
 	# サンプリングレートとマイク入力のためのクラスのインスタンスを受け取る
-	def __init__(self, rate, microphone_stream):
+	# encoding には送信する音声データの形式（'LINEAR16', 'FLAC', 'OGG_OPUS'）を指定する
+	# request_bytes_min 以上のデータが溜まるまで送信をまとめ、1回の送信は request_bytes_max 以下とする
+	# max_alternatives には確定結果の候補（N-best）の最大数を指定する
+	def __init__(self, rate, microphone_stream, encoding='LINEAR16', request_bytes_min=0, request_bytes_max=25600, max_alternatives=1):
 		
 		# Google音声認識APIを使用するための認証キーの設定
 		path_key = './google-credentials.json'		# 認証キーのファイルパスを指定する
@@ -124,11 +134,18 @@ class GoogleStreamingASR(object):
 		# 音声認識クライアントの初期化
 		self.client = speech.SpeechClient()
 
+		# 送信する音声データのパラメータ
+		self.rate = rate
+		self.encoding = encoding
+		self.request_bytes_min = request_bytes_min
+		self.request_bytes_max = request_bytes_max
+
 		# 音声認識の設定
 		self._config = speech.RecognitionConfig(
-			encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16,		# 音声データの形式
+			encoding = speech.RecognitionConfig.AudioEncoding[encoding],		# 音声データの形式
 			sample_rate_hertz = rate,		# サンプリングレート
-			language_code = 'ja-JP'			# 言語設定
+			language_code = 'ja-JP',		# 言語設定
+			max_alternatives = max_alternatives		# 認識結果の候補の最大数
 		)
 
 		# ストリーミング音声認識の設定
@@ -170,11 +187,54 @@ class GoogleStreamingASR(object):
 				# マイク入力を終了
 				self.microphone_stream.exit()
 
+	# マイク入力の音声データを必要に応じて圧縮し、送信する単位にまとめる
+	def generate_audio_content(self):
+
+		# 圧縮の準備
+		encoder = None
+		if self.encoding != 'LINEAR16':
+			encoder = StreamingAudioEncoder(self.encoding, self.rate)
+
+		# 送信前のデータを溜めておくバッファ（使い回す）
+		buff = bytearray()
+
+		for content in self.microphone_stream.generator():
+
+			if encoder is not None:
+				content = encoder.encode(content)
+			buff += content
+
+			# 一定量溜まるまでは送信しない
+			if len(buff) == 0 or len(buff) < self.request_bytes_min:
+				continue
+
+			for request in self._split_requests(buff):
+				yield request
+
+		# 音声入力が終了したら残りのデータを送信
+		if encoder is not None:
+			buff += encoder.finish()
+		for request in self._split_requests(buff):
+			yield request
+
+	# バッファのデータを1回の送信の上限を超えないように分割し、バッファを空にする
+	# 送信するデータ（bytes）はリクエストに渡すため必ず作成するが、memoryviewで切り出すことで
+	# 途中のコピー（スライスによるbytearrayの作成・先頭の削除による詰め直し）は行わない
+	def _split_requests(self, buff):
+
+		requests = []
+		with memoryview(buff) as view:
+			for start in range(0, len(buff), self.request_bytes_max):
+				requests.append(bytes(view[start:start + self.request_bytes_max]))
+		del buff[:]
+
+		return requests
+
 	# 音声認識APIの実行して最終的な認識結果を得る
 	def get_asr_result(self):
 
 		# マイク入力に応じてストリーミング音声認識を実行
-		audio_generator = self.microphone_stream.generator()
+		audio_generator = self.generate_audio_content()
 		requests = (speech.StreamingRecognizeRequest(audio_content=content)
 			for content in audio_generator)
 			
@@ -185,6 +245,18 @@ class GoogleStreamingASR(object):
 		# 認識結果を返す
 		return self.final_asr_result
 
+	# 確定結果の候補（N-best）を（認識結果の文, 信頼度）のlistで返す
+	# 信頼度は1位の候補にしか付かないことがあり、その場合は0.0となる
+	def get_nbest(self, result=None):
+
+		if result is None:
+			result = getattr(self, 'final_asr_result', None)
+
+		if not hasattr(result, 'alternatives'):
+			return []
+
+		return [(alternative.transcript, alternative.confidence) for alternative in result.alternatives]
+
 if __name__ == '__main__':
 	# サンプリングレートは16000Hz
 	# 音声データを受け取る（処理する）単位は 1600サンプル = 0.1秒
@@ -2,6 +2,8 @@ import os
 import numpy as np
 import math
 import struct
+import time
+import threading
 
 # Google音声認識を使用するためのライブラリ
 from google.cloud import speech
@@ -12,6 +14,12 @@ import pyaudio
 # 入力音声データを保持するデータキュー
 from six.moves import queue
 
+# 送信する音声データの圧縮
+from asr_audio_encoder import StreamingAudioEncoder
+
+# 処理時間の計測
+from tracer import tracer
+
 #
 # Google Streaming ASRを用いて音声認識を行うクラス群
 # 音声の開始と終了は独自のVADを実装（MicrophoneStreamクラス内）
@@ -25,7 +33,8 @@ class MicrophoneStream(object):
 	
 	# 音声入力ストリームを初期化する
 	# マイク入力のサンプリングレートと音声データを受け取る単位（サンプル数）を指定する
-	def __init__(self, rate, chunk):
+	# speech_start_callback には発話区間の開始を認定したときに呼び出す関数を指定する（再生中の音声を止めるなど）
+	def __init__(self, rate, chunk, speech_start_callback=None):
 		
 		# マイク入力のパラメータ
 		self.rate = rate		# サンプリングレート
@@ -45,6 +54,13 @@ class MicrophoneStream(object):
 		self.count_off = 0				# 現在まででしきい値以下の区間が連続している数
 		self.end = False				# 発話が終了したか
 		self.str_current_power = ''		# 現在のパワーの値を確認するための文字列（音声認識のクラスから参照）
+
+		# 発話区間の開始を認定したときに呼び出す関数
+		self.speech_start_callback = speech_start_callback
+
+		# 音声入力の開始を新しいターンの開始とする
+		# 発話区間の検出はコールバック（別スレッド）で行われるため、ターン番号を保持しておく
+		self.turn = tracer.new_turn()
 		
 		# pyaudioの初期化
 		self.audio_interface = pyaudio.PyAudio()
@@ -92,6 +108,11 @@ class MicrophoneStream(object):
 			if count_on_sec >= self.TH_VAD_LENGTH_START:
 				self.is_speaking = True
 				self.count_on = 0
+				tracer.event('vad.start', self.turn)
+
+				# 発話の開始を通知
+				if self.speech_start_callback is not None:
+					self.speech_start_callback()
 		
 		# 発話区間を認定したあとに、音声パワーがしきい値の場合
 		if power < self.TH_VAD and self.is_speaking:
@@ -106,6 +127,7 @@ class MicrophoneStream(object):
 			if count_off_sec >= self.TH_VAD_LENGTH_END:
 				self.end = True
 				self.count_off = False
+				tracer.event('vad.end', self.turn)
 
 				# データキューにNoneを入力することで音声認識を終了させる（最終結果を得る）
 				self.buff.put(None)
@@ -131,7 +153,7 @@ class MicrophoneStream(object):
 			chunk = self.buff.get()
 			if chunk is None:
 				return
-			data = [chunk]
+			chunks = [chunk]
 
 			# まだキューにデータが残っていれば全て取得する
 			while True:
@@ -139,17 +161,25 @@ class MicrophoneStream(object):
 					chunk = self.buff.get(block=False)
 					if chunk is None:
 						return
-					data.append(chunk)
+					chunks.append(chunk)
 				except queue.Empty:
 					break
 			
 			# yieldにすることでキューのデータを随時取得できるようにする
-			yield b''.join(data)
+			# データが１つだけならコピーせずにそのまま渡し、複数あれば１回のコピーで連結する
+			if len(chunks) == 1:
+				yield chunks[0]
+			else:
+				yield b''.join(chunks)
 
 	# 終了時の処理
 	# 音声認識を終了したいときにはこの関数を呼び出す
 	def exit(self):
 
+		# 既に終了していれば何もしない（早期終了と確定結果の両方から呼ばれることがある）
+		if self.closed:
+			return
+
 		# 音声ストリームを終了
 		self.audio_stream.stop_stream()
 		self.audio_stream.close()
@@ -171,7 +201,14 @@ class GoogleStreamingASR(object):
 
 	# 音声認識インタフェースを初期化
 	# サンプリングレートとマイク入力のためのクラスのインスタンスを受け取る
-	def __init__(self, rate, microphone_stream):
+	# encoding には送信する音声データの形式（'LINEAR16', 'FLAC', 'OGG_OPUS'）を指定する
+	# request_bytes_min 以上のデータが溜まるまで送信をまとめ、1回の送信は request_bytes_max 以下とする
+	# endpoint_checker には途中結果の文を受け取り言語理解結果（スロットのlist）を返す関数を指定する
+	# 途中結果が安定していて、かつ言語理解結果が得られた場合は確定結果を待たずに認識を終了する
+	# interim_callback には途中結果の文を受け取る関数を指定する（投機的な処理などに使用）
+	# max_alternatives には確定結果の候補（N-best）の最大数を指定する
+	def __init__(self, rate, microphone_stream, encoding='LINEAR16', request_bytes_min=0, request_bytes_max=25600,
+		endpoint_checker=None, stable_time=0.3, stability_threshold=0.8, interim_callback=None, max_alternatives=1):
 		
 		# Google音声認識APIを使用するための認証キーの設定
 		path_key = './google-credentials.json'		# 認証キーのファイルパスを指定する
@@ -183,11 +220,18 @@ class GoogleStreamingASR(object):
 		# 音声認識クライアントの初期化
 		self.client = speech.SpeechClient()
 
+		# 送信する音声データのパラメータ
+		self.rate = rate
+		self.encoding = encoding
+		self.request_bytes_min = request_bytes_min
+		self.request_bytes_max = request_bytes_max
+
 		# 音声認識の設定
 		self._config = speech.RecognitionConfig(
-			encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16,		# 音声データの形式
+			encoding = speech.RecognitionConfig.AudioEncoding[encoding],		# 音声データの形式
 			sample_rate_hertz = rate,		# サンプリングレート
-			language_code = 'ja-JP'			# 言語設定
+			language_code = 'ja-JP',		# 言語設定
+			max_alternatives = max_alternatives		# 認識結果の候補の最大数
 		)
 
 		# ストリーミング音声認識の設定
@@ -196,11 +240,34 @@ class GoogleStreamingASR(object):
 			interim_results=True
 		)
 
+		# 途中結果による早期の発話終了判定のパラメータ
+		self.endpoint_checker = endpoint_checker
+		self.stable_time = stable_time						# [sec] 途中結果がこの時間以上変化しなければ安定とみなす
+		self.stability_threshold = stability_threshold		# 途中結果の安定度（0.0 ~ 1.0）がこれ以上なら安定とみなす
+
+		# 早期の発話終了判定のための変数
+		self.last_interim_sentence = None		# 直前の途中結果の文
+		self.last_interim_result = None			# 直前の途中結果
+		self.last_interim_changed = 0.0			# 途中結果の文が最後に変化した時刻
+		self.last_checked_sentence = None		# 最後に言語理解を行った途中結果の文
+		self.is_early_endpoint = False			# 途中結果で認識を終了したか
+		self.early_slu_result = None			# 早期終了時の言語理解結果（後段でそのまま使用できる）
+
+		# 判定は認識結果の受信と音声データの送信の両方から行われるため排他制御する
+		self.endpoint_lock = threading.Lock()
+
+		# 途中結果を受け取る関数
+		self.interim_callback = interim_callback
+
 	# 音声認識結果を受信したときの処理
 	def recieve_asr_result(self, responses):
 		
 		# responseはイテレータのため、新たな認識結果が得られる度にこのループが実行される
 		for response in responses:
+
+			# 音声データの送信側で早期終了した場合は以降の結果を使用しない
+			if self.is_early_endpoint:
+				break
 			
 			# 認識結果が無効であれば処理しない
 			if not response.results:
@@ -222,31 +289,197 @@ class GoogleStreamingASR(object):
 				
 				# 途中の認識結果を表示
 				print(u'\r' + tmp + '途中結果: ' + result_sentence, end='')
+
+				# 途中結果を受け取る関数を呼び出す
+				if self.interim_callback is not None:
+					self.interim_callback(result_sentence)
+
+				# 途中結果で発話が完結していれば確定結果を待たずに終了
+				if self.endpoint_checker is not None and self.check_early_endpoint(result, result_sentence):
+					break
 			
 			# 確定した認識結果の場合
 			# マイク入力を終了する
+			# 早期終了の判定と同時に起きても結果が入れ替わらないよう、ロックを取得して行う
 			else:
-				# 認識結果データを保存
-				self.final_asr_result = result
-				
-				# マイク入力を終了
-				self.microphone_stream.exit()
+				with self.endpoint_lock:
+
+					# 既に早期終了していれば、その結果（言語理解に使った文）を優先する
+					if self.is_early_endpoint:
+						break
+
+					# 認識結果データを保存
+					self.final_asr_result = result
+					tracer.event('asr.final')
+					
+					# マイク入力を終了
+					self.microphone_stream.exit()
+
+	# 途中結果が安定し、かつ言語理解結果が得られるかを判定する
+	# 条件を満たせば途中結果を最終結果として保存し、マイク入力を終了する
+	def check_early_endpoint(self, result, result_sentence):
+
+		with self.endpoint_lock:
+
+			# 別スレッドの判定で既に早期終了していれば何もしない
+			if self.is_early_endpoint:
+				return True
+
+			now = time.monotonic()
+
+			# 途中結果の文が変化した場合
+			if result_sentence != self.last_interim_sentence:
+				self.last_interim_sentence = result_sentence
+				self.last_interim_result = result
+				self.last_interim_changed = now
+
+				# 音声認識側の安定度が低ければまだ変化する可能性がある
+				if result.stability < self.stability_threshold:
+					return False
+
+			# 変化していなくても一定時間経過していなければ判定しない
+			elif now - self.last_interim_changed < self.stable_time:
+				return False
+
+			return self._early_endpoint(result, result_sentence)
+
+	# 直前の途中結果が一定時間変化していないかを判定する
+	# ユーザが話し終えると途中結果は届かなくなるため、_run_endpoint_timer から定期的に呼び出す
+	def check_early_endpoint_by_time(self):
+
+		with self.endpoint_lock:
+
+			if self.is_early_endpoint or self.final_asr_result is not None or self.last_interim_result is None:
+				return False
+
+			if time.monotonic() - self.last_interim_changed < self.stable_time:
+				return False
+
+			return self._early_endpoint(self.last_interim_result, self.last_interim_sentence)
+
+	# 言語理解結果が得られれば早期終了する
+	def _early_endpoint(self, result, result_sentence):
+
+		# 同じ文の言語理解結果は変わらないため、一度だけ行う
+		if result_sentence == self.last_checked_sentence:
+			return False
+		self.last_checked_sentence = result_sentence
+
+		# 言語理解を行い、結果が得られなければ発話は完結していないとみなす
+		slu_result = self.endpoint_checker(result_sentence)
+		if not slu_result:
+			return False
+
+		# 認識結果データと言語理解結果を保存
+		self.final_asr_result = result
+		self.early_slu_result = slu_result
+		self.is_early_endpoint = True
+		tracer.event('asr.early_endpoint')
+
+		# マイク入力を終了
+		self.microphone_stream.exit()
+
+		return True
+
+	# 途中結果が届かない間も早期終了を判定するスレッドの処理
+	# 言語理解には時間がかかるため、音声データを送信するスレッドでは行わない
+	def _run_endpoint_timer(self, finished):
+
+		while not finished.wait(self.stable_time / 2):
+			if self.check_early_endpoint_by_time():
+				break
+
+	# マイク入力の音声データを必要に応じて圧縮し、送信する単位にまとめる
+	def generate_audio_content(self):
+
+		# 圧縮の準備
+		encoder = None
+		if self.encoding != 'LINEAR16':
+			encoder = StreamingAudioEncoder(self.encoding, self.rate)
+
+		# 送信前のデータを溜めておくバッファ（使い回す）
+		buff = bytearray()
+
+		for content in self.microphone_stream.generator():
+
+			if encoder is not None:
+				content = encoder.encode(content)
+			buff += content
+
+			# 一定量溜まるまでは送信しない
+			if len(buff) == 0 or len(buff) < self.request_bytes_min:
+				continue
+
+			for request in self._split_requests(buff):
+				yield request
+
+		# 音声入力が終了したら残りのデータを送信
+		if encoder is not None:
+			buff += encoder.finish()
+		for request in self._split_requests(buff):
+			yield request
+
+	# バッファのデータを1回の送信の上限を超えないように分割し、バッファを空にする
+	# 送信するデータ（bytes）はリクエストに渡すため必ず作成するが、memoryviewで切り出すことで
+	# 途中のコピー（スライスによるbytearrayの作成・先頭の削除による詰め直し）は行わない
+	def _split_requests(self, buff):
+
+		requests = []
+		with memoryview(buff) as view:
+			for start in range(0, len(buff), self.request_bytes_max):
+				requests.append(bytes(view[start:start + self.request_bytes_max]))
+		del buff[:]
+
+		return requests
 
 	# 音声認識APIの実行して最終的な認識結果を得る
+	@tracer.trace('asr.get_asr_result')
 	def get_asr_result(self):
 
-		# マイク入力に応じてストリーミング音声認識を実行
-		audio_generator = self.microphone_stream.generator()
-		requests = (speech.StreamingRecognizeRequest(audio_content=content)
-			for content in audio_generator)
-			
-		# 認識されるとrecieve_asr_result関数が呼ばれる
-		responses = self.client.streaming_recognize(self.streaming_config, requests)
-		self.recieve_asr_result(responses)
+		# 早期の発話終了判定の状態を初期化
+		self.last_interim_sentence = None
+		self.last_interim_result = None
+		self.last_checked_sentence = None
+		self.is_early_endpoint = False
+		self.early_slu_result = None
+		self.final_asr_result = None
+
+		# 途中結果が届かない間の早期終了の判定は別スレッドで行う
+		finished = threading.Event()
+		endpoint_timer = None
+		if self.endpoint_checker is not None:
+			endpoint_timer = threading.Thread(target=self._run_endpoint_timer, args=(finished,), daemon=True)
+			endpoint_timer.start()
+
+		try:
+			# マイク入力に応じてストリーミング音声認識を実行
+			audio_generator = self.generate_audio_content()
+			requests = (speech.StreamingRecognizeRequest(audio_content=content)
+				for content in audio_generator)
+				
+			# 認識されるとrecieve_asr_result関数が呼ばれる
+			responses = self.client.streaming_recognize(self.streaming_config, requests)
+			self.recieve_asr_result(responses)
+		finally:
+			finished.set()
+			if endpoint_timer is not None:
+				endpoint_timer.join()
 
 		# 認識結果を返す
 		return self.final_asr_result
 
+	# 確定結果の候補（N-best）を（認識結果の文, 信頼度）のlistで返す
+	# 信頼度は1位の候補にしか付かないことがあり、その場合は0.0となる
+	def get_nbest(self, result=None):
+
+		if result is None:
+			result = getattr(self, 'final_asr_result', None)
+
+		if not hasattr(result, 'alternatives'):
+			return []
+
+		return [(alternative.transcript, alternative.confidence) for alternative in result.alternatives]
+
 if __name__ == '__main__':
 
 	# サンプリングレートは16000Hz
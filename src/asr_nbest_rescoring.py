@@ -0,0 +1,112 @@
+import math
+
+# 認識結果の正規化
+from text_normalizer import normalize
+
+#
+# 音声認識のN-bestから、対話の状態に合う候補を選ぶクラス
+#
+# 全ての候補を正規化（text_normalizer.py）してからまとめて言語理解し（SluRule.parse_frame_batch・SluML.extract_slot_batch）、
+# 音声認識の信頼度と、対話管理が現在必要としているスロット（expected_slots）が得られたかどうかで
+# 各候補のスコアを求め、最もスコアの高い候補とその言語理解結果を選ぶ
+#
+# スコア = log(音声認識の信頼度) + expected_weight × 必要なスロットの数 + other_weight × それ以外のスロットの数
+#
+# 使用例
+#   asrStream = GoogleStreamingASR(RATE, micStream, max_alternatives=5)
+#   result_asr = asrStream.get_asr_result()
+#   rescorer = NBestRescorer(slu_parser.parse_frame_batch, dm)
+#   sentence, result_slu, score = rescorer.select(asrStream.get_nbest(result_asr))
+#
+
+class NBestRescorer(object):
+
+	# slu_batch_function : 文のlistを受け取り、文毎のスロットのlistを返す関数
+	# dm : 対話管理（expected_slots 関数を持つもの : DmFst, DmFrame）
+	# rank_decay : 信頼度が得られない候補は、1位の信頼度に順位毎にこの値を掛けたものとする
+	def __init__(self, slu_batch_function, dm, expected_weight=1.0, other_weight=0.1, rank_decay=0.5):
+
+		self.slu_batch_function = slu_batch_function
+		self.dm = dm
+		self.expected_weight = expected_weight
+		self.other_weight = other_weight
+		self.rank_decay = rank_decay
+
+	# 各候補の音声認識の信頼度を求める
+	# Google音声認識では1位の候補にしか信頼度が付かないことがあるため、順位から補う
+	def _asr_scores(self, nbest):
+
+		top = nbest[0][1] if nbest[0][1] > 0.0 else 1.0
+
+		scores = []
+		for rank, (sentence, confidence) in enumerate(nbest):
+			if confidence <= 0.0:
+				confidence = top * (self.rank_decay ** rank)
+			scores.append(math.log(max(confidence, 1e-6)))
+
+		return scores
+
+	# 言語理解結果のスコアを求める
+	def _slu_score(self, slu_result, expected_slots):
+
+		score = 0.0
+		for slot in slu_result:
+			if slot['slot_name'] in expected_slots:
+				score += self.expected_weight
+			else:
+				score += self.other_weight
+
+		return score
+
+	# 各候補のスコアを求める
+	# 戻り値は（正規化した認識結果の文, 言語理解結果, スコア）のlist（N-bestの順）
+	def score(self, nbest):
+
+		if len(nbest) == 0:
+			return []
+
+		sentences = [normalize(sentence) for sentence, confidence in nbest]
+		slu_results = self.slu_batch_function(sentences)
+		expected_slots = set(self.dm.expected_slots())
+
+		results = []
+		for sentence, slu_result, asr_score in zip(sentences, slu_results, self._asr_scores(nbest)):
+			results.append((sentence, slu_result, asr_score + self._slu_score(slu_result, expected_slots)))
+
+		return results
+
+	# 最もスコアの高い候補を返す
+	# 戻り値は（認識結果の文, 言語理解結果, スコア）、候補がなければNone
+	def select(self, nbest):
+
+		results = self.score(nbest)
+		if len(results) == 0:
+			return None
+
+		# 同じスコアであればN-bestの順位が高いものを選ぶ
+		return max(results, key=lambda r: r[2])
+
+if __name__ == '__main__':
+
+	from slu_rule import SluRule
+	from dm_fst import DmFst
+
+	slu_parser = SluRule()
+	dm = DmFst()
+	rescorer = NBestRescorer(slu_parser.parse_frame_batch, dm)
+
+	# 地域を尋ねている状態で、1位の候補は地域を含まない場合
+	nbest = [
+		('今日と駅の辺りで', 0.62),
+		('京都駅の辺りで', 0.0),
+		('京都駅のあたりで', 0.0),
+	]
+
+	print('システム発話 : ' + dm.get_system_utterance())
+	print('必要なスロット : %s' % dm.expected_slots())
+	for sentence, slu_result, score in rescorer.score(nbest):
+		print('%-16s %6.3f %s' % (sentence, score, slu_result))
+
+	sentence, slu_result, score = rescorer.select(nbest)
+	print('選択 : %s' % sentence)
+	print('システム発話 : ' + dm.enter(slu_result))
@@ -0,0 +1,200 @@
+import threading
+
+# 音声出力のライブラリ
+import pyaudio
+
+# 再生する音声データを保持するデータキュー
+from six.moves import queue
+
+from pydub import AudioSegment
+
+#
+# 合成音声をバックグラウンドで再生するクラス
+# 再生中も処理を続けることができ、途中で再生を止める（バージイン）こともできる
+#
+class AudioPlayer(object):
+
+	# 音声出力の単位（サンプル数）と、先読みしておく単位の数を指定する
+	def __init__(self, frames_per_buffer=1024, max_buffers=8):
+
+		self.frames_per_buffer = frames_per_buffer
+		self.max_buffers = max_buffers
+
+		# 現在の再生
+		self._playback = None
+
+	# 再生を開始する（再生の終了は待たない）
+	# 合成音声（AudioSegment）か、そのイテレータ（generate_stream の戻り値など）を受け取る
+	def play(self, audios):
+
+		# 再生中であれば止める
+		self.stop()
+
+		if isinstance(audios, AudioSegment):
+			audios = [audios]
+
+		self._playback = _Playback(audios, self.frames_per_buffer, self.max_buffers)
+
+	# 再生を止める
+	# 次に音声データを出力するタイミング（1単位以内）で止まる
+	# 止めた再生は wait で中断されたことが分かるよう、次の play まで保持しておく
+	def stop(self):
+
+		if self._playback is not None:
+			self._playback.stop()
+
+	# 再生中かどうか
+	def is_playing(self):
+
+		return self._playback is not None and self._playback.is_alive()
+
+	# 再生の終了を待つ
+	# 途中で止められた場合は（wait の前に止められていても）False を返す
+	def wait(self):
+
+		# 一度も再生していなければ待つものはない
+		if self._playback is None:
+			return True
+
+		self._playback.join()
+		return not self._playback.stopped.is_set()
+
+#
+# １回の再生を行うクラス
+# 音声データを出力単位に分割してキューに入れるスレッドと、キューから取り出して出力するコールバックからなる
+#
+class _Playback(object):
+
+	def __init__(self, audios, frames_per_buffer, max_buffers):
+
+		self.frames_per_buffer = frames_per_buffer
+
+		# 出力する音声データ（上限を設けることで先読みしすぎないようにする）
+		self.buff = queue.Queue(maxsize=max_buffers)
+
+		self.stopped = threading.Event()		# 途中で止められたか
+		self.finished = threading.Event()		# 最後まで出力したか
+
+		# 1単位の音声データのバイト数
+		self.bytes_per_buffer = 0
+
+		self._thread = threading.Thread(target=self._run, args=(audios,))
+		self._thread.daemon = True
+		self._thread.start()
+
+	def stop(self):
+
+		self.stopped.set()
+
+	def is_alive(self):
+
+		return self._thread.is_alive()
+
+	def join(self):
+
+		self._thread.join()
+
+	# 音声データを出力単位に分割してキューへ入れる
+	def _run(self, audios):
+
+		audio_interface = pyaudio.PyAudio()
+		stream = None
+
+		try:
+			for audio in audios:
+
+				if self.stopped.is_set():
+					break
+
+				# 最初の音声の形式で出力を開始する
+				if stream is None:
+					self.bytes_per_buffer = self.frames_per_buffer * audio.sample_width * audio.channels
+					stream = audio_interface.open(
+						format = audio_interface.get_format_from_width(audio.sample_width),
+						channels = audio.channels,
+						rate = audio.frame_rate,
+						output = True,
+						frames_per_buffer = self.frames_per_buffer,
+						stream_callback = self.callback
+					)
+
+				data = audio.raw_data
+				for i in range(0, len(data), self.bytes_per_buffer):
+					if not self._put(data[i:i + self.bytes_per_buffer]):
+						break
+
+			# 終端を表すNoneを入れ、最後まで出力されるのを待つ
+			if stream is not None and self._put(None):
+				while not self.finished.wait(0.05):
+					if self.stopped.is_set():
+						break
+
+		finally:
+			if stream is not None:
+				stream.stop_stream()
+				stream.close()
+			audio_interface.terminate()
+
+	# キューに空きができるまで待ってデータを入れる
+	# 待っている間に止められたら False を返す
+	def _put(self, data):
+
+		while not self.stopped.is_set():
+			try:
+				self.buff.put(data, timeout=0.05)
+				return True
+			except queue.Full:
+				continue
+
+		return False
+
+	# 音声出力の度に呼び出される関数
+	# 引数は pyaudio の仕様に合わせたもの
+	def callback(self, in_data, frame_count, time_info, status_flags):
+
+		# 止められていれば出力を終了する
+		if self.stopped.is_set():
+			return b'', pyaudio.paComplete
+
+		# データが間に合わなければ無音を出力する
+		try:
+			data = self.buff.get(block=False)
+		except queue.Empty:
+			return b'\x00' * self.bytes_per_buffer, pyaudio.paContinue
+
+		if data is None:
+			self.finished.set()
+			return b'', pyaudio.paComplete
+
+		# 最後の単位は足りない分を無音で埋める
+		if len(data) < self.bytes_per_buffer:
+			data += b'\x00' * (self.bytes_per_buffer - len(data))
+
+		return data, pyaudio.paContinue
+
+if __name__ == '__main__':
+
+	from asr_google_streaming_vad import GoogleStreamingASR, MicrophoneStream
+	from tts_google import GoogleTextToSpeech
+
+	# 音声認識クラスのパラメータ
+	RATE = 16000
+	CHUNK = int(RATE / 10)  # 100ms
+
+	tts = GoogleTextToSpeech(audio_encoding='LINEAR16')
+	player = AudioPlayer()
+
+	# システム発話を再生しながら音声認識を開始する
+	system_utterance = 'こんにちは。京都レストラン案内です。どの地域のレストランをお探しですか。'
+	print("システム： " + system_utterance)
+	player.play(tts.generate_stream(system_utterance))
+
+	# ユーザが話し始めたら再生を止める（バージイン）
+	micStream = MicrophoneStream(RATE, CHUNK, speech_start_callback=player.stop)
+	asrStream = GoogleStreamingASR(RATE, micStream)
+	print('<<<please speak>>>')
+	result_asr = asrStream.get_asr_result()
+
+	if hasattr(result_asr, 'alternatives'):
+		print()
+		print("ユーザ： " + result_asr.alternatives[0].transcript)
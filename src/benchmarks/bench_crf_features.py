@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+import MeCab
+
+import sklearn_crfsuite
+from sklearn_crfsuite import metrics
+
+import slu_ml_data
+import slu_ml_eval
+from slu_crf_features import CrfFeatureExtractor
+
+from benchmarks.common import scale_up, measure
+
+#
+# スロット値推定（CRF）の特徴量の比較
+# 単語のみの特徴量と、品詞・読みなども使用する特徴量（slu_crf_features.py）について、
+# 交差検定によるF値と、1文あたりの処理時間（単語分割＋特徴量の作成＋推定）を求める
+# 処理時間の p95 が LATENCY_BUDGET を超えた場合は表示する
+#
+# 同じ文を繰り返すと単語毎の特徴量のキャッシュが常に効いた状態になり、処理時間を過小に評価するため、
+# 目安との比較は重複を除いた文について、キャッシュを消去した状態から計測する
+# 倍率（scales）を指定した計測もキャッシュを消去してから行う
+#
+
+# 1文あたりの処理時間の目安[ms]
+LATENCY_BUDGET = 5.0
+
+def run(scales, num_folds=5):
+
+	mecab_tagger = MeCab.Tagger('-Owakati')
+	extractor = CrfFeatureExtractor()
+
+	results = []
+	for domain, filename in [['restaurant', slu_ml_data.FILENAME_RESTAURANT], ['weather', slu_ml_data.FILENAME_WEATHER]]:
+
+		sentences = [d[0] for d in slu_ml_data.load_annotated(filename)]
+		unique_sentences = list(OrderedDict.fromkeys(sentences))
+
+		# 推定時の処理（文から特徴量を作成して推定する）
+		def words_features(sentence):
+			return mecab_tagger.parse(sentence).strip().split(' ')
+
+		def rich_features(sentence):
+			return extractor.extract(sentence)[1]
+
+		for features, rich, make_features in [['words', False, words_features], ['rich', True, rich_features]]:
+
+			task = 'slot_%s' % domain
+			x, y = slu_ml_data.load_slot_data(filename, rich=rich)
+
+			# 交差検定によるF値
+			test_y, predict_y, times = slu_ml_eval.cross_validate(task, x, y, num_folds)
+			labels = sorted(set(label for seq in test_y for label in seq) - set(['O']))
+			f1 = metrics.flat_f1_score(test_y, predict_y, average='weighted', labels=labels)
+			print('%s.%s : F値 %.3f, 交差検定 %.2f[sec]' % (domain, features, f1, times['total']))
+
+			crf = sklearn_crfsuite.CRF()
+			crf.fit(x, y)
+
+			def predict(sentence):
+				return crf.predict_single(make_features(sentence))
+
+			# 目安との比較（重複のない文、キャッシュなしの状態から）
+			extractor.clear_cache()
+			result = measure('crf_features.%s.%s.predict unique' % (domain, features), predict, unique_sentences, warmup=0)
+			result['f1'] = f1
+			result['budget'] = LATENCY_BUDGET
+			if result['p95'] > LATENCY_BUDGET:
+				print('  p95 %.3f[ms] が目安の %.1f[ms] を超えています' % (result['p95'], LATENCY_BUDGET))
+			results.append(result)
+
+			for scale in scales:
+				inputs = scale_up(sentences, scale)
+
+				extractor.clear_cache()
+				result = measure('crf_features.%s.%s.features x%d' % (domain, features, scale), make_features, inputs)
+				result['f1'] = f1
+				results.append(result)
+
+				extractor.clear_cache()
+				result = measure('crf_features.%s.%s.predict x%d' % (domain, features, scale), predict, inputs)
+				result['f1'] = f1
+				results.append(result)
+
+	return results
@@ -0,0 +1,45 @@
+import dm_fst
+import dm_fst_weather
+from dm_frame import DmFrame
+
+from benchmarks.common import load_annotated, tags_to_slots, scale_up, measure
+
+#
+# 対話管理（DmFst, DmFrame）のベンチマーク
+# アノテーション付きデータのスロットを対話管理への入力とし、対話が終了したら初期状態に戻す
+#
+
+def run(scales):
+
+	slots_restaurant = [tags_to_slots(d[1], d[2]) for d in load_annotated('./data/slu-restaurant-annotated.csv')]
+	slots_weather = [tags_to_slots(d[1], d[2]) for d in load_annotated('./data/slu-weather-annotated.csv')]
+
+	results = []
+	for scale in scales:
+		inputs_restaurant = scale_up(slots_restaurant, scale)
+		inputs_weather = scale_up(slots_weather, scale)
+
+		results.append(measure('dm_fst.enter x%d' % scale, _make_enter_fst(dm_fst.DmFst()), inputs_restaurant))
+		results.append(measure('dm_fst_weather.enter x%d' % scale, _make_enter_fst(dm_fst_weather.DmFst()), inputs_weather))
+		results.append(measure('dm_frame.enter x%d' % scale, _make_enter_frame(DmFrame()), inputs_restaurant))
+
+	return results
+
+# 終了状態に達したら初期状態に戻す
+def _make_enter_fst(dm):
+
+	def enter(user_utterance):
+		if dm.end:
+			dm.reset()
+		return dm.enter(user_utterance)
+
+	return enter
+
+def _make_enter_frame(dm):
+
+	def enter(user_utterance):
+		if dm.current_frame_filled:
+			dm.reset()
+		return dm.enter(user_utterance)
+
+	return enter
@@ -0,0 +1,53 @@
+import numpy as np
+
+from sklearn import svm
+from sklearn.metrics import accuracy_score
+
+import slu_ml_data
+import slu_ml_eval
+from slu_domain_linear import LinearDomainClassifier
+
+from benchmarks.common import scale_up, measure
+
+#
+# ドメイン推定のモデル（SVM と線形モデル）の比較
+# 1文あたりの推定時間と、交差検定による正解率を求める
+# Word2vecのファイルが ./data に必要
+#
+
+def run(scales, num_folds=5):
+
+	model_w2v = slu_ml_data.load_w2v()
+
+	words, labels = slu_ml_data.load_domain_data()
+	x_w2v = slu_ml_data.make_sentence_matrix_with_w2v(words, model_w2v)
+	y = np.array(labels)
+
+	linear = LinearDomainClassifier()
+	x_linear = linear.make_features(words, x_w2v)
+
+	models = [
+		['svm', svm.SVC(), x_w2v, 'domain'],
+		['linear', linear, x_linear, 'domain_linear'],
+	]
+
+	results = []
+	for name, clf, x, task in models:
+
+		# 交差検定による正解率
+		test_y, predict_y, times = slu_ml_eval.cross_validate(task, x, y, num_folds)
+		accuracy = accuracy_score(test_y, predict_y)
+		print('%s : 正解率 %.3f, 交差検定 %.2f[sec]' % (name, accuracy, times['total']))
+
+		# 全データで学習したモデルで1文ずつ推定する時間
+		# 学習データを増やした場合の影響も見るため、データを増やして学習する
+		for scale in scales:
+			idx = scale_up(list(range(len(y))), scale)
+			clf.fit(x[idx], y[idx])
+
+			inputs = [x[i:i + 1] for i in range(len(y))]
+			result = measure('domain_model.%s.predict x%d' % (name, scale), clf.predict, inputs)
+			result['accuracy'] = accuracy
+			results.append(result)
+
+	return results
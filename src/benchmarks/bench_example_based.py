@@ -0,0 +1,99 @@
+import os
+import csv
+import random
+import tempfile
+import tracemalloc
+
+from example_based import ExampleBased, read_pairs
+from example_index import BM25Index
+
+from benchmarks.common import load_example_inputs, scale_up, measure
+
+#
+# 用例ベース（ExampleBased）のベンチマーク
+# 用例データを指定した倍率に増やし、1回の検索にかかる時間を計測する
+# また、増やした用例データを読み込んだ後に保持されるメモリを tracemalloc で測り、
+# 1用例あたりのメモリと TARGET_EXAMPLES 件の場合の見積もりを表示する
+# Word2vecのファイルが ./data に必要
+#
+
+# メモリを見積もる用例数
+TARGET_EXAMPLES = 10000000
+
+# 用例データを指定した倍率に増やしたファイルを作成する
+# 入力文は2つの用例の入力文をつなげたもの、応答は全て異なるもの（共有されない場合）とする
+def write_scaled_examples(filename, pairs, scale, seed=0):
+
+	rng = random.Random(seed)
+
+	with open(filename, 'w', encoding='utf-8', newline='') as f:
+		writer = csv.writer(f)
+		for i in range(len(pairs) * scale):
+			u1 = rng.choice(pairs)[0] + rng.choice(pairs)[0]
+			u2 = '%s%d' % (pairs[i % len(pairs)][1], i)
+			writer.writerow([u1, u2])
+
+# 用例データを読み込んだ後に保持されるメモリ[byte]と、読み込み中の最大のメモリ[byte]
+def measure_load_memory(filename):
+
+	tracemalloc.start()
+	try:
+		example_based = ExampleBased(filename=filename)
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+
+	return example_based, current, peak
+
+def run(scales, num_queries=20):
+
+	example_based = ExampleBased(verbose=False)
+
+	# 入力文は用例データの入力文を事前にMeCabで分割しておく
+	queries = [example_based.parse_mecab(s) for s in load_example_inputs()[:num_queries]]
+
+	pair_data_mecab = example_based.pair_data_mecab
+	example_matrix = example_based.example_matrix
+	bm25_index = example_based.bm25_index
+
+	results = []
+	for scale in scales:
+		example_based.pair_data_mecab = scale_up(pair_data_mecab, scale)
+		results.append(measure('example_based.matching_bagofwords x%d' % scale, example_based.matching_bagofwords, queries, warmup=1))
+		results.append(measure('example_based.matching_word2vec x%d' % scale, example_based.matching_word2vec, queries, warmup=1))
+
+		# 単語の重なりとWord2vecの組み合わせは事前に行列を作成しておく
+		list_words = [d[0] for d in example_based.pair_data_mecab]
+		example_based.example_matrix = example_based.make_example_matrix(list_words)
+		example_based.bm25_index = BM25Index().add(list_words)
+		results.append(measure('example_based.matching_hybrid x%d' % scale, example_based.matching_hybrid, queries, warmup=1))
+
+	example_based.pair_data_mecab = pair_data_mecab
+	example_based.example_matrix = example_matrix
+	example_based.bm25_index = bm25_index
+
+	# 読み込んだ用例のメモリ（Word2vecのモデルを除くため、用例なしの場合との差を求める）
+	pairs = [p for chunk in read_pairs('./data/example-base-data.csv') for p in chunk]
+	_, empty, _ = measure_load_memory(None)
+	for scale in scales:
+		fd, filename = tempfile.mkstemp(suffix='.csv')
+		os.close(fd)
+		try:
+			write_scaled_examples(filename, pairs, scale)
+			loaded, current, peak = measure_load_memory(filename)
+		finally:
+			os.remove(filename)
+
+		num_examples = len(loaded.pair_data_mecab)
+		per_example = (current - empty) / num_examples
+		print('example_based.load x%d : %d 用例, %.1f[MB]（1用例 %.0f[byte]、%d 用例で約 %.1f[GB]）、読み込み中の最大 %.1f[MB]' % (
+			scale, num_examples, (current - empty) / 1e6, per_example, TARGET_EXAMPLES, per_example * TARGET_EXAMPLES / 1e9, (peak - empty) / 1e6))
+
+		# 量子化して元の精度の行列を破棄した場合
+		matrix_bytes = loaded.example_matrix.nbytes
+		loaded.quantize_examples()
+		per_example_quantized = per_example - (matrix_bytes - loaded.quantized_index.nbytes()) / num_examples
+		print('  quantize_examples() の後 : 1用例 %.0f[byte]、%d 用例で約 %.1f[GB]' % (
+			per_example_quantized, TARGET_EXAMPLES, per_example_quantized * TARGET_EXAMPLES / 1e9))
+
+	return results
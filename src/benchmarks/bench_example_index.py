@@ -0,0 +1,128 @@
+import random
+import tracemalloc
+
+import numpy as np
+
+from example_based import ExampleBased
+from example_index import ClusteredIndex, QuantizedIndex
+
+from benchmarks.common import measure
+
+#
+# 用例ベースの２段階のインデクス（ClusteredIndex）と量子化したインデクス（QuantizedIndex）のベンチマーク
+# 全ての用例との類似度を求める場合（matching_word2vec と同じ結果）と比べて、
+# 1回の検索にかかる時間と、最も類似する用例が一致する割合（recall@1）を求める
+# 量子化したインデクスはメモリ使用量も求める（ExampleBased.quantize_examples の後に保持されるメモリを
+# tracemalloc で測る。re-rankingなしは既定の keep_float=False、re-rankingありは keep_float=True の場合）
+# Word2vecのファイルが ./data に必要
+#
+# 用例データは約100件しかないため、2つの用例の単語を組み合わせた用例を作り、指定した倍率に増やす
+# 検索する文は用例の入力文そのもの（インデクスに含まれるため recall が高くなる）ではなく、
+# 単語を1つ除き、別の用例の単語を1つ加えた文とする
+#
+
+def make_examples(list_words, scale, seed=0):
+
+	rng = random.Random(seed)
+
+	examples = list(list_words)
+	while len(examples) < len(list_words) * scale:
+		examples.append(rng.choice(list_words) + rng.choice(list_words))
+
+	return examples
+
+# 用例の単語の系列を変えた検索用の文を作る
+def make_queries(list_words, num_queries, seed=0):
+
+	rng = random.Random(seed)
+
+	queries = []
+	for i in range(num_queries):
+		words = list(list_words[i % len(list_words)])
+		if len(words) > 1:
+			del words[rng.randrange(len(words))]
+		other = rng.choice(list_words)
+		if len(other) > 0:
+			words.insert(rng.randrange(len(words) + 1), rng.choice(other))
+		queries.append(words)
+
+	return queries
+
+# 検索結果の類似度が全ての用例との類似度を求めた場合と一致する割合
+# 類似度が同じ用例もあるため、用例の番号ではなく類似度で一致を判定する
+def recall_at_1(matrix, found, exact, queries):
+
+	return float(np.mean([np.isclose(np.dot(matrix[f], q), np.dot(matrix[e], q)) for f, e, q in zip(found, exact, queries)]))
+
+# quantize_examples の後に用例の行列とインデクスが使用するメモリ[byte]
+def measure_memory(example_based, matrix, dtype, keep_float):
+
+	tracemalloc.start()
+	try:
+		example_based.example_matrix = matrix.copy()
+		example_based.quantize_examples(dtype, keep_float=keep_float)
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+		example_based.example_matrix = None
+		example_based.quantized_index = None
+
+	return current, peak
+
+def run(scales, num_queries=100, num_probes=[1, 3, 10], dtypes=['float16', 'int8'], reranks=[0, 10]):
+
+	example_based = ExampleBased(verbose=False)
+
+	list_words = [d[0] for d in example_based.pair_data_mecab]
+	queries = [example_based.make_normalized_vec(words) for words in make_queries(list_words, num_queries)]
+
+	results = []
+	for scale in scales:
+
+		matrix = example_based.make_example_matrix(make_examples(list_words, scale))
+
+		# 全ての用例との類似度を求める場合
+		def search_exact(vec):
+			return int(np.argmax(np.dot(matrix, vec)))
+
+		exact = [search_exact(q) for q in queries]
+		results.append(measure('example_index.exact x%d' % scale, search_exact, queries, warmup=1))
+
+		index = ClusteredIndex().build(matrix)
+		for num_probe in num_probes:
+			index.num_probe = num_probe
+
+			def search_clustered(vec):
+				return index.search(vec, matrix)
+
+			found = [search_clustered(q)[0][0] for q in queries]
+			recall = recall_at_1(matrix, found, exact, queries)
+
+			result = measure('example_index.clustered(probe=%d) x%d' % (num_probe, scale), search_clustered, queries, warmup=1)
+			result['recall'] = recall
+			print('  recall@1 : %.3f（クラスタ数 %d）' % (recall, len(index.centroids)))
+			results.append(result)
+
+		# 量子化（re-rankingでは元の精度のベクトルを使用する）
+		for dtype in dtypes:
+			index = QuantizedIndex(dtype).build(matrix)
+			for rerank in reranks:
+
+				def search_quantized(vec):
+					return index.search(vec, rerank=rerank, get_vector=matrix.__getitem__)
+
+				found = [search_quantized(q)[0][0] for q in queries]
+				recall = recall_at_1(matrix, found, exact, queries)
+
+				result = measure('example_index.%s(rerank=%d) x%d' % (dtype, rerank, scale), search_quantized, queries, warmup=1)
+				result['recall'] = recall
+
+				# re-rankingには元の精度の行列が必要（keep_float=True）
+				keep_float = rerank > 0
+				result['memory'], result['memory_peak'] = measure_memory(example_based, matrix, dtype, keep_float)
+				result['memory_ratio'] = result['memory'] / matrix.nbytes
+				print('  recall@1 : %.3f, メモリ（keep_float=%s） : %.1f[MB]（元の行列の %.3f 倍）、作成時の最大 %.1f[MB]' % (
+					recall, keep_float, result['memory'] / 1e6, result['memory_ratio'], result['memory_peak'] / 1e6))
+				results.append(result)
+
+	return results
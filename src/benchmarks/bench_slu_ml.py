@@ -0,0 +1,27 @@
+from slu_ml import SluML
+
+from benchmarks.common import load_annotated, scale_up, measure
+
+#
+# 機械学習ベースの言語理解（SluML）のベンチマーク
+# 学習済みモデルとWord2vecのファイルが ./data に必要
+#
+
+def run(scales):
+
+	parser = SluML()
+
+	sentences_restaurant = [d[0] for d in load_annotated('./data/slu-restaurant-annotated.csv')]
+	sentences_weather = [d[0] for d in load_annotated('./data/slu-weather-annotated.csv')]
+
+	results = []
+
+	for scale in scales:
+		inputs_restaurant = scale_up(sentences_restaurant, scale)
+		inputs_weather = scale_up(sentences_weather, scale)
+
+		results.append(measure('slu_ml.estimate_domain x%d' % scale, parser.estimate_domain, inputs_restaurant + inputs_weather))
+		results.append(measure('slu_ml.extract_slot_restaurant x%d' % scale, parser.extract_slot_restaurant, inputs_restaurant))
+		results.append(measure('slu_ml.extract_slot_weather x%d' % scale, parser.extract_slot_weather, inputs_weather))
+
+	return results
@@ -0,0 +1,24 @@
+from slu_rule import SluRule
+
+from benchmarks.common import load_annotated, scale_up, measure
+
+#
+# ルールベースの言語理解（SluRule）のベンチマーク
+#
+
+def run(scales):
+
+	parser = SluRule()
+
+	# 入力文はアノテーション付きデータの文をそのまま使用する
+	sentences = []
+	for filename in ['./data/slu-restaurant-annotated.csv', './data/slu-weather-annotated.csv']:
+		sentences.extend([d[0] for d in load_annotated(filename)])
+
+	results = []
+	for scale in scales:
+		inputs = scale_up(sentences, scale)
+		results.append(measure('slu_rule.parse_grammar x%d' % scale, parser.parse_grammar, inputs))
+		results.append(measure('slu_rule.parse_frame x%d' % scale, parser.parse_frame, inputs))
+
+	return results
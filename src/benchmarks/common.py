@@ -0,0 +1,123 @@
+import csv
+import json
+import time
+import platform
+import subprocess
+
+from tracer import percentile
+
+# アノテーション付きデータの読み込みは学習・評価と共通
+from slu_ml_data import load_annotated
+
+#
+# ベンチマークで共通に使用する関数
+# src ディレクトリで python -m benchmarks.run のように実行する（./data 以下のファイルを使用するため）
+#
+
+# 用例データ（example-base-data.csv）の入力文を読み込む
+def load_example_inputs(filename='./data/example-base-data.csv'):
+
+	inputs = []
+	with open(filename, 'r', encoding='utf-8') as f:
+		for row in csv.reader(f):
+			if len(row) >= 2:
+				inputs.append(row[0].strip())
+
+	return inputs
+
+# 単語とタグの系列からスロットを取り出す（対話管理への入力の形式）
+def tags_to_slots(words, tags):
+
+	slots = []
+	for word, tag in zip(words, tags):
+		if tag.startswith('B-'):
+			slots.append({'intent': '', 'slot_name': tag[2:], 'slot_value': word})
+		elif tag.startswith('I-') and len(slots) > 0 and slots[-1]['slot_name'] == tag[2:]:
+			slots[-1]['slot_value'] += word
+
+	return slots
+
+# データを指定した倍率に増やす（順番は変えずに繰り返す）
+def scale_up(items, factor):
+
+	return [items[i % len(items)] for i in range(len(items) * factor)]
+
+# 関数を入力毎に実行し、処理時間の分布とスループットを求める
+# warmup 回は計測せずに実行する（初回のみ遅い処理の影響を除く）
+def measure(name, func, inputs, warmup=10):
+
+	for x in inputs[:warmup]:
+		func(x)
+
+	latencies = []
+	time_start = time.perf_counter()
+	for x in inputs:
+		t = time.perf_counter()
+		func(x)
+		latencies.append((time.perf_counter() - t) * 1000.0)
+	time_total = time.perf_counter() - time_start
+
+	latencies.sort()
+	result = {
+		'name': name,
+		'count': len(latencies),
+		'throughput': len(latencies) / time_total if time_total > 0 else 0.0,
+		'mean': sum(latencies) / len(latencies),
+		'p50': percentile(latencies, 50),
+		'p95': percentile(latencies, 95),
+		'p99': percentile(latencies, 99),
+	}
+
+	print('%-48s %8d %12.1f %10.3f %10.3f %10.3f' % (name, result['count'], result['throughput'], result['p50'], result['p95'], result['p99']))
+
+	return result
+
+# 結果の表のヘッダを表示
+def print_header():
+
+	print('%-48s %8s %12s %10s %10s %10s' % ('name', 'count', 'calls/sec', 'p50[ms]', 'p95[ms]', 'p99[ms]'))
+
+# 実行環境の情報
+def environment():
+
+	try:
+		commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+	except Exception:
+		commit = ''
+
+	return {
+		'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+		'python': platform.python_version(),
+		'machine': platform.machine(),
+		'processor': platform.processor(),
+		'commit': commit,
+	}
+
+# 結果をJSONファイルに保存する
+def save_results(filename, results):
+
+	with open(filename, 'w', encoding='utf-8') as f:
+		json.dump({'environment': environment(), 'results': results}, f, ensure_ascii=False, indent=2)
+
+# 以前の結果と比較し、p50 が threshold 倍以上遅くなった項目を返す
+def compare_results(filename_baseline, results, threshold=1.2):
+
+	with open(filename_baseline, 'r', encoding='utf-8') as f:
+		baseline = {r['name']: r for r in json.load(f)['results']}
+
+	regressions = []
+
+	print('%-48s %10s %10s %8s' % ('name', 'base[ms]', 'new[ms]', 'ratio'))
+	for r in results:
+		if r['name'] not in baseline:
+			continue
+
+		base = baseline[r['name']]['p50']
+		ratio = r['p50'] / base if base > 0 else 1.0
+		mark = ' <- regression' if ratio >= threshold else ''
+		print('%-48s %10.3f %10.3f %8.2f%s' % (r['name'], base, r['p50'], ratio, mark))
+
+		if ratio >= threshold:
+			regressions.append(r['name'])
+
+	return regressions
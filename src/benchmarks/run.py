@@ -0,0 +1,65 @@
+import sys
+import argparse
+
+from benchmarks.common import print_header, save_results, compare_results
+
+#
+# ベンチマークをまとめて実行する
+#
+# 実行例（src ディレクトリで実行）
+#   python -m benchmarks.run --suite slu_rule dm --scale 1 10 100 --output bench.json
+#   python -m benchmarks.run --baseline bench.json      # 以前の結果と比較（遅くなっていれば終了コード1）
+#
+
+SUITES = ['slu_rule', 'slu_ml', 'domain_model', 'crf_features', 'example_based', 'example_index', 'dm']
+
+def run_suite(name, scales):
+
+	if name == 'slu_rule':
+		from benchmarks import bench_slu_rule
+		return bench_slu_rule.run(scales)
+	elif name == 'slu_ml':
+		from benchmarks import bench_slu_ml
+		return bench_slu_ml.run(scales)
+	elif name == 'domain_model':
+		from benchmarks import bench_domain_model
+		return bench_domain_model.run(scales)
+	elif name == 'crf_features':
+		from benchmarks import bench_crf_features
+		return bench_crf_features.run(scales)
+	elif name == 'example_based':
+		from benchmarks import bench_example_based
+		return bench_example_based.run(scales)
+	elif name == 'example_index':
+		from benchmarks import bench_example_index
+		return bench_example_index.run(scales)
+	elif name == 'dm':
+		from benchmarks import bench_dm
+		return bench_dm.run(scales)
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='言語理解・応答選択・対話管理のベンチマーク')
+	parser.add_argument('--suite', nargs='+', choices=SUITES, default=SUITES, help='実行するベンチマーク')
+	parser.add_argument('--scale', nargs='+', type=int, default=[1, 10, 100], help='データを増やす倍率')
+	parser.add_argument('--output', default='./benchmark-results.json', help='結果を保存するファイル')
+	parser.add_argument('--baseline', default=None, help='比較する以前の結果のファイル')
+	parser.add_argument('--threshold', type=float, default=1.2, help='この倍率以上遅くなったら性能低下とみなす')
+	args = parser.parse_args()
+
+	results = []
+	for name in args.suite:
+		print('[%s]' % name)
+		print_header()
+		results.extend(run_suite(name, args.scale))
+		print()
+
+	save_results(args.output, results)
+	print('結果を保存しました: %s' % args.output)
+
+	if args.baseline is not None:
+		print()
+		regressions = compare_results(args.baseline, results, args.threshold)
+		if len(regressions) > 0:
+			print('性能が低下した項目があります: %s' % ', '.join(regressions))
+			sys.exit(1)
@@ -0,0 +1,312 @@
+import os
+import gc
+import sys
+import json
+import signal
+import socket
+import struct
+import asyncio
+import argparse
+
+import dialogue_session
+
+# 処理時間の計測
+from tracer import tracer
+
+#
+# テキストによる対話サーバ
+# 複数のプロセス（ワーカ）で多数の対話セッションを同時に処理する
+#
+# ・言語理解・用例ベースのモデル（読み込みのみ）は fork する前に親プロセスで読み込み、
+#   全てのワーカでメモリを共有する（copy-on-write）
+# ・待ち受けのソケットも fork する前に作成し、接続は OS によって各ワーカに振り分けられる
+# ・各ワーカは asyncio で複数の接続を同時に扱う
+# ・1つの接続が1つの対話セッションに対応する（対話の状態は接続を受け付けたワーカが持つ）
+#
+# 通信のフォーマット（長さ付きJSON）
+#   4バイトのメッセージ長（ビッグエンディアン）＋ UTF-8 の JSON
+#
+#   クライアント -> サーバ
+#     {"type": "start", "system": "system2"}    対話を開始（system1〜5）
+#     {"type": "text", "text": "京都の辺りで探しています"}    ユーザ発話
+#     {"type": "stats"}    接続を受け付けたワーカの状態（接続数・キャッシュのヒット率）
+#   サーバ -> クライアント
+#     {"system_utterance": "...", "end": false}    システム発話と対話が終了したかどうか
+#     {"error": "..."}    エラー
+#
+# 実行例（src ディレクトリで実行）
+#   python dialogue_server.py --systems system1 system2 --workers 4 --port 50000
+#   python dialogue_server.py --client --system system2 --port 50000    # 対話してみる
+#
+
+HEADER = struct.Struct('>I')
+
+# 1つのメッセージの最大の長さ
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+# メッセージを長さ付きのバイト列にする
+def encode_message(message):
+
+	data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+	return HEADER.pack(len(data)) + data
+
+# メッセージを1つ読み込む（asyncio）
+# 接続が閉じられたらNoneを返す
+async def read_message(reader):
+
+	try:
+		header = await reader.readexactly(HEADER.size)
+	except asyncio.IncompleteReadError:
+		return None
+
+	length, = HEADER.unpack(header)
+	if length > MAX_MESSAGE_BYTES:
+		raise ValueError('メッセージが長すぎます: %d' % length)
+
+	data = await reader.readexactly(length)
+	return json.loads(data.decode('utf-8'))
+
+#
+# 各ワーカで実行する対話サーバ
+#
+class DialogueServer(object):
+
+	# models : dialogue_session.load_models で読み込んだモデル（全ての接続で共有する）
+	# systems : 使用できるシステム名
+	def __init__(self, models, systems):
+
+		self.models = models
+		self.systems = systems
+
+		# 現在の接続数
+		self.num_connections = 0
+
+	# メッセージを処理して返信を返す
+	# 不正なメッセージは ValueError とする（接続は切らずにエラーを返信する）
+	def handle_message(self, session, message):
+
+		if not isinstance(message, dict):
+			raise ValueError('メッセージはオブジェクトで指定してください: %s' % type(message).__name__)
+
+		if message.get('type') == 'start':
+			system = message.get('system', self.systems[0])
+			if not isinstance(system, str) or system not in self.systems:
+				raise ValueError('未対応のシステムです: %s' % system)
+
+			session = dialogue_session.create_session(system, self.models)
+			return session, {'system_utterance': session.start(), 'end': False}
+
+		if message.get('type') == 'text':
+			if session is None:
+				raise ValueError('対話が開始されていません')
+			if not isinstance(message.get('text'), str):
+				raise ValueError('text には文字列を指定してください')
+
+			system_utterance = session.respond(message['text'])
+			return session, {'system_utterance': system_utterance, 'end': session.end}
+
+		if message.get('type') == 'stats':
+			stats = {'pid': os.getpid(), 'connections': self.num_connections}
+			if 'cache' in self.models:
+				stats['cache'] = self.models['cache'].stats()
+			return session, stats
+
+		raise ValueError('未対応のメッセージです: %s' % message.get('type'))
+
+	# 1つの接続を処理する
+	async def handle_connection(self, reader, writer):
+
+		self.num_connections += 1
+		session = None
+
+		try:
+			while True:
+				message = await read_message(reader)
+				if message is None:
+					break
+
+				# 処理中のエラーは返信し、接続は切らない
+				try:
+					session, reply = self.handle_message(session, message)
+				except (ValueError, KeyError) as e:
+					reply = {'error': str(e)}
+				except Exception as e:
+					reply = {'error': '%s: %s' % (type(e).__name__, e)}
+
+				writer.write(encode_message(reply))
+				await writer.drain()
+
+		except (ConnectionError, ValueError):
+			pass
+
+		finally:
+			self.num_connections -= 1
+			writer.close()
+
+	# 作成済みのソケットで接続を待ち受ける
+	async def serve(self, sock):
+
+		server = await asyncio.start_server(self.handle_connection, sock=sock)
+		async with server:
+			await server.serve_forever()
+
+# ワーカの処理
+def run_worker(sock, models, systems):
+
+	# 親プロセスのシグナルの処理は引き継がない
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+	server = DialogueServer(models, systems)
+
+	# SIGTERM では待ち受けを止め、終了処理（処理時間の記録の書き出し）を行ってから終了する
+	async def run():
+		task = asyncio.current_task()
+		asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+		await server.serve(sock)
+
+	try:
+		asyncio.run(run())
+	except asyncio.CancelledError:
+		pass
+	finally:
+		# os._exit では atexit が実行されないため、ここで書き出す
+		tracer.flush()
+		os._exit(0)
+
+# サーバを起動する
+# モデルを読み込み、ソケットを作成してから num_workers 個のワーカを fork する
+# cache_size : 言語理解・用例ベースの結果をキャッシュする件数（ワーカ毎、0ならキャッシュしない）
+# example_method : 用例ベースの類似度計算の方法（Noneならシステムの設定のまま）
+def serve(systems, host='127.0.0.1', port=50000, num_workers=None, backlog=1024, cache_size=0, example_method=None):
+
+	if num_workers is None:
+		num_workers = os.cpu_count() or 1
+
+	# モデルを読み込む（fork する前に一度だけ）
+	models = dialogue_session.load_models(systems, cache_size, example_method)
+
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind((host, port))
+	sock.listen(backlog)
+	sock.setblocking(False)
+
+	print('%s:%d で待ち受けます（システム : %s, ワーカ数 : %d）' % (host, port, ', '.join(systems), num_workers))
+
+	# fork できない環境では1つのプロセスで実行する
+	if not hasattr(os, 'fork'):
+		asyncio.run(DialogueServer(models, systems).serve(sock))
+		return
+
+	# 読み込んだモデルをGCの対象から外し、GCによる参照でページがコピーされないようにする
+	gc.collect()
+	if hasattr(gc, 'freeze'):
+		gc.freeze()
+
+	pids = []
+	for _ in range(num_workers):
+		pid = os.fork()
+		if pid == 0:
+			run_worker(sock, models, systems)
+		pids.append(pid)
+
+	sock.close()
+
+	# 終了時には全てのワーカを終了させる
+	def stop(signum, frame):
+		for pid in pids:
+			try:
+				os.kill(pid, signal.SIGTERM)
+			except ProcessLookupError:
+				pass
+
+	signal.signal(signal.SIGINT, stop)
+	signal.signal(signal.SIGTERM, stop)
+
+	for pid in pids:
+		while True:
+			try:
+				os.waitpid(pid, 0)
+				break
+			except InterruptedError:
+				continue
+			except ChildProcessError:
+				break
+
+#
+# 対話サーバのクライアント（動作確認・シミュレーション用）
+#
+class DialogueClient(object):
+
+	def __init__(self, host='127.0.0.1', port=50000):
+
+		self.sock = socket.create_connection((host, port))
+		self.file = self.sock.makefile('rb')
+
+	def _request(self, message):
+
+		self.sock.sendall(encode_message(message))
+
+		header = self.file.read(HEADER.size)
+		if len(header) < HEADER.size:
+			raise ConnectionError('サーバとの接続が切れました')
+
+		length, = HEADER.unpack(header)
+		reply = json.loads(self.file.read(length).decode('utf-8'))
+		if 'error' in reply:
+			raise ValueError(reply['error'])
+
+		return reply
+
+	# 対話を開始し、最初のシステム発話を返す
+	def start(self, system):
+
+		return self._request({'type': 'start', 'system': system})
+
+	# ユーザ発話を送り、システム発話を返す
+	def send(self, text):
+
+		return self._request({'type': 'text', 'text': text})
+
+	# 接続しているワーカの状態を返す
+	def stats(self):
+
+		return self._request({'type': 'stats'})
+
+	def close(self):
+
+		self.file.close()
+		self.sock.close()
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='テキストによる対話サーバ')
+	parser.add_argument('--systems', nargs='+', choices=sorted(dialogue_session.SYSTEMS.keys()), default=['system1', 'system2'], help='使用できるシステム')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=50000)
+	parser.add_argument('--workers', type=int, default=None, help='ワーカのプロセス数（デフォルトはCPU数）')
+	parser.add_argument('--cache-size', type=int, default=0, help='結果をキャッシュする件数（ワーカ毎、0ならキャッシュしない）')
+	parser.add_argument('--example-method', choices=sorted(dialogue_session.EXAMPLE_BASED_METHODS.keys()), default=None, help='用例ベースの類似度計算の方法')
+	parser.add_argument('--client', action='store_true', help='クライアントとして対話する')
+	parser.add_argument('--system', default='system2', help='クライアントで使用するシステム')
+	args = parser.parse_args()
+
+	if not args.client:
+		serve(args.systems, args.host, args.port, args.workers, cache_size=args.cache_size, example_method=args.example_method)
+		sys.exit(0)
+
+	client = DialogueClient(args.host, args.port)
+	reply = client.start(args.system)
+	print('システム： ' + reply['system_utterance'])
+
+	while not reply['end']:
+		try:
+			text = input('ユーザ： ')
+		except EOFError:
+			break
+
+		reply = client.send(text)
+		print('システム： ' + reply['system_utterance'])
+
+	client.close()
@@ -0,0 +1,255 @@
+from tracer import tracer
+
+# ユーザ発話の正規化
+from text_normalizer import normalize
+
+#
+# テキストによる対話セッション
+# 8章のシステム統合（system1〜5.ipynb）の対話の流れを、音声認識・音声合成なしで実行する
+#
+# 言語理解と用例ベースのモデルは読み込みのみのため、複数のセッションで共有する
+# 対話管理は対話の状態を持つため、セッション毎に作成する
+# load_models で cache_size を指定すると、言語理解・用例ベースの結果をキャッシュする（result_cache.py）
+# ユーザ発話は言語理解・用例ベースの前に１回だけ正規化する（text_normalizer.py）
+#
+
+# システムの構成（言語理解と対話管理の組み合わせ）
+# slu : 言語理解（'rule' は SluRule.parse_frame、'ml_restaurant'・'ml_weather' は SluML のスロット値抽出）
+# dm : 対話管理（'fst' はレストラン検索、'fst_weather' は天気案内の有限オートマトン、'frame' はフレーム）
+SYSTEMS = {
+	'system1': {'slu': 'rule', 'dm': 'fst'},
+	'system2': {'slu': 'rule', 'dm': 'frame'},
+	'system3': {'slu': 'ml_restaurant', 'dm': 'frame'},
+	'system4': {'slu': 'ml_weather', 'dm': 'fst_weather'},
+	'system5': {'example_based': 'word2vec'},
+}
+
+# 用例ベースの類似度計算の方法と ExampleBased のメソッド
+# 'word2vec_loop' と 'bagofwords' は用例毎に計算する（用例が多い場合は遅い）
+EXAMPLE_BASED_METHODS = {
+	'word2vec': 'matching_word2vec_matrix',		# 全ての用例との類似度を行列の積で求める
+	'clustered': 'matching_word2vec_clustered',	# ２段階のインデクス
+	'quantized': 'matching_word2vec_quantized',	# 量子化した文ベクトル
+	'hybrid': 'matching_hybrid',				# 単語の重なり（BM25）と文ベクトル
+	'word2vec_loop': 'matching_word2vec',
+	'bagofwords': 'matching_bagofwords',
+}
+
+# 用例ベースの対話を終了するユーザ発話に含まれる語
+END_WORD = '終了'
+
+# 指定したシステムで使用するモデルを読み込む
+# 戻り値はモデル名（'rule'・'ml'・'example_based'、キャッシュを使う場合は 'cache'）とモデルの辞書
+# 類似度計算の方法を指定した場合は 'example_method' も含む
+# cache_size : 結果をキャッシュする件数（0ならキャッシュしない）
+# example_method : 用例ベースの類似度計算の方法（EXAMPLE_BASED_METHODS、Noneならシステムの設定のまま）
+def load_models(system_names, cache_size=0, example_method=None):
+
+	models = {}
+
+	if example_method is not None:
+		if example_method not in EXAMPLE_BASED_METHODS:
+			raise ValueError('未対応の類似度計算です: %s' % example_method)
+		models['example_method'] = example_method
+
+	if cache_size > 0:
+		from result_cache import ResultCache
+		models['cache'] = ResultCache(cache_size)
+
+	for name in system_names:
+		config = SYSTEMS[name]
+
+		if config.get('slu') == 'rule' and 'rule' not in models:
+			from slu_rule import SluRule
+			models['rule'] = SluRule()
+
+		if config.get('slu', '').startswith('ml_') and 'ml' not in models:
+			from slu_ml import SluML
+			models['ml'] = SluML()
+
+		if 'example_based' in config and 'example_based' not in models:
+			from example_based import ExampleBased
+			models['example_based'] = ExampleBased(verbose=False)
+
+			# インデクスは最初の発話の際ではなく読み込み時に作成する（サーバでは fork の前に作成して共有する）
+			method = models.get('example_method', config['example_based'])
+			if method == 'clustered':
+				models['example_based'].build_cluster_index()
+			elif method == 'quantized':
+				models['example_based'].quantize_examples()
+
+	return models
+
+# 対話管理を作成する
+def create_dm(name):
+
+	if name == 'fst':
+		from dm_fst import DmFst
+		return DmFst()
+
+	elif name == 'fst_weather':
+		from dm_fst_weather import DmFst
+		return DmFst()
+
+	elif name == 'frame':
+		from dm_frame import DmFrame
+		return DmFrame()
+
+	raise ValueError('未対応の対話管理です: %s' % name)
+
+# 言語理解の関数を返す
+# キャッシュがあれば、その前にキャッシュを置いた関数とする
+def get_slu_function(name, models):
+
+	if name == 'rule':
+		slu_function = models['rule'].parse_frame
+		get_version = None
+
+	elif name == 'ml_restaurant':
+		slu_function = models['ml'].extract_slot_restaurant
+		get_version = lambda: models['ml'].version
+
+	elif name == 'ml_weather':
+		slu_function = models['ml'].extract_slot_weather
+		get_version = lambda: models['ml'].version
+
+	else:
+		raise ValueError('未対応の言語理解です: %s' % name)
+
+	# 入力は正規化済みのため、そのままキーとする
+	if 'cache' in models:
+		return models['cache'].wrap(slu_function, name, get_version, key_function=None)
+
+	return slu_function
+
+#
+# 言語理解と対話管理による対話セッション
+#
+class SluDmSession(object):
+
+	def __init__(self, slu_function, dm):
+
+		self.slu_function = slu_function
+		self.dm = dm
+
+		# 対話が終了したかどうか
+		self.end = False
+
+		# 直前のユーザ発話の言語理解の結果
+		self.slu_result = None
+
+	# 対話を開始し、最初のシステム発話を返す
+	def start(self):
+
+		self.dm.reset()
+		self.end = False
+		self.slu_result = None
+
+		# フレームによる対話管理は最初の発話を別に持つ
+		if hasattr(self.dm, 'utterance_start'):
+			return self.dm.utterance_start
+
+		return self.dm.get_system_utterance()
+
+	# ユーザ発話（テキスト）を入力し、システム発話を返す
+	@tracer.trace('session.respond')
+	def respond(self, user_utterance):
+
+		user_utterance = normalize(user_utterance)
+
+		self.slu_result = self.slu_function(user_utterance)
+		system_utterance = self.dm.enter(self.slu_result)
+
+		# 有限オートマトンは終了状態、フレームはすべての必須項目が埋まれば終了
+		if hasattr(self.dm, 'current_frame_filled'):
+			self.end = self.dm.current_frame_filled
+		else:
+			self.end = self.dm.end
+
+		return system_utterance
+
+#
+# 用例ベースによる対話セッション
+#
+class ExampleBasedSession(object):
+
+	# method : 類似度計算の方法（EXAMPLE_BASED_METHODS のキー）
+	# cache : 結果のキャッシュ（ResultCache、Noneならキャッシュしない）
+	def __init__(self, example_based, method='word2vec', cache=None):
+
+		self.example_based = example_based
+
+		if method not in EXAMPLE_BASED_METHODS:
+			raise ValueError('未対応の類似度計算です: %s' % method)
+		self.matching = getattr(example_based, EXAMPLE_BASED_METHODS[method])
+
+		# 同じ発話であれば単語分割から類似度計算までを省略する
+		self.match_sentence = self._match_sentence
+		# 入力は正規化済みのため、そのままキーとする
+		if cache is not None:
+			self.match_sentence = cache.wrap(self._match_sentence, 'example_based.' + method, lambda: example_based.version, key_function=None)
+
+		self.end = False
+
+		# 直前の応答の類似度
+		self.score = None
+
+	# 用例ベースの対話はシステムからは話し始めない
+	def start(self):
+
+		self.end = False
+		self.score = None
+
+		return ''
+
+	# ユーザ発話（テキスト）を入力し、最も類似する用例の応答を返す
+	@tracer.trace('session.respond')
+	def respond(self, user_utterance):
+
+		user_utterance = normalize(user_utterance)
+
+		# ユーザ発話に「終了」が含まれていれば終了
+		if END_WORD in user_utterance:
+			self.end = True
+			return ''
+
+		response, self.score = self.match_sentence(user_utterance)
+
+		return response
+
+	# 最も類似する用例の応答と類似度を返す（類似する用例がなければ ('', 0.)）
+	def _match_sentence(self, user_utterance):
+
+		words = self.example_based.parse_mecab(user_utterance)
+		if len(words) == 0:
+			return '', 0.
+
+		return self.matching(words)
+
+# 対話セッションを作成する
+# models は load_models で読み込んだもの（複数のセッションで共有する）
+def create_session(name, models):
+
+	if name not in SYSTEMS:
+		raise ValueError('未対応のシステムです: %s' % name)
+
+	config = SYSTEMS[name]
+
+	if 'example_based' in config:
+		method = models.get('example_method', config['example_based'])
+		return ExampleBasedSession(models['example_based'], method, models.get('cache'))
+
+	return SluDmSession(get_slu_function(config['slu'], models), create_dm(config['dm']))
+
+if __name__ == '__main__':
+
+	models = load_models(['system2'])
+	session = create_session('system2', models)
+
+	print('システム： ' + session.start())
+
+	for user_utterance in ['京都の辺りで探しています', 'ラーメンがいいです']:
+		print('ユーザ： ' + user_utterance)
+		print('システム： ' + session.respond(user_utterance))
+
+	print('終了：%s' % session.end)
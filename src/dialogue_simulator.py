@@ -0,0 +1,230 @@
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dialogue_session
+from tracer import tracer
+
+#
+# テキストによる対話のシミュレーション
+# 音声認識・音声合成なしで、言語理解＋対話管理（または用例ベース）に大量の対話を入力し、
+# 対話の完了率・完了までのターン数・各処理の時間を集計する
+# 対話の処理の負荷試験や、変更による挙動の変化の確認に使用する
+#
+# ユーザ発話は以下のどちらか
+# ・ランダム（システム毎のユーザ発話の候補から選ぶ）
+# ・スクリプト（JSON Lines形式で1行に1対話 {"system": "system1", "turns": ["...", "..."]}）
+#
+# 実行例（src ディレクトリで実行）
+#   python dialogue_simulator.py --system system1 system2 --dialogues 10000 --workers 4
+#   python dialogue_simulator.py --script dialogues.jsonl
+#
+
+# ルールベースの言語理解（SluRule.parse_frame）で理解できるユーザ発話の候補
+RULE_VALUES = {
+	'place': ['京都', '今出川', '烏丸御池', '百万遍'],
+	'genre': ['ラーメン', 'イタリアン', 'そば', '中華', 'タイ料理'],
+	'budget': ['1000円', '2000円', '3000円'],
+}
+
+RULE_TEMPLATES = {
+	'place': ['%sの辺りで探しています', '%sでお願いします'],
+	'genre': ['%sが食べたいです', '%sがいいです'],
+	'budget': ['予算は%sです', '%sくらいでお願いします'],
+}
+
+# どのスロットにも当てはまらないユーザ発話
+OUT_OF_DOMAIN = ['こんにちは', 'えーと', 'よくわかりません', 'もう一度お願いします']
+
+# 1つの対話の最大のターン数（これを超えたら未完了とする）
+MAX_TURNS = 20
+
+# システム毎のユーザ発話の候補を作成する
+def make_user_utterances(system):
+
+	config = dialogue_session.SYSTEMS[system]
+
+	if 'example_based' in config:
+		from benchmarks.common import load_example_inputs
+		return load_example_inputs() + [dialogue_session.END_WORD]
+
+	if config['slu'] == 'rule':
+		utterances = []
+		for slot_name, templates in RULE_TEMPLATES.items():
+			for template in templates:
+				for value in RULE_VALUES[slot_name]:
+					utterances.append(template % value)
+		return utterances + OUT_OF_DOMAIN
+
+	import slu_ml_data
+	if config['slu'] == 'ml_restaurant':
+		filename = slu_ml_data.FILENAME_RESTAURANT
+	else:
+		filename = slu_ml_data.FILENAME_WEATHER
+
+	return [d[0] for d in slu_ml_data.load_annotated(filename)] + OUT_OF_DOMAIN
+
+# 1つの対話を実行する
+# 戻り値は対話が完了したかどうかと、実行したターン数
+def run_dialogue(session, user_utterances, max_turns=MAX_TURNS):
+
+	session.start()
+
+	num_turns = 0
+	for user_utterance in user_utterances:
+
+		if num_turns >= max_turns:
+			break
+
+		tracer.new_turn()
+		session.respond(user_utterance)
+		num_turns += 1
+
+		if session.end:
+			return True, num_turns
+
+	return False, num_turns
+
+# ランダムなユーザ発話を max_turns 個生成する
+def random_user_utterances(rng, candidates, max_turns=MAX_TURNS):
+
+	return [rng.choice(candidates) for _ in range(max_turns)]
+
+# 各プロセスで共有する（読み込みのみの）データ
+_shared = {}
+
+# 各プロセスの初期化
+def _init_worker(models, candidates, max_turns, trace):
+
+	_shared['models'] = models
+	_shared['candidates'] = candidates
+	_shared['max_turns'] = max_turns
+
+	if trace:
+		tracer.enable()
+
+# 対話をまとめて実行する
+# job は (システム名, ユーザ発話のlist のlist) または (システム名, 対話数, 乱数シード)
+def _run_jobs(job):
+
+	tracer.reset()
+
+	system = job[0]
+	session = dialogue_session.create_session(system, _shared['models'])
+	max_turns = _shared['max_turns']
+
+	if len(job) == 2:
+		scripts = job[1]
+	else:
+		rng = random.Random(job[2])
+		scripts = [random_user_utterances(rng, _shared['candidates'][system], max_turns) for _ in range(job[1])]
+
+	results = []
+	for user_utterances in scripts:
+		results.append(run_dialogue(session, user_utterances, max_turns))
+
+	return system, results, list(tracer.records)
+
+# スクリプトを読み込む
+def load_scripts(filename):
+
+	scripts = []
+	with open(filename, 'r', encoding='utf-8') as f:
+		for line in f:
+			if line.strip():
+				d = json.loads(line)
+				scripts.append((d['system'], d['turns']))
+
+	return scripts
+
+# シミュレーションを実行する
+# scripts を指定しなければ、各システムについて num_dialogues 個のランダムな対話を実行する
+# 戻り値はシステム毎の結果（完了したかどうかとターン数のlist）と、各処理の記録
+def simulate(systems, num_dialogues=1000, scripts=None, num_workers=None, chunk_size=100, seed=0, max_turns=MAX_TURNS, trace=True, example_method=None):
+
+	if scripts is not None:
+		systems = sorted(set(s[0] for s in scripts))
+
+	# モデルは親プロセスで一度だけ読み込み、forkで各プロセスと共有する
+	models = dialogue_session.load_models(systems, example_method=example_method)
+
+	candidates = {}
+	jobs = []
+	if scripts is None:
+		for system in systems:
+			candidates[system] = make_user_utterances(system)
+			for start in range(0, num_dialogues, chunk_size):
+				jobs.append((system, min(chunk_size, num_dialogues - start), seed * 1000003 + len(jobs)))
+	else:
+		for system in systems:
+			turns = [s[1] for s in scripts if s[0] == system]
+			for start in range(0, len(turns), chunk_size):
+				jobs.append((system, turns[start:start + chunk_size]))
+
+	if 'fork' in multiprocessing.get_all_start_methods():
+		context = multiprocessing.get_context('fork')
+	else:
+		context = multiprocessing.get_context()
+
+	results = dict((system, []) for system in systems)
+	records = []
+	with ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_init_worker, initargs=(models, candidates, max_turns, trace)) as executor:
+		for idx, (system, job_results, job_records) in enumerate(executor.map(_run_jobs, jobs)):
+			results[system].extend(job_results)
+
+			# ターン番号はプロセス毎に振られるため、どのジョブの記録かを付けて区別する
+			for r in job_records:
+				r['job'] = idx
+				records.append(r)
+
+	return results, records
+
+# 結果を表示する
+def print_report(results, time_total):
+
+	print('%-10s %10s %12s %12s %12s' % ('system', 'dialogues', 'completion', 'turns(mean)', 'turns(p95)'))
+
+	num_total = 0
+	for system in sorted(results.keys()):
+		r = results[system]
+		turns = sorted(t for completed, t in r if completed)
+		completion = len(turns) / len(r) if len(r) > 0 else 0.0
+		print('%-10s %10d %12.3f %12.2f %12d' % (system, len(r), completion, np.mean(turns) if len(turns) > 0 else 0.0, int(np.percentile(turns, 95)) if len(turns) > 0 else 0))
+		num_total += len(r)
+
+	print()
+	print('全体 : %d 対話, %.2f[sec], %.1f 対話/sec' % (num_total, time_total, num_total / time_total if time_total > 0 else 0.0))
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='テキストによる対話のシミュレーション')
+	parser.add_argument('--system', nargs='+', choices=sorted(dialogue_session.SYSTEMS.keys()), default=['system1', 'system2'], help='シミュレーションするシステム')
+	parser.add_argument('--dialogues', type=int, default=1000, help='システム毎の対話数（ランダムの場合）')
+	parser.add_argument('--script', default=None, help='ユーザ発話のスクリプト（JSON Lines）')
+	parser.add_argument('--workers', type=int, default=None, help='並列に実行するプロセス数（デフォルトはCPU数）')
+	parser.add_argument('--max-turns', type=int, default=MAX_TURNS, help='1つの対話の最大のターン数')
+	parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+	parser.add_argument('--example-method', choices=sorted(dialogue_session.EXAMPLE_BASED_METHODS.keys()), default=None, help='用例ベースの類似度計算の方法')
+	parser.add_argument('--trace', default=None, help='各処理の記録を書き出すファイル（JSON Lines）')
+	args = parser.parse_args()
+
+	scripts = None
+	if args.script is not None:
+		scripts = load_scripts(args.script)
+
+	time_start = time.perf_counter()
+	results, records = simulate(args.system, args.dialogues, scripts, args.workers, seed=args.seed, max_turns=args.max_turns, example_method=args.example_method)
+	time_total = time.perf_counter() - time_start
+
+	print_report(results, time_total)
+	print()
+	tracer.print_summary(records)
+
+	if args.trace is not None:
+		tracer.records = records
+		tracer.export_jsonl(args.trace)
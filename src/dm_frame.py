@@ -2,6 +2,9 @@ from __future__ import division
 
 import sys, os
 
+# 処理時間の計測
+from tracer import tracer
+
 #
 # フレームによる対話管理を行うクラス
 #
@@ -48,28 +51,77 @@ class DmFrame(object):
 		# 最初の発話
 		self.utterance_start = 'こんにちは。京都レストラン案内です。ご質問をどうぞ。'
 
+		# 最後の発話のテンプレート
+		# 固定の部分とスロット値の部分（'$'＋スロット名）に分けておくことで、固定の部分は事前に音声合成できる
+		self.utterances_last = {
+			'budget': ['地域は', '$place', 'で、ジャンルは', '$genre', '、予算は', '$budget', 'ですね。検索します。'],
+			'no_budget': ['地域は', '$place', 'で、ジャンルは', '$genre', 'ですね。検索します。'],
+		}
+
 	# 最後の発話は条件に応じて生成する
-	def gen_utterance_last(self):
+	# フレームが指定されなければ現在のフレームとする
+	def gen_utterance_last(self, frame=None):
 		
-		system_utterance = ""
+		return ''.join(self.gen_utterance_last_segments(frame))
+
+	# 最後の発話を固定の部分とスロット値の部分に分けたlistとして生成する
+	# 音声合成で固定の部分のキャッシュを使う場合（TextToSpeechBase.generate_segments）に明示的に使用する
+	# enter の戻り値は従来どおり１つの文字列のまま
+	def gen_utterance_last_segments(self, frame=None):
+
+		if frame is None:
+			frame = self.current_frame
+
+		segments = []
 
 		# Mandatoryである"place"と"genre"が埋まっているかチェック
-		if 'place' in self.current_frame and 'genre' in self.current_frame:
+		if 'place' in frame and 'genre' in frame:
 			
 			# Optionalである"budget"が埋まっていれば
-			if 'budget' in self.current_frame:
-				system_utterance = '地域は%sで、ジャンルは%s、予算は%sですね。検索します。' % (self.current_frame['place'], self.current_frame['genre'], self.current_frame['budget'])
+			if 'budget' in frame:
+				template = self.utterances_last['budget']
 			
 			# "budget"が埋まっていなければ
 			else:
-				system_utterance = '地域は%sで、ジャンルは%sですね。検索します。' % (self.current_frame['place'], self.current_frame['genre'])
+				template = self.utterances_last['no_budget']
+
+			# スロット値の部分を置き換える
+			for segment in template:
+				if segment.startswith('$'):
+					segments.append(frame[segment[1:]])
+				else:
+					segments.append(segment)
 		
-		return system_utterance
+		return segments
 
 	# 入力であるユーザ発話に応じて、フレームの状態を更新し、システム発話を出力し
 	# ただし、ユーザ発話の情報は「意図、スロット名、スロット値」のlistとする
+	@tracer.trace('dm_frame.enter')
 	def enter(self, user_utterance):
 		
+		self._update_frame(self.current_frame, user_utterance)
+
+		system_utterance, filled = self._gen_response(self.current_frame)
+
+		if filled:
+			self.current_frame_filled = True
+		
+		return system_utterance
+
+	# enterと同じ入力に対して、フレームを更新した場合のシステム発話を返す
+	# 現在のフレームは変更しないため、音声認識の途中結果に対して投機的に実行できる
+	def peek(self, user_utterance):
+
+		frame = dict(self.current_frame)
+		self._update_frame(frame, user_utterance)
+
+		system_utterance, _ = self._gen_response(frame)
+
+		return system_utterance
+
+	# ユーザ発話の情報でフレームを更新する
+	def _update_frame(self, frame, user_utterance):
+
 		# １つのユーザ発話に複数のスロットの値が含まれることもある
 		for slot_user_utterance in user_utterance:
 
@@ -78,7 +130,11 @@ class DmFrame(object):
 			input_slot_value = slot_user_utterance['slot_value']
 			
 			# フレームの状態を更新
-			self.current_frame[input_slot_name] = input_slot_value
+			frame[input_slot_name] = input_slot_value
+
+	# フレームの状態からシステム発話を生成する
+	# 戻り値はシステム発話と、すべての"mandatory"の要素が埋まったかどうか
+	def _gen_response(self, frame):
 
 		system_utterance = ""
 		
@@ -89,7 +145,7 @@ class DmFrame(object):
 			slot_name = slot[0]
 			slot_condition = slot[1]
 
-			if slot_condition == 'mandatory' and slot_name not in self.current_frame:
+			if slot_condition == 'mandatory' and slot_name not in frame:
 				system_utterance = self.utterances[slot_name]
 				mandatory_need = True
 				break
@@ -98,11 +154,21 @@ class DmFrame(object):
 		if mandatory_need == False:
 			
 			# システムの発話を生成
-			system_utterance = self.gen_utterance_last()
-
-			self.current_frame_filled = True
+			system_utterance = self.gen_utterance_last(frame)
 		
-		return system_utterance
+		return system_utterance, not mandatory_need
+
+	# まだ埋まっていないスロット名のlistを返す（"mandatory"のものが先）
+	# 音声認識のN-bestから対話の状態に合う候補を選ぶ際に使用する
+	def expected_slots(self):
+
+		slots = []
+		for condition in ['mandatory', 'optional']:
+			for slot in self.frame:
+				if slot[1] == condition and slot[0] not in self.current_frame:
+					slots.append(slot[0])
+
+		return slots
 
 	# 初期状態にリセットする
 	def reset(self):
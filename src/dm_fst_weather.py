@@ -2,6 +2,9 @@ from __future__ import division
 
 import sys, os
 
+# 処理時間の計測
+from tracer import tracer
+
 #
 # 有限オートマトンによる対話管理を行うクラス（天気案内）
 #
@@ -63,8 +66,44 @@ class DmFst(object):
 
 	# 入力であるユーザ発話に応じてシステム発話を出力し、内部状態を遷移させる
 	# ただし、ユーザ発話の情報は「意図、フレーム名、フレーム値」のlistとする
+	@tracer.trace('dm_fst.enter')
 	def enter(self, user_utterance):
 
+		next_state, matched_slot = self._find_transition(user_utterance)
+
+		system_utterance = ""
+
+		# 遷移先が見つかれば遷移する
+		if next_state is not None:
+
+			# 条件にマッチした遷移であればユーザ発話を保持
+			if matched_slot is not None:
+				self.context_user_utterance.append(matched_slot)
+
+			self.current_state = next_state
+			system_utterance = self.get_system_utterance()
+		
+		# 修了状態に達したら
+		if self.current_state == self.end_state:
+			self.end = True
+		
+		return system_utterance
+
+	# enterと同じ入力に対して、遷移した場合のシステム発話を返す
+	# 内部状態は変更しないため、音声認識の途中結果に対して投機的に実行できる
+	def peek(self, user_utterance):
+
+		next_state, _ = self._find_transition(user_utterance)
+
+		if next_state is None:
+			return ""
+		
+		return self.get_system_utterance(next_state)
+
+	# 現在の状態からの遷移のうち、入力にマッチするものを探索する（内部状態は変更しない）
+	# 戻り値は遷移先の状態番号（見つからなければNone）と、条件にマッチしたスロット名・スロット値
+	def _find_transition(self, user_utterance):
+
 		# フレーム名に対して行う
 		# 最初の0番目のindexは1発話に対して複数のスロットが抽出された場合に対応するため
 		# ここでは1発話につき１つのフレームしか含まれないという前提
@@ -75,8 +114,6 @@ class DmFst(object):
 			input_slot_name = u['slot_name']
 			input_slot_value = u['slot_value']
 		
-		system_utterance = ""
-		
 		# 現在の状態からの遷移に対して入力がマッチするか検索
 		for trans in self.transitions:
 			
@@ -85,22 +122,24 @@ class DmFst(object):
 				
 				# 無条件に遷移
 				if trans[2] is None:
-					self.current_state = trans[1]
-					system_utterance = self.get_system_utterance()
-					break
+					return trans[1], None
 				
 				# 条件にマッチすれば遷移
 				if trans[2] == input_slot_name:
-					self.context_user_utterance.append([input_slot_name, input_slot_value])
-					self.current_state = trans[1]
-					system_utterance = self.get_system_utterance()
-					break
+					return trans[1], [input_slot_name, input_slot_value]
 		
-		# 修了状態に達したら
-		if self.current_state == self.end_state:
-			self.end = True
-		
-		return system_utterance
+		return None, None
+
+	# 現在の状態から遷移するために必要なスロット名のlistを返す
+	# 音声認識のN-bestから対話の状態に合う候補を選ぶ際に使用する
+	def expected_slots(self):
+
+		slots = []
+		for trans in self.transitions:
+			if trans[0] == self.current_state and trans[2] is not None:
+				slots.append(trans[2])
+
+		return slots
 
 	# 初期状態にリセットする
 	def reset(self):
@@ -110,12 +149,16 @@ class DmFst(object):
 		self.end = False
 
 	# 指定された状態に対応するシステムの発話を取得
-	def get_system_utterance(self):
+	# 状態が指定されなければ現在の状態とする
+	def get_system_utterance(self, state=None):
 		
+		if state is None:
+			state = self.current_state
+
 		utterance = ""
 		
 		for state_ in self.states:
-			if self.current_state == state_[0]:
+			if state == state_[0]:
 				utterance = state_[1]
 		
 		return utterance
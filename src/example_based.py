@@ -1,65 +1,107 @@
 from __future__ import division
 
+import csv
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import MeCab
 from gensim.models import KeyedVectors
 
+# 処理時間の計測
+from tracer import tracer
+
+# 用例の２段階のインデクス
+from example_index import ClusteredIndex, QuantizedIndex, BM25Index, reserve_rows
+
+# 用例の正規化（入力のユーザ発話と同じ正規化を行う）
+from text_normalizer import normalize
+
 #
 # 用例ベースの対話
 #
 
-class ExampleBased(object):
+# 名詞・形容詞・動詞・感動詞のみを扱う
+TARGET_POS = ['名詞', '形容詞', '動詞', '感動詞']
 
-	# 初期化
-	def __init__(self):
+# 用例データ（CSV）を chunk_size 件ずつ読み込む
+# 応答にカンマが含まれていても正しく読み込めるように csv モジュールを使用する
+def read_pairs(filename, chunk_size=10000):
+
+	chunk = []
+	with open(filename, 'r', encoding='utf8', newline='') as f:
+		for row in csv.reader(f):
+			if len(row) < 2:
+				continue
+			chunk.append([row[0].strip(), row[1].strip()])
+
+			if len(chunk) >= chunk_size:
+				yield chunk
+				chunk = []
+
+	if len(chunk) > 0:
+		yield chunk
+
+# 用例データの件数を数える
+def count_pairs(filename):
+
+	num = 0
+	with open(filename, 'r', encoding='utf8', newline='') as f:
+		for row in csv.reader(f):
+			if len(row) >= 2:
+				num += 1
+
+	return num
+
+# MeCabで分割し、対象の品詞の単語のみを返す
+def parse_mecab_with_tagger(tagger, sentence):
+
+	d_list = tagger.parse(sentence).strip().split('\n')
+	
+	u = []
+	for d in d_list:
 		
-		# 用例データを読み込む
-		self.pair_data = []
-		filename = './data/example-base-data.csv'
-		print('Load from %s' % filename)
-		with open(filename, 'r', encoding='utf8') as f:
-			lines = f.readlines()
-			for line in lines:
-				u1 = line.split(',')[0].strip()
-				u2 = line.split(',')[1].strip()
-				self.pair_data.append([u1, u2])
-				print('%s -> %s' % (u1, u2))
-		print()
+		if d.strip() == 'EOS':
+			break
 		
-		# 各発話をMeCabで分割しておく
-		self.pair_data_mecab = []
-		for d in self.pair_data:
-			u1 = self.parse_mecab(d[0])
-			u2 = d[1]
-			self.pair_data_mecab.append([u1, u2])
+		if len(d.split('\t')) == 2:
+			word = d.split('\t')[0]
+			pos = d.split('\t')[1].split(',')[0]
+		else:
+			word = d.split('\t')[0]
+			pos = d.split('\t')[4].split('-')[0]
 		
-		#
-		# Bag-of-Wordsのための処理
-		#
+		if pos in TARGET_POS:
+			u.append(word)
+	
+	return u
 
-		# 想定ユーザ発話を用いてBag-of-Words表現を作成する
-		# 学習データの想定ユーザ発話の単語を語彙（カバーする単語）とする
-		self.word_list = {}
+# 複数のプロセスでMeCabによる分割を行う場合の各プロセスのデータ
+# MeCabはプロセス毎に１回だけ初期化する
+_shared = {}
 
-		for each_pair in self.pair_data_mecab:
-			for word in each_pair[0]:
-				self.word_list[word] = 1
+def _init_worker():
 
-		print('bag-of-wordsの語彙')
-		print(self.word_list.keys())
+	_shared['tagger'] = MeCab.Tagger('')
 
-		# 単語とそのインデクスを作成する
-		self.word_index = {}
-		for idx, word in enumerate(self.word_list.keys()):
-			self.word_index[word] = idx
+def _parse_mecab_worker(sentences):
 
-		print('bag-of-wordsの語彙と単語インデクス')
-		print(self.word_index)
+	return [parse_mecab_with_tagger(_shared['tagger'], s) for s in sentences]
 
-		# ベクトルの次元数（未知語を扱うためにプラス１）
-		self.vec_len = len(self.word_list.keys()) + 1
-		print('bag-fo-wordsの次元数 = %d' % self.vec_len)
-		print()
+class ExampleBased(object):
+
+	# 初期化
+	# filename : 用例データ（Noneなら空の状態で作成し、load_examples で後から読み込む）
+	# verbose : 読み込んだ用例や語彙を表示するかどうか
+	# num_workers : MeCabによる分割を行うプロセス数（1なら並列化しない）
+	# chunk_size : 一度に処理する用例数（メモリ使用量の上限に影響する）
+	def __init__(self, filename='./data/example-base-data.csv', verbose=False, num_workers=1, chunk_size=10000):
+
+		self.verbose = verbose
+
+		# MeCabの初期化（使い回す）
+		self.mecab_tagger = MeCab.Tagger('')
 
 		#
 		# Word2vecのための処理
@@ -70,32 +112,147 @@ class ExampleBased(object):
 		self.model_w2v = KeyedVectors.load_word2vec_format(model_filename, binary=True)
 
 		# 単語ベクトルの次元数
-		print('word2vecの次元数 = %d' % self.model_w2v.vector_size)
-		print()
-	
+		if verbose:
+			print('word2vecの次元数 = %d' % self.model_w2v.vector_size)
+			print()
+
+		#
+		# 用例データと、類似度計算のための語彙・行列・インデクス
+		# load_examples で用例を追加する度に更新する
+		#
+		# 用例数が多くてもメモリを抑えるため、用例は（単語の系列のtuple, 応答）のみ保持し、
+		# 単語と応答の文字列は同じものを共有する（入力文そのものは保持しない）
+		# 文ベクトルの行列は float32 で保持する
+		#
+
+		self.pair_data_mecab = []
+		self.responses = {}
+
+		# 用例を追加する度に増やす（結果をキャッシュする際のキーに使用する）
+		self.version = 0
+
+		# 想定ユーザ発話を用いてBag-of-Words表現を作成する
+		# 学習データの想定ユーザ発話の単語を語彙（カバーする単語）とし、単語とそのインデクスを保持する
+		self.word_list = {}
+		self.word_index = {}
+
+		# ベクトルの次元数（未知語を扱うためにプラス１）
+		self.vec_len = 1
+
+		# 用例の文ベクトルを正規化して行列にまとめておく
+		# 用例の追加の度に行列全体をコピーしないよう、容量に余裕のある配列（_matrix_buffer）を確保しておき、
+		# example_matrix はその先頭の用例数の行とする
+		self._matrix_buffer = np.zeros((0, self.model_w2v.vector_size), dtype=np.float32)
+		self.example_matrix = self._matrix_buffer[:0]
+
+		# ２段階のインデクス（build_cluster_index で作成する）
+		self.cluster_index = None
+
+		# 量子化したインデクス（quantize_examples で作成する）
+		self.quantized_index = None
+
+		# 単語の重なり（BM25）のインデクス（matching_hybrid で使用する）
+		self.bm25_index = BM25Index()
+
+		if filename is not None:
+			self.load_examples(filename, num_workers, chunk_size)
+
+			if verbose:
+				print('bag-of-wordsの語彙')
+				print(self.word_list.keys())
+				print('bag-of-wordsの語彙と単語インデクス')
+				print(self.word_index)
+				print('bag-fo-wordsの次元数 = %d' % self.vec_len)
+				print()
+
+	# 用例データ（CSV）を読み込み、既存の用例に追加する
+	# chunk_size 件ずつ読み込んで処理するため、ファイル全体をメモリに読み込むことはない
+	# 文ベクトルの行列は事前に件数を数えて確保しておく
+	def load_examples(self, filename, num_workers=1, chunk_size=10000):
+
+		if self.verbose:
+			print('Load from %s' % filename)
+
+		# 文ベクトルの行列を確保する
+		num_before = len(self.pair_data_mecab)
+		if self.example_matrix is not None:
+			self._matrix_buffer = reserve_rows(self._matrix_buffer, num_before, num_before + count_pairs(filename), exact=True)
+
+		executor = None
+		if num_workers > 1:
+			if 'fork' in multiprocessing.get_all_start_methods():
+				context = multiprocessing.get_context('fork')
+			else:
+				context = multiprocessing.get_context()
+			executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_init_worker)
+
+		try:
+			for pairs in read_pairs(filename, chunk_size):
+
+				# 正規化してからMeCabによる分割（並列に処理する場合はプロセス毎にまとめて渡す）
+				sentences = [normalize(d[0]) for d in pairs]
+				if executor is not None:
+					size = max(1, len(sentences) // (num_workers * 4))
+					chunks = [sentences[i:i + size] for i in range(0, len(sentences), size)]
+					list_words = [words for result in executor.map(_parse_mecab_worker, chunks) for words in result]
+				else:
+					list_words = [self.parse_mecab(s) for s in sentences]
+
+				self._add_examples(pairs, list_words)
+
+		finally:
+			if executor is not None:
+				executor.shutdown()
+
+			# 途中で失敗した場合は確保した行列の残りを除く
+			# スライスのままでは確保した行列全体が解放されないため、コピーする
+			num_examples = len(self.pair_data_mecab)
+			if self.example_matrix is not None and num_examples < len(self._matrix_buffer):
+				self._matrix_buffer = self._matrix_buffer[:num_examples].copy()
+				self.example_matrix = self._matrix_buffer
+
+		if self.verbose:
+			print()
+
+	# 分割済みの用例を追加する
+	# 文ベクトルの行列の容量が足りなければ倍に増やす
+	def _add_examples(self, pairs, list_words):
+
+		start = len(self.pair_data_mecab)
+		self.version += 1
+
+		for (u1, u2), words in zip(pairs, list_words):
+			words = tuple(sys.intern(w) for w in words)
+			u2 = self.responses.setdefault(u2, u2)
+			self.pair_data_mecab.append((words, u2))
+			if self.verbose:
+				print('%s -> %s' % (u1, u2))
+
+			# Bag-of-Wordsの語彙に追加
+			for word in words:
+				if word not in self.word_index:
+					self.word_list[word] = 1
+					self.word_index[word] = len(self.word_index)
+
+		self.vec_len = len(self.word_list.keys()) + 1
+
+		# 文ベクトルを追加
+		vecs = self.make_example_matrix(list_words)
+		if self.example_matrix is not None:
+			end = start + len(vecs)
+			self._matrix_buffer = reserve_rows(self._matrix_buffer, start, end)
+			self._matrix_buffer[start:end] = vecs
+			self.example_matrix = self._matrix_buffer[:end]
+		if self.cluster_index is not None:
+			self.cluster_index.add(vecs, np.arange(start, start + len(vecs)))
+		if self.quantized_index is not None:
+			self.quantized_index.add(vecs)
+		self.bm25_index.add(list_words)
+
 	# 各発話をMeCabで分割しておき、名詞・形容詞・動詞・感動詞のみを扱う
 	def parse_mecab(self, sentence):
 		
-		m = MeCab.Tagger ("")
-		d_list = m.parse(sentence).strip().split('\n')
-		
-		u = []
-		for d in d_list:
-			
-			if d.strip() == 'EOS':
-				break
-			
-			if len(d.split('\t')) == 2:
-				word = d.split('\t')[0]
-				pos = d.split('\t')[1].split(',')[0]
-			else:
-				word = d.split('\t')[0]
-				pos = d.split('\t')[4].split('-')[0]
-			
-			if pos in ['名詞', '形容詞', '動詞', '感動詞']:
-				u.append(word)
-		
-		return u
+		return parse_mecab_with_tagger(self.mecab_tagger, sentence)
 
 
 	# 単語の系列とBag-of-Words表現を作成するための情報を受け取りベクトルを返す関数を定義
@@ -119,6 +276,7 @@ class ExampleBased(object):
 	# 類似度計算
 	# 入力：ユーザ発話の単語の系列
 	# 出力：入力ユーザ発話に最も類似するシステム応答
+	@tracer.trace('example_based.matching_bagofwords')
 	def matching_bagofwords(self, input_data_mecab):
 		
 		# コサイン類似度が最も高いものを採用
@@ -132,12 +290,19 @@ class ExampleBased(object):
 			v1 = np.array(self.make_bag_of_words(input_data_mecab))
 			v2 = np.array(self.make_bag_of_words(pair_each[0]))
 			
-			# コサイン類似度を計算
-			cos_sim = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+			# コサイン類似度を計算（単語がない場合は類似度0とする）
+			norm = np.linalg.norm(v1) * np.linalg.norm(v2)
+			if norm == 0.0:
+				continue
+			cos_sim = np.dot(v1, v2) / norm
 			if cos_dist_max < cos_sim:
 				cos_dist_max = cos_sim
 				response = pair_each[1]
 		
+		# 類似する用例がない場合
+		if response is None:
+			return '', 0.
+
 		return ''.join(response), cos_dist_max
 
 	# Word2vecで特徴量を作成する関数を定義
@@ -152,13 +317,15 @@ class ExampleBased(object):
 				sentence_vec += self.model_w2v[w]
 				num_valid_word += 1
 		
-		# 有効な単語数で割
-		sentence_vec /= num_valid_word
+		# 有効な単語数で割る（有効な単語がなければゼロベクトル）
+		if num_valid_word > 0:
+			sentence_vec /= num_valid_word
 		return sentence_vec
 	
 	# 類似度計算（Word2vec版）
 	# 入力：ユーザ発話の単語の系列と用例データ
 	# 出力：入力ユーザ発話に最も類似するシステム応答
+	@tracer.trace('example_based.matching_word2vec')
 	def matching_word2vec(self, input_data_mecab):
 		
 		# コサイン類似度が最も高いものを採用
@@ -168,27 +335,169 @@ class ExampleBased(object):
 		# 用例毎に処理
 		for pair_each in self.pair_data_mecab:
 			
-			# Bag-of-Words表現に変換
-			v1 = self.make_sentence_vec_with_w2v(input_data_mecab)
-			v2 = self.make_sentence_vec_with_w2v(pair_each[0])
+			# 正規化した文ベクトルに変換（有効な単語がなければゼロベクトル）
+			v1 = self.make_normalized_vec(input_data_mecab)
+			v2 = self.make_normalized_vec(pair_each[0])
 			
 			# コサイン類似度を計算
-			cos_sim = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+			cos_sim = np.dot(v1, v2)
 			if cos_dist_max < cos_sim:
 				cos_dist_max = cos_sim
 				response = pair_each[1]
 		
+		# 類似する用例がない場合
+		if response is None:
+			return '', 0.
+
 		return ''.join(response), cos_dist_max
 
+	# 単語の系列から正規化した文ベクトルを作成する
+	# 有効な単語がなければゼロベクトルとする
+	def make_normalized_vec(self, words):
+
+		vecs = [self.model_w2v[w] for w in words if w in self.model_w2v]
+		if len(vecs) == 0:
+			return np.zeros(self.model_w2v.vector_size, dtype=np.float32)
+
+		sentence_vec = np.mean(vecs, axis=0, dtype=np.float32)
+		norm = np.linalg.norm(sentence_vec)
+		if norm > 0.0:
+			sentence_vec = sentence_vec / norm
+
+		return sentence_vec
+
+	# 複数の単語の系列から正規化した文ベクトルの行列を作成する
+	def make_example_matrix(self, list_words):
+
+		matrix = np.zeros((len(list_words), self.model_w2v.vector_size), dtype=np.float32)
+		for i, words in enumerate(list_words):
+			matrix[i] = self.make_normalized_vec(words)
+
+		return matrix
+
+	# 類似度計算（Word2vec・文ベクトルの行列を使用）
+	# 事前に作成した行列との積で全ての用例との類似度を一度に求める（結果は matching_word2vec と同じ）
+	# 元の精度の行列を破棄した場合（quantize_examples）は量子化したベクトルとの類似度を求める
+	# 入力：ユーザ発話の単語の系列
+	# 出力：入力ユーザ発話に最も類似するシステム応答
+	@tracer.trace('example_based.matching_word2vec_matrix')
+	def matching_word2vec_matrix(self, input_data_mecab):
+
+		if len(self.pair_data_mecab) == 0:
+			return '', 0.
+
+		vec = self.make_normalized_vec(input_data_mecab)
+		if self.example_matrix is not None:
+			scores = np.dot(self.example_matrix, vec)
+		else:
+			scores = self.quantized_index.scores(vec)
+
+		idx = int(np.argmax(scores))
+		if scores[idx] <= 0.0:
+			return '', 0.
+
+		return ''.join(self.pair_data_mecab[idx][1]), float(scores[idx])
+
+	# 用例の文ベクトルをクラスタリングし、２段階のインデクスを作成する
+	# num_clusters : クラスタ数（Noneなら用例数の平方根）
+	# num_probe : 検索時に調べるクラスタ数
+	def build_cluster_index(self, num_clusters=None, num_probe=3):
+
+		if self.example_matrix is None:
+			raise ValueError('元の精度の文ベクトルがありません（quantize_examples で keep_float=False としたため）')
+
+		self.cluster_index = ClusteredIndex(num_clusters, num_probe).build(self.example_matrix)
+
+	# 類似度計算（Word2vec・２段階のインデクスを使用）
+	# 入力文に近いクラスタの用例のみと類似度を求める（結果は matching_word2vec と異なる場合がある）
+	# 入力：ユーザ発話の単語の系列
+	# 出力：入力ユーザ発話に最も類似するシステム応答
+	@tracer.trace('example_based.matching_word2vec_clustered')
+	def matching_word2vec_clustered(self, input_data_mecab):
+
+		if self.cluster_index is None:
+			self.build_cluster_index()
+
+		results = self.cluster_index.search(self.make_normalized_vec(input_data_mecab), self.example_matrix)
+		if len(results) == 0 or results[0][1] <= 0.0:
+			return '', 0.
+
+		idx, cos_sim = results[0]
+		return ''.join(self.pair_data_mecab[idx][1]), cos_sim
+
+	# 用例の文ベクトルを量子化したインデクスを作成する
+	# dtype : 'float16' または 'int8'
+	# keep_float : 元の精度の行列も残すかどうか
+	#   False（既定）の場合は行列を破棄してメモリを減らす（re-rankingと２段階のインデクスは使用できない）
+	#   True の場合は量子化したベクトルに加えて元の行列も保持するため、メモリはかえって増える
+	def quantize_examples(self, dtype='int8', keep_float=False):
+
+		self.quantized_index = QuantizedIndex(dtype).build(self.example_matrix)
+
+		# ２段階のインデクスは元の精度の行列を参照するため、行列を破棄する場合は使用しない
+		if not keep_float:
+			self.example_matrix = None
+			self._matrix_buffer = None
+			self.cluster_index = None
+
+	# 類似度計算（Word2vec・量子化した文ベクトルを使用）
+	# rerank > 0 の場合は上位 rerank 個の候補について元の精度で類似度を求め直す
+	# （quantize_examples で keep_float=True とした場合のみ、それ以外は量子化した類似度のまま）
+	# 入力：ユーザ発話の単語の系列
+	# 出力：入力ユーザ発話に最も類似するシステム応答
+	@tracer.trace('example_based.matching_word2vec_quantized')
+	def matching_word2vec_quantized(self, input_data_mecab, rerank=10):
+
+		if self.quantized_index is None:
+			self.quantize_examples()
+
+		get_vector = self.example_matrix.__getitem__ if self.example_matrix is not None else None
+		results = self.quantized_index.search(self.make_normalized_vec(input_data_mecab), rerank=rerank, get_vector=get_vector)
+		if len(results) == 0 or results[0][1] <= 0.0:
+			return '', 0.
+
+		idx, cos_sim = results[0]
+		return ''.join(self.pair_data_mecab[idx][1]), cos_sim
+
+	# 類似度計算（単語の重なりとWord2vecの組み合わせ）
+	# BM25のスコア（0〜1）と文ベクトルのコサイン類似度を重み alpha で足し合わせる
+	# どちらも事前に求めた行列との積で全ての用例のスコアを一度に求める
+	# 入力：ユーザ発話の単語の系列
+	# 出力：入力ユーザ発話に最も類似するシステム応答
+	@tracer.trace('example_based.matching_hybrid')
+	def matching_hybrid(self, input_data_mecab, alpha=0.5):
+
+		if len(self.pair_data_mecab) == 0:
+			return '', 0.
+
+		scores = alpha * self.bm25_index.scores(input_data_mecab)
+
+		vec = self.make_normalized_vec(input_data_mecab)
+		if self.example_matrix is not None:
+			scores += (1.0 - alpha) * np.dot(self.example_matrix, vec)
+		else:
+			scores += (1.0 - alpha) * self.quantized_index.scores(vec)
+
+		idx = int(np.argmax(scores))
+		if scores[idx] <= 0.0:
+			return '', 0.
+
+		return ''.join(self.pair_data_mecab[idx][1]), float(scores[idx])
+
+	# 用例を追加する
+	# 語彙・文ベクトルの行列・インデクスを作り直さずに更新する
+	def add_pair(self, u1, u2):
+
+		self._add_examples([[u1, u2]], [self.parse_mecab(normalize(u1))])
 
 if __name__ == '__main__':
 
-	exampleBased = ExampleBased()
+	exampleBased = ExampleBased(verbose=True)
 	m = MeCab.Tagger ("-Owakati")
 
 	# 入力発話
 	input_data = '趣味は何ですか'
-	input_data_mecab = exampleBased.parse_mecab(input_data)
+	input_data_mecab = exampleBased.parse_mecab(normalize(input_data))
 
 	print('Bag-fo-Words')
 	response, cos_dist_max = exampleBased.matching_bagofwords(input_data_mecab)
@@ -0,0 +1,394 @@
+from array import array
+
+import numpy as np
+
+from scipy import sparse
+from sklearn.cluster import KMeans
+
+#
+# 用例の文ベクトルを検索するための２段階のインデクス
+#
+# 事前に用例の文ベクトル（正規化済み）を k-means でクラスタリングしておき、
+# 検索時は入力文のベクトルと各クラスタの中心との類似度を求め、類似度の高い num_probe 個のクラスタに
+# 含まれる用例のみとの類似度を求める（全ての用例との類似度は計算しない）
+#
+# 新しい用例は最も近いクラスタに追加する（クラスタリングはやり直さない）
+# 追加が多くなりクラスタの偏りが大きくなった場合は build で作り直す
+#
+# 用例のベクトルはインデクスには持たず（用例の行列を二重に持たないよう）、クラスタ毎の行番号のみ保持する
+# 検索時は用例の行列（build に渡したものに追加した用例の行を加えたもの）を渡す
+#
+
+class ClusteredIndex(object):
+
+	# num_clusters : クラスタ数（Noneなら用例数の平方根）
+	# num_probe : 検索時に調べるクラスタ数（多いほど正確だが遅くなる）
+	def __init__(self, num_clusters=None, num_probe=3, seed=0):
+
+		self.num_clusters = num_clusters
+		self.num_probe = num_probe
+		self.seed = seed
+
+		self.centroids = None		# クラスタの中心（クラスタ数 x 次元数、正規化済み）
+		self.members = []			# クラスタ毎の用例の行番号
+
+	# 正規化済みのベクトル（用例数 x 次元数）からインデクスを作成する
+	def build(self, matrix):
+
+		matrix = np.atleast_2d(matrix)
+
+		# 用例がなければクラスタも作らない（最初の add で作成する）
+		if len(matrix) == 0:
+			self.centroids = np.zeros((0, matrix.shape[1]))
+			self.members = []
+			return self
+
+		num_clusters = self.num_clusters
+		if num_clusters is None:
+			num_clusters = int(np.sqrt(len(matrix)))
+		num_clusters = max(1, min(num_clusters, len(matrix)))
+
+		kmeans = KMeans(n_clusters=num_clusters, n_init=1, random_state=self.seed)
+		labels = kmeans.fit_predict(matrix)
+
+		# コサイン類似度で比較するため中心も正規化する
+		self.centroids = normalize_rows(kmeans.cluster_centers_)
+
+		self.members = [np.where(labels == c)[0] for c in range(num_clusters)]
+
+		return self
+
+	# 用例を追加する（最も近いクラスタに加える）
+	# vectors : 追加する用例のベクトル、ids : 用例の行列での行番号
+	def add(self, vectors, ids):
+
+		vectors = np.atleast_2d(vectors)
+		ids = np.atleast_1d(ids)
+
+		# 空のインデクスの場合は追加する用例でクラスタを作る
+		if len(self.members) == 0:
+			self.build(vectors)
+			self.members = [ids[m] for m in self.members]
+			return
+
+		labels = np.argmax(np.dot(vectors, self.centroids.T), axis=1)
+		for c in np.unique(labels):
+			self.members[c] = np.concatenate([self.members[c], ids[labels == c]])
+
+	# 用例数
+	def __len__(self):
+
+		return sum(len(m) for m in self.members)
+
+	# 正規化済みのベクトルに最も類似する用例を検索する
+	# matrix : 用例の行列（行番号は build・add に渡したものと対応する）
+	# 戻り値は類似度の高い順に top_k 個の（用例の行番号, コサイン類似度）のlist
+	def search(self, vec, matrix, top_k=1):
+
+		if len(self.members) == 0:
+			return []
+
+		# 類似度の高いクラスタを選ぶ
+		centroid_scores = np.dot(self.centroids, vec)
+		num_probe = min(self.num_probe, len(self.centroids))
+		clusters = np.argpartition(-centroid_scores, num_probe - 1)[:num_probe]
+
+		# 選んだクラスタの用例のみと類似度を求める
+		members = np.concatenate([self.members[c] for c in clusters])
+		if len(members) == 0:
+			return []
+		scores = np.dot(matrix[members], vec)
+
+		top_k = min(top_k, len(scores))
+		top = np.argpartition(-scores, top_k - 1)[:top_k]
+		top = top[np.argsort(-scores[top])]
+
+		return [(int(members[i]), float(scores[i])) for i in top]
+
+	# クラスタの大きさの分布（偏りの確認用）
+	def cluster_sizes(self):
+
+		return [len(m) for m in self.members]
+
+#
+# 用例の文ベクトルを量子化して保持するインデクス
+#
+# 'float16' : 半精度（float32の1/2、float64の1/4のメモリ）
+# 'int8' : 行毎のスケールを掛けると元のベクトルになる -127〜127 の整数（float32の約1/4、float64の約1/8のメモリ）
+#
+# 類似度は量子化したまま求め（キャッシュに収まるよう block_size 行ずつfloat32に変換して計算する）、
+# 必要に応じて上位の候補のみ元の精度のベクトルで類似度を求め直す（re-ranking）
+#
+class QuantizedIndex(object):
+
+	def __init__(self, dtype='int8', block_size=2048):
+
+		if dtype not in ['float16', 'int8']:
+			raise ValueError('未対応の量子化の形式です: %s' % dtype)
+
+		self.dtype = dtype
+		self.block_size = block_size
+
+		self.codes = None		# 量子化したベクトル（用例数 x 次元数）
+		self.scales = None		# 行毎のスケール（int8の場合のみ）
+
+		# 追加のための容量を含めた配列（codes・scales はこの先頭の部分）
+		self._codes_buffer = None
+		self._scales_buffer = None
+
+	# ベクトルを量子化する
+	def _quantize(self, matrix):
+
+		matrix = np.atleast_2d(matrix)
+
+		if self.dtype == 'float16':
+			return matrix.astype(np.float16), None
+
+		scales = np.abs(matrix).max(axis=1) / 127.0
+		scales[scales == 0.0] = 1.0
+		codes = np.round(matrix / scales[:, np.newaxis]).astype(np.int8)
+
+		return codes, scales.astype(np.float32)
+
+	# 正規化済みのベクトル（用例数 x 次元数）からインデクスを作成する
+	def build(self, matrix):
+
+		self.codes, self.scales = self._quantize(matrix)
+		self._codes_buffer, self._scales_buffer = self.codes, self.scales
+		return self
+
+	# 用例を追加する
+	def add(self, vectors):
+
+		codes, scales = self._quantize(vectors)
+
+		start = len(self.codes)
+		end = start + len(codes)
+		self._codes_buffer = reserve_rows(self._codes_buffer, start, end)
+		self._codes_buffer[start:end] = codes
+		self.codes = self._codes_buffer[:end]
+
+		if scales is not None:
+			self._scales_buffer = reserve_rows(self._scales_buffer, start, end)
+			self._scales_buffer[start:end] = scales
+			self.scales = self._scales_buffer[:end]
+
+	def __len__(self):
+
+		return len(self.codes)
+
+	# 量子化したベクトルが使用するメモリ[byte]（追加のための容量を含む）
+	def nbytes(self):
+
+		return self._codes_buffer.nbytes + (self._scales_buffer.nbytes if self._scales_buffer is not None else 0)
+
+	# 全ての用例との類似度（量子化による誤差を含む）を求める
+	def scores(self, vec):
+
+		vec = np.asarray(vec, dtype=np.float32)
+
+		scores = np.empty(len(self.codes), dtype=np.float32)
+		for start in range(0, len(self.codes), self.block_size):
+			block = self.codes[start:start + self.block_size].astype(np.float32)
+			scores[start:start + len(block)] = np.dot(block, vec)
+
+		if self.scales is not None:
+			scores *= self.scales
+
+		return scores
+
+	# 正規化済みのベクトルに最も類似する用例を検索する
+	# rerank > 0 の場合は、量子化した類似度の上位 rerank 個について get_vector(用例の番号) で
+	# 元の精度のベクトルを得て類似度を求め直す
+	# 戻り値は類似度の高い順に top_k 個の（用例の番号, コサイン類似度）のlist
+	def search(self, vec, top_k=1, rerank=0, get_vector=None):
+
+		if self.codes is None or len(self.codes) == 0:
+			return []
+
+		scores = self.scores(vec)
+
+		num_candidates = min(max(top_k, rerank), len(scores))
+		candidates = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+
+		if rerank > 0 and get_vector is not None:
+			candidate_scores = np.array([np.dot(get_vector(i), vec) for i in candidates])
+		else:
+			candidate_scores = scores[candidates]
+
+		order = np.argsort(-candidate_scores)[:top_k]
+
+		return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
+
+#
+# 単語の重なりによる類似度（BM25）を求めるためのインデクス
+#
+# 用例毎の各単語のBM25の重み（idf を除く部分）を疎行列（単語数 x 用例数）として事前に求めておき、
+# 入力文の単語の行に idf を掛けて足し合わせるだけで全ての用例のスコアが得られる
+# スコアは入力文に対する上限（idf の和 × (k1 + 1)）で割って 0〜1 にする
+#
+# 用例の追加は全体を作り直さずに反映する
+# ・各単語の出現用例数（df）と用例毎の単語数は追加の度に更新し、idf のみ計算し直す（語彙数に比例）
+# ・追加した用例の重みは追加分のみの疎行列（セグメント）として作成する
+#   セグメントが増えすぎないよう、直前のセグメントと大きさが同程度になったら２つをまとめて作り直す
+#   （用例１つあたりの作り直しは用例数の対数に比例する回数で済む）
+# ・平均の単語数は全体を作り直した時点のものを使い、追加した用例数がその時点の用例数を超えたら全体を作り直す
+#
+class BM25Index(object):
+
+	def __init__(self, k1=1.5, b=0.75):
+
+		self.k1 = k1
+		self.b = b
+
+		self.word_index = {}		# 単語とそのインデクス
+		# 用例数が多い場合にメモリを抑えるため、Pythonのlistではなく32bit整数のarrayで保持する
+		self._rows = array('i')		# 単語のインデクス（用例毎の出現回数の疎行列を作るためのデータ）
+		self._cols = array('i')		# 用例の番号
+		self._counts = array('i')	# 出現回数
+		self.doc_lengths = array('i')	# 用例毎の単語数
+		self.df = array('i')		# 単語毎の出現用例数
+
+		self.term_doc = None		# 全体を作り直した時点の用例の重み（単語数 x 用例数、idf を除く）
+		self.segments = []			# その後に追加した用例の重み（_rows の開始位置, 最初の用例の番号, 疎行列）のlist
+		self.idf = None
+		self.avg_length = 1.0		# 全体を作り直した時点の平均の単語数
+
+		self._num_built_docs = 0	# term_doc に含まれる用例数
+		self._num_built_entries = 0	# term_doc の作成に使った _rows の件数
+		self._segments_end = (0, 0)	# セグメントに含まれる _rows の件数と用例数
+		self._dirty = True
+
+	# 用例（単語の系列のlist）を追加する
+	# 重みは次に検索するときに追加分のみ計算する
+	def add(self, list_words):
+
+		for words in list_words:
+			doc = len(self.doc_lengths)
+			counts = {}
+			for w in words:
+				if w not in self.word_index:
+					self.word_index[w] = len(self.word_index)
+					self.df.append(0)
+				counts[self.word_index[w]] = counts.get(self.word_index[w], 0) + 1
+
+			for term, count in counts.items():
+				self._rows.append(term)
+				self._cols.append(doc)
+				self._counts.append(count)
+				self.df[term] += 1
+			self.doc_lengths.append(len(words))
+
+		self._dirty = True
+		return self
+
+	def __len__(self):
+
+		return len(self.doc_lengths)
+
+	# _rows などの start 件目以降から、用例の番号が first_doc 以降の用例の重みの疎行列を作成する
+	def _make_term_doc(self, start, first_doc):
+
+		num_docs = len(self.doc_lengths)
+		num_terms = len(self.word_index)
+
+		rows = np.array(self._rows[start:], dtype=np.int64)
+		cols = np.array(self._cols[start:], dtype=np.int64) - first_doc
+		tf = np.array(self._counts[start:], dtype=np.float32)
+
+		doc_lengths = np.array(self.doc_lengths[first_doc:], dtype=np.float32)
+		norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[cols] / self.avg_length)
+
+		weights = tf * (self.k1 + 1.0) / (tf + norm)
+		return sparse.csr_matrix((weights, (rows, cols)), shape=(num_terms, num_docs - first_doc))
+
+	# BM25の重みを計算する
+	def _update(self):
+
+		num_docs = len(self.doc_lengths)
+
+		# 初回と、追加した用例数が作成時の用例数を超えた場合は全体を作り直す
+		if self.term_doc is None or num_docs - self._num_built_docs > self._num_built_docs:
+			avg_length = float(np.mean(self.doc_lengths)) if num_docs > 0 else 0.0
+			self.avg_length = avg_length if avg_length > 0.0 else 1.0
+
+			self.term_doc = self._make_term_doc(0, 0)
+			self.segments = []
+			self._num_built_docs = num_docs
+			self._num_built_entries = len(self._rows)
+
+		else:
+			# 前回から追加した用例のセグメントを作成する
+			if len(self.segments) > 0:
+				start, first_doc = self._segments_end
+			else:
+				start, first_doc = self._num_built_entries, self._num_built_docs
+
+			if first_doc < num_docs:
+				self.segments.append((start, first_doc, self._make_term_doc(start, first_doc)))
+
+			# 直前のセグメントより大きくなったら（同程度なら）まとめる
+			while len(self.segments) >= 2 and self.segments[-1][2].shape[1] * 2 >= self.segments[-2][2].shape[1]:
+				self.segments.pop()
+				start, first_doc, _ = self.segments.pop()
+				self.segments.append((start, first_doc, self._make_term_doc(start, first_doc)))
+
+		# セグメントに含まれる最後の位置
+		self._segments_end = (len(self._rows), num_docs)
+
+		# 各単語が出現する用例数から idf を求める
+		df = np.array(self.df, dtype=np.float32)
+		self.idf = np.log(1.0 + (num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+		self._dirty = False
+
+	# 疎行列の単語 terms の行に idf を掛けて足し合わせる
+	def _term_scores(self, term_doc, terms):
+
+		terms = [t for t in terms if t < term_doc.shape[0]]
+		if len(terms) == 0:
+			return np.zeros(term_doc.shape[1], dtype=np.float32)
+
+		return np.asarray(term_doc[terms].T.dot(self.idf[terms]), dtype=np.float32).ravel()
+
+	# 全ての用例のスコア（0〜1）を求める
+	def scores(self, words):
+
+		if self._dirty:
+			self._update()
+
+		terms = sorted(set(self.word_index[w] for w in words if w in self.word_index))
+		if len(terms) == 0:
+			return np.zeros(len(self.doc_lengths), dtype=np.float32)
+
+		scores = self._term_scores(self.term_doc, terms)
+		if len(self.segments) > 0:
+			scores = np.concatenate([scores] + [self._term_scores(term_doc, terms) for _, _, term_doc in self.segments])
+
+		max_score = self.idf[terms].sum() * (self.k1 + 1.0)
+		if max_score > 0.0:
+			scores /= max_score
+
+		return scores
+
+# 各行を正規化する（ゼロベクトルはそのまま）
+def normalize_rows(matrix):
+
+	norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+	norms[norms == 0.0] = 1.0
+	return matrix / norms
+
+# 行を追加するための配列（先頭 num_rows 行が使用中）の容量を capacity 行以上にする
+# 足りない場合は現在の容量の倍以上の配列を確保して使用中の行をコピーする（追加の度に全体をコピーしない）
+# exact=True の場合は capacity 行ちょうどを確保する（追加する件数が分かっている場合）
+def reserve_rows(buffer, num_rows, capacity, exact=False):
+
+	if len(buffer) >= capacity:
+		return buffer
+
+	if not exact:
+		capacity = max(capacity, 2 * len(buffer))
+
+	new_buffer = np.zeros((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+	new_buffer[:num_rows] = buffer[:num_rows]
+	return new_buffer
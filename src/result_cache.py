@@ -0,0 +1,138 @@
+from __future__ import division
+
+from collections import OrderedDict
+
+from text_normalizer import normalize
+
+#
+# 言語理解・用例ベースの処理結果のキャッシュ
+#
+# 実際の対話では「こんにちは」「もう一度」のように同じ（または表記の揺れだけが異なる）ユーザ発話が多い
+# 正規化した発話（text_normalizer.py）とモデルのバージョンをキーとして処理結果を保持しておき、
+# 同じ入力に対しては単語分割・ベクトル化・類似度計算などを行わずに以前の結果を返す
+#
+# 処理には正規化した発話を渡す（キーが同じ発話の結果は必ず同じになるようにするため）
+# 句読点は言語理解の結果を変えることがあるため（「烏丸、御池」「烏丸御池」）キーから除かない
+#
+# 件数が max_size を超えたら最も長く使われていないもの（LRU）から捨てる
+# ヒット率は hits・misses・hit_rate() で確認できる
+#
+# 結果のオブジェクトはそのまま返すため、呼び出し側で変更しないこと
+#
+# 使用例
+#   cache = ResultCache(max_size=10000)
+#   parse_frame = cache.wrap(slu_parser.parse_frame, 'slu_rule')
+#   parse_frame('３０００円 以下で')		# 'slu_rule.parse_frame' を '3000円以下で' で実行する
+#   parse_frame('3000円以下で')		# キャッシュから返す
+#
+
+class ResultCache(object):
+
+	# 見つからなかったことを表す値（None も結果として保持できるようにする）
+	_missing = object()
+
+	def __init__(self, max_size=10000):
+
+		if max_size <= 0:
+			raise ValueError('キャッシュの件数は1以上を指定してください: %d' % max_size)
+
+		self.max_size = max_size
+		self.items = OrderedDict()
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __len__(self):
+
+		return len(self.items)
+
+	def __contains__(self, key):
+
+		return key in self.items
+
+	# キーに対応する結果を返す（なければ default）
+	def get(self, key, default=None):
+
+		value = self.items.get(key, self._missing)
+
+		if value is self._missing:
+			self.misses += 1
+			return default
+
+		self.hits += 1
+		self.items.move_to_end(key)
+		return value
+
+	# 結果を保持する
+	def put(self, key, value):
+
+		self.items[key] = value
+		self.items.move_to_end(key)
+
+		while len(self.items) > self.max_size:
+			self.items.popitem(last=False)
+			self.evictions += 1
+
+	# 関数の前にキャッシュを置く
+	# 戻り値は、発話（テキスト）を受け取り func(key_function(発話)) の結果を返す関数
+	# name : 処理の名前（同じキャッシュを複数の処理で共有するためキーに含める）
+	# get_version : モデルのバージョンを返す関数（モデルが更新されたら以前の結果は使わない）
+	# key_function : 発話を正規化する関数（結果をキーとし、func にも渡す）
+	#   呼び出し側で正規化済みの場合は None（発話をそのままキーとする）
+	def wrap(self, func, name, get_version=None, key_function=normalize):
+
+		def cached_func(text):
+
+			norm = key_function(text) if key_function is not None else text
+
+			version = get_version() if get_version is not None else None
+			key = (name, version, norm)
+
+			value = self.get(key, self._missing)
+			if value is self._missing:
+				value = func(norm)
+				self.put(key, value)
+
+			return value
+
+		return cached_func
+
+	# ヒット率
+	def hit_rate(self):
+
+		total = self.hits + self.misses
+		return self.hits / total if total > 0 else 0.0
+
+	# 件数やヒット率をまとめた辞書
+	def stats(self):
+
+		return {
+			'size': len(self.items),
+			'max_size': self.max_size,
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions,
+			'hit_rate': self.hit_rate(),
+		}
+
+	# 保持している結果と集計をすべて破棄する
+	def clear(self):
+
+		self.items.clear()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+if __name__ == '__main__':
+
+	from slu_rule import SluRule
+
+	slu_parser = SluRule()
+	cache = ResultCache(max_size=2)
+	parse_frame = cache.wrap(slu_parser.parse_frame, 'slu_rule')
+
+	for sentence in ['京都駅 周辺で', '京都駅周辺で', 'ラーメンがいいです', '３０００円以下で', '3000円以下で', '京都駅周辺で']:
+		print('%s : %s' % (sentence, parse_frame(sentence)))
+
+	print(cache.stats())
@@ -0,0 +1,204 @@
+import sys
+
+import MeCab
+
+#
+# スロット値推定（CRF）で使用する特徴量を作成するクラス
+# 単語そのものに加えて、品詞・読み・文字種・前後の単語の情報を特徴量とする
+#
+# 処理時間を増やさないために以下の工夫をしている
+# ・品詞と読みは単語分割と同じMeCabの1回の解析で取得する
+# ・特徴量の文字列は sys.intern で共有し、単語毎の特徴量の辞書はキャッシュして再利用する
+#
+# 学習（slu_ml_train.py）と推定（SluML）で同じものを使用する
+#
+
+# 特徴量の種類を変更したらバージョンを上げる（学習済みモデル・キャッシュとの対応に使用）
+FEATURE_VERSION = 1
+
+class CrfFeatureExtractor(object):
+
+	# window : 特徴量に含める前後の単語の数
+	# cache_size : 単語毎の特徴量をキャッシュする数（超えたら消去する）
+	def __init__(self, window=1, cache_size=100000):
+
+		self.window = window
+		self.cache_size = cache_size
+
+		# 品詞と読みを得るために通常の出力形式で解析する
+		self.mecab_tagger = MeCab.Tagger('')
+
+		# 単語毎の特徴量のキャッシュ
+		# キーは（単語、品詞、読み）、値は位置（0, -1, +1, ...）毎の特徴量の辞書
+		self._cache = {}
+
+	# pickleで保存する際にMeCabとキャッシュは含めない
+	def __getstate__(self):
+
+		return {'window': self.window, 'cache_size': self.cache_size}
+
+	def __setstate__(self, state):
+
+		self.__init__(**state)
+
+	# 単語毎の特徴量のキャッシュを消去する
+	def clear_cache(self):
+
+		self._cache.clear()
+
+	# 文をMeCabで解析し、（単語、品詞、読み）のlistを返す
+	# 単語の分割は -Owakati の場合と同じになる
+	def tokenize(self, sentence):
+
+		tokens = []
+		for line in self.mecab_tagger.parse(sentence).split('\n'):
+
+			if line == 'EOS' or line == '':
+				break
+
+			cols = line.split('\t')
+
+			# IPA辞書の形式（単語\t品詞,品詞細分類1,...,読み,発音）
+			if len(cols) == 2:
+				feats = cols[1].split(',')
+				pos = feats[0] + '-' + feats[1] if len(feats) > 1 else feats[0]
+				reading = feats[7] if len(feats) > 7 else '*'
+
+			# UniDicの形式（単語\t発音\t読み\t語彙素\t品詞-品詞細分類1-...\t...）
+			else:
+				pos = '-'.join(cols[4].split('-')[:2]) if len(cols) > 4 else '*'
+				reading = cols[2] if len(cols) > 2 else '*'
+
+			tokens.append((cols[0], pos, reading))
+
+		return tokens
+
+	# 単語分割済みの単語の系列（学習データ）に品詞と読みを付与する
+	# 文全体をMeCabで解析し、各単語の先頭の位置にある形態素の品詞と読みを使用する
+	def tokens_from_words(self, words):
+
+		tokens = self.tokenize(''.join(words))
+
+		# 各形態素の開始位置
+		starts = []
+		pos_char = 0
+		for t in tokens:
+			starts.append(pos_char)
+			pos_char += len(t[0])
+
+		results = []
+		pos_char = 0
+		idx = 0
+		for w in words:
+			while idx + 1 < len(tokens) and starts[idx + 1] <= pos_char:
+				idx += 1
+
+			if len(tokens) > 0:
+				results.append((w, tokens[idx][1], tokens[idx][2]))
+			else:
+				results.append((w, '*', '*'))
+
+			pos_char += len(w)
+
+		return results
+
+	# 文字種を返す
+	@staticmethod
+	def char_type(word):
+
+		types = set()
+		for c in word:
+			if '぀' <= c <= 'ゟ':
+				types.add('hira')
+			elif '゠' <= c <= 'ヿ':
+				types.add('kata')
+			elif '一' <= c <= '鿿':
+				types.add('kanji')
+			elif c.isdigit():
+				types.add('digit')
+			elif c.isalpha():
+				types.add('alpha')
+			else:
+				types.add('other')
+
+		if len(types) == 1:
+			return types.pop()
+
+		return 'mixed'
+
+	# 単語毎の特徴量を位置（0, -1, +1, ...）毎に作成する
+	# 同じ単語は何度も現れるためキャッシュする
+	def _token_features(self, token):
+
+		features = self._cache.get(token)
+		if features is not None:
+			return features
+
+		surface, pos, reading = token
+		base = {
+			'w': surface,
+			'pos': pos,
+			'read': reading,
+			'ctype': self.char_type(surface),
+			'suf': surface[-1:],
+		}
+
+		features = {}
+		for offset in range(-self.window, self.window + 1):
+			if offset == 0:
+				prefix = ''
+			else:
+				prefix = '%+d:' % offset
+			features[offset] = dict((sys.intern(prefix + k), sys.intern(v)) for k, v in base.items())
+
+		if len(self._cache) >= self.cache_size:
+			self._cache.clear()
+		self._cache[token] = features
+
+		return features
+
+	# （単語、品詞、読み）の系列からCRFの特徴量（単語毎の辞書のlist）を作成する
+	def sentence_features(self, tokens):
+
+		token_features = [self._token_features(t) for t in tokens]
+
+		results = []
+		for i in range(len(tokens)):
+
+			feats = dict(token_features[i][0])
+
+			# 前後の単語の特徴量
+			for offset in range(-self.window, self.window + 1):
+				if offset == 0:
+					continue
+
+				j = i + offset
+				if 0 <= j < len(tokens):
+					feats.update(token_features[j][offset])
+				elif j < 0:
+					feats['BOS'] = True
+				else:
+					feats['EOS'] = True
+
+			results.append(feats)
+
+		return results
+
+	# 文から単語の系列とCRFの特徴量を作成する（推定時に使用）
+	def extract(self, sentence):
+
+		tokens = self.tokenize(sentence)
+		return [t[0] for t in tokens], self.sentence_features(tokens)
+
+	# 単語分割済みの単語の系列からCRFの特徴量を作成する（学習時に使用）
+	def extract_from_words(self, words):
+
+		return self.sentence_features(self.tokens_from_words(words))
+
+if __name__ == '__main__':
+
+	extractor = CrfFeatureExtractor()
+
+	words, features = extractor.extract('京都駅付近で牛丼屋はありますか')
+	for word, feats in zip(words, features):
+		print(word, feats)
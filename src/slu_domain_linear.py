@@ -0,0 +1,85 @@
+import zlib
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+#
+# 線形モデル（ロジスティック回帰）によるドメイン推定
+# 特徴量はWord2vecの文ベクトルと、必要に応じて単語のハッシュによるBag-of-Words
+# 学習後は重み行列のみを保持し、推定は行列積１回で確率（各ドメインの信頼度）を求める
+# SVM（svm.SVC）と異なり、推定の処理時間はサポートベクタの数に依存しない
+#
+
+# ハッシュによるBag-of-Wordsの次元数（0なら使用しない）
+NUM_HASH_FEATURES = 1024
+
+class LinearDomainClassifier(object):
+
+	def __init__(self, num_hash_features=NUM_HASH_FEATURES, C=1.0):
+
+		self.num_hash_features = num_hash_features
+		self.C = C
+
+		# 学習後に設定される
+		self.classes = None		# ラベルの一覧
+		self.coef = None		# 重み行列（ラベル数 x 特徴量の次元数、２値の場合は 1 x 次元数）
+		self.intercept = None	# バイアス
+
+	# 単語のハッシュによるBag-of-Wordsを作成する
+	# 語彙を持たないため、学習データにない単語も扱える
+	def make_hash_bow(self, words):
+
+		vec = np.zeros(self.num_hash_features)
+		for w in words:
+			vec[zlib.crc32(w.encode('utf-8')) % self.num_hash_features] = 1.0
+
+		# 単語数の影響を抑えるために正規化
+		norm = np.linalg.norm(vec)
+		if norm > 0.0:
+			vec /= norm
+
+		return vec
+
+	# Word2vecの文ベクトル（行列）と単語の系列から特徴量の行列を作成する
+	def make_features(self, list_words, w2v_matrix):
+
+		w2v_matrix = np.atleast_2d(w2v_matrix)
+
+		if self.num_hash_features == 0:
+			return w2v_matrix
+
+		bow = np.array([self.make_hash_bow(words) for words in list_words])
+		return np.hstack([w2v_matrix, bow])
+
+	# 学習
+	# 学習後はロジスティック回帰の重みのみを保持する
+	def fit(self, x, y):
+
+		clf = LogisticRegression(C=self.C, max_iter=1000)
+		clf.fit(x, y)
+
+		self.classes = clf.classes_
+		self.coef = clf.coef_.astype(np.float32)
+		self.intercept = clf.intercept_.astype(np.float32)
+
+		return self
+
+	# 各ドメインの確率を返す（データ数 x ラベル数）
+	def predict_proba(self, x):
+
+		scores = np.dot(np.atleast_2d(x).astype(np.float32), self.coef.T) + self.intercept
+
+		# ２値の場合はシグモイド関数
+		if scores.shape[1] == 1:
+			p = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+			return np.stack([1.0 - p, p], axis=1)
+
+		# 多値の場合はソフトマックス関数
+		scores -= scores.max(axis=1, keepdims=True)
+		e = np.exp(scores)
+		return e / e.sum(axis=1, keepdims=True)
+
+	# 最も確率の高いドメインのラベルを返す
+	def predict(self, x):
+
+		return self.classes[np.argmax(self.predict_proba(x), axis=1)]
@@ -0,0 +1,284 @@
+try:
+	import re._parser as sre_parse
+except ImportError:
+	import sre_parse
+
+import re
+
+# 途中結果の正規化
+from text_normalizer import normalize
+
+#
+# 音声認識の途中結果に対する逐次的な言語理解
+#
+# 途中結果は約100ms毎に得られ、多くの場合は前回の文の末尾に文字が追加されたものになる
+# 前回の文と共通の部分（先頭から一致する部分）の処理結果を保持しておき、変化した部分のみを処理する
+#
+# ・IncrementalSluRule : SluRule.parse_frame（正規表現）の逐次版
+# ・IncrementalSluML : SluML のスロット値抽出（MeCab＋CRF）の逐次版
+#
+# どちらも parse(文) でスロットのlistを返す（元の言語理解と同じ形式）
+# 単語分割は文脈によって変わるため、IncrementalSluML の途中結果に対する結果は全体を処理した場合と
+# 異なることがある。確定結果は parse(文, final=True) とすると全体を処理し直す
+# 前回からのスロットの変化は last_delta に保持し、delta_callback を指定すると変化があったときに呼び出す
+# 1つの発話が終わったら（確定結果を処理したら）reset() を呼ぶ
+# 途中結果は正規化（text_normalizer.py）してから処理する（共通部分も正規化した文で求める）
+#
+# 使用例
+#   slu = IncrementalSluRule(SluRule())
+#   asrStream = GoogleStreamingASR(RATE, micStream, interim_callback=slu.parse)
+#   SpeculativeResponder(slu.parse, dm, tts) のように言語理解の関数としても使用できる
+#
+
+# 2つの文の先頭から一致する文字数
+def common_prefix_length(a, b):
+
+	n = min(len(a), len(b))
+	i = 0
+	while i < n and a[i] == b[i]:
+		i += 1
+
+	return i
+
+# スロットのlistの変化を求める
+# 戻り値は追加・変更されたスロットと、なくなったスロット名の辞書
+def slot_delta(slots_before, slots_after):
+
+	before = dict((s['slot_name'], s['slot_value']) for s in slots_before)
+	after = dict((s['slot_name'], s['slot_value']) for s in slots_after)
+
+	updated = [s for s in slots_after if before.get(s['slot_name']) != s['slot_value']]
+	removed = [name for name in before if name not in after]
+
+	return {'updated': updated, 'removed': removed}
+
+#
+# 逐次的な言語理解の共通の処理
+#
+class _IncrementalSlu(object):
+
+	def __init__(self, delta_callback=None):
+
+		self.delta_callback = delta_callback
+		self.reset()
+
+	# 発話の区切りで状態を破棄する
+	def reset(self):
+
+		self.sentence = ''
+		self.slots = []
+		self.last_delta = {'updated': [], 'removed': []}
+
+		# 処理した文字数（効果の確認用）
+		self.num_chars_processed = 0
+		self._reset_state()
+
+	# 途中結果（または確定結果）を処理し、スロットのlistを返す
+	# final=True の場合は以前の処理結果を使用せずに全体を処理する
+	def parse(self, sentence, final=False):
+
+		sentence = normalize(sentence)
+
+		if final:
+			self._reset_state()
+			prefix = 0
+
+		elif sentence == self.sentence:
+			self.last_delta = {'updated': [], 'removed': []}
+			return self.slots
+
+		else:
+			prefix = common_prefix_length(self.sentence, sentence)
+
+		slots = self._parse(sentence, prefix)
+
+		self.last_delta = slot_delta(self.slots, slots)
+		self.sentence = sentence
+		self.slots = slots
+
+		if self.delta_callback is not None and (self.last_delta['updated'] or self.last_delta['removed']):
+			self.delta_callback(self.last_delta)
+
+		return slots
+
+	def _reset_state(self):
+		raise NotImplementedError()
+
+	def _parse(self, sentence, prefix):
+		raise NotImplementedError()
+
+#
+# SluRule.parse_frame の逐次版
+#
+# 各フレームの正規表現がマッチする最大の長さ（width）を事前に求めておき、
+# 前回のマッチ結果が共通部分の中で確定していれば再利用し、そうでなければ
+# 変化した位置から width だけ手前の位置以降のみを探索する
+#
+class IncrementalSluRule(_IncrementalSlu):
+
+	def __init__(self, slu_rule, delta_callback=None):
+
+		# フレームの正規表現をコンパイルし、マッチする最大の長さを求める
+		self.frames = []
+		for slot_name, pattern in slu_rule.frames:
+			self.frames.append((slot_name, re.compile(pattern), self._max_width(pattern)))
+
+		super(IncrementalSluRule, self).__init__(delta_callback)
+
+	# 正規表現がマッチする最大の長さ（上限がなければNone）
+	@staticmethod
+	def _max_width(pattern):
+
+		width = sre_parse.parse(pattern).getwidth()[1]
+		if width >= sre_parse.MAXREPEAT:
+			return None
+
+		return width
+
+	def _reset_state(self):
+
+		# フレーム毎のマッチ結果（開始位置, 終了位置）
+		self.matches = [None] * len(self.frames)
+
+	def _parse(self, sentence, prefix):
+
+		results = []
+
+		for idx, (slot_name, regex, width) in enumerate(self.frames):
+
+			match = self.matches[idx]
+
+			# 最大の長さが分からなければ全体を探索する
+			if width is None:
+				pos = 0
+				match = None
+
+			# 前回のマッチが共通部分の中にあり、それより前から始まるマッチが
+			# 変化した部分に掛かることもなければそのまま使用する
+			elif match is not None and match[0] + width <= prefix:
+				pos = None
+
+			# 前回のマッチがなければ、共通部分の中だけで完結するマッチはないため、
+			# 変化した部分に掛かり得る位置から探索する
+			else:
+				pos = 0 if match is not None else max(0, prefix - width + 1)
+				match = None
+
+			if pos is not None:
+				result = regex.search(sentence, pos)
+				self.num_chars_processed += len(sentence) - pos
+				if result is not None:
+					match = (result.start(), result.end())
+
+			self.matches[idx] = match
+
+			if match is not None:
+				results.append({'intent': None, 'slot_name': slot_name, 'slot_value': sentence[match[0]:match[1]]})
+
+		return results
+
+#
+# SluML のスロット値抽出の逐次版
+#
+# 前回の単語分割のうち共通部分の中にある単語（末尾の数単語は後ろに文字が続くと変わり得るため除く）を再利用し、
+# それ以降の部分のみをMeCabで解析する
+# CRFの推定は系列全体に対して行う（単語分割に比べて処理時間は小さい）
+#
+class IncrementalSluML(_IncrementalSlu):
+
+	# domain : 'restaurant' または 'weather'
+	# backoff : 共通部分の末尾から解析し直す単語数（後ろに文字が続くと分割が変わり得るため）
+	def __init__(self, slu_ml, domain='restaurant', backoff=3, delta_callback=None):
+
+		self.slu_ml = slu_ml
+		self.backoff = backoff
+
+		if domain == 'restaurant':
+			self.model = slu_ml.model_slot_restaurant
+		elif domain == 'weather':
+			self.model = slu_ml.model_slot_weather
+		else:
+			raise ValueError('未対応のドメインです: %s' % domain)
+
+		super(IncrementalSluML, self).__init__(delta_callback)
+
+	def _reset_state(self):
+
+		# 前回の単語（品詞・読みを使用する場合は（単語, 品詞, 読み））の系列
+		self.tokens = []
+
+	# 文の一部を単語に分割する
+	def _tokenize(self, text):
+
+		if text == '':
+			return []
+
+		if self.slu_ml.crf_feature_extractor is not None:
+			return self.slu_ml.crf_feature_extractor.tokenize(text)
+
+		return self.slu_ml.mecab_tagger.parse(text).strip().split(' ')
+
+	@staticmethod
+	def _surface(token):
+
+		return token[0] if isinstance(token, tuple) else token
+
+	def _parse(self, sentence, prefix):
+
+		# 共通部分の中で終わる単語を再利用する（末尾の backoff 個の単語は解析し直す）
+		tokens = []
+		end = 0
+		for token in self.tokens:
+			length = len(self._surface(token))
+			if end + length > prefix:
+				break
+			tokens.append(token)
+			end += length
+
+		if self.backoff > 0 and len(tokens) > 0:
+			removed = tokens[-self.backoff:]
+			tokens = tokens[:-self.backoff]
+			end -= sum(len(self._surface(t)) for t in removed)
+
+		self.num_chars_processed += len(sentence) - end
+		tokens = tokens + self._tokenize(sentence[end:])
+		self.tokens = tokens
+
+		if len(tokens) == 0:
+			return []
+
+		words = [self._surface(t) for t in tokens]
+		if self.slu_ml.crf_feature_extractor is not None:
+			features = self.slu_ml.crf_feature_extractor.sentence_features(tokens)
+		else:
+			features = words
+
+		predict_y = self.model.predict_single(features)
+
+		return self.slu_ml._tags_to_slots(words, predict_y)
+
+if __name__ == '__main__':
+
+	from slu_rule import SluRule
+
+	# 音声認識の途中結果を模擬する（1文字ずつ伸びていく）
+	sentence = '京都の辺りでラーメンを3000円くらいで探しています'
+	partials = [sentence[:i] for i in range(1, len(sentence) + 1)]
+
+	slu_rule = SluRule()
+
+	def print_delta(delta):
+		for s in delta['updated']:
+			print('  + %s : %s' % (s['slot_name'], s['slot_value']))
+		for name in delta['removed']:
+			print('  - %s' % name)
+
+	slu = IncrementalSluRule(slu_rule, delta_callback=print_delta)
+	for partial in partials:
+		print(partial)
+		slots = slu.parse(partial)
+
+	print()
+	print('逐次処理の結果 : %s' % slots)
+	print('全体の処理結果 : %s' % slu_rule.parse_frame(sentence))
+	print('処理した文字数 : %d（毎回全体を処理すると %d）' % (slu.num_chars_processed, sum(len(p) for p in partials) * len(slu.frames)))
@@ -2,7 +2,6 @@ from __future__ import division
 
 import re
 import numpy as np
-import pickle
 
 from sklearn import svm
 from sklearn.linear_model import LogisticRegression
@@ -16,30 +15,77 @@ from sklearn_crfsuite import metrics
 
 import MeCab
 
+# 学習済みモデルのファイル名
+from slu_ml_data import model_filenames, load_manifest, load_model
+
+# 処理時間の計測
+from tracer import tracer
+
+# スロット値推定の特徴量（品詞・読みなど）
+from slu_crf_features import CrfFeatureExtractor
+
+# 入力文の正規化
+from text_normalizer import normalize
+
 #
 # 機械学習ベースの言語理解を行うクラス
+# 入力文は正規化（text_normalizer.py）してからドメイン推定・スロット値抽出を行う
+# 正規化は何度行っても結果が変わらないため、呼び出し側で正規化済みの文を渡してもよい
 #
 
 class SluML(object):
 
 	# 初期化
-	def __init__(self):
+	# model_version を指定すると slu_ml_train.py で学習したモデルを読み込む（'latest' なら最新のもの）
+	# domain_model にはドメイン推定のモデル（'svm' または 'linear'）を指定する
+	# slot_features にはスロット値推定の特徴量（'words' は単語のみ、'rich' は品詞・読みなども使用）を指定する
+	# verbose を True にするとスロット値抽出の際に単語とタグを表示する
+	def __init__(self, model_version=None, domain_model='svm', slot_features='words', verbose=False):
+
+		self.verbose = verbose
 		
 		#
 		# 学習済みモデルを読み込む
 		#
 
+		filenames = model_filenames(model_version)
+
+		# 読み込んだモデルのバージョン（結果をキャッシュする際のキーに使用する）
+		# 'latest' は実際のバージョンにする
+		if model_version is None:
+			version = 'default'
+		else:
+			version = load_manifest(model_version)['version']
+		self.version = '%s/%s/%s' % (version, domain_model, slot_features)
+
 		# ドメイン推定
-		filename_model_domain_word2vec = './data/slu-domain-svm-word2vec.model'
-		self.model_domain_word2vec = pickle.load(open(filename_model_domain_word2vec, 'rb'))
+		# 線形モデルの場合は確率も得られる
+		self.domain_model = domain_model
+		if domain_model == 'svm':
+			model_name_domain = 'domain'
+		elif domain_model == 'linear':
+			model_name_domain = 'domain_linear'
+		else:
+			raise ValueError('未対応のドメイン推定のモデルです: %s' % domain_model)
+		self.model_domain_word2vec = load_model(filenames, model_name_domain)
+
+		# スロット値推定の特徴量
+		# 'rich' の場合は品詞・読みなども使用するモデル（slu_ml_train.py で学習）を読み込む
+		self.slot_features = slot_features
+		if slot_features == 'words':
+			suffix = ''
+			self.crf_feature_extractor = None
+		elif slot_features == 'rich':
+			suffix = '_rich'
+			self.crf_feature_extractor = CrfFeatureExtractor()
+		else:
+			raise ValueError('未対応のスロット値推定の特徴量です: %s' % slot_features)
 
 		# スロット値推定（レストラン検索）
-		filename_model_slot_restaurant = './data/slu-slot-restaurant-crf.model'
-		self.model_slot_restaurant = pickle.load(open(filename_model_slot_restaurant, 'rb'))
+		self.model_slot_restaurant = load_model(filenames, 'slot_restaurant' + suffix)
 
 		# スロット値推定（天気案内）
-		filename_model_slot_weather = './data/slu-slot-weather-crf.model'
-		self.model_slot_weather = pickle.load(open(filename_model_slot_weather, 'rb'))
+		self.model_slot_weather = load_model(filenames, 'slot_weather' + suffix)
 		
 		# Word2vecモデルを読み込む
 		model_filename = './data/entity_vector.model.bin'
@@ -73,13 +119,37 @@ class SluML(object):
 		return sentence_vec
 	
 	# ドメイン推定を行う
+	@tracer.trace('slu_ml.estimate_domain')
 	def estimate_domain(self, sentence):
 
-		words = self._parse_input(sentence)
-		featvec = self._make_sentence_vec_with_w2v(words)
-		result = self.model_domain_word2vec.predict([featvec])[0]
+		featvec = self._make_domain_features(sentence)
+		result = self.model_domain_word2vec.predict(featvec)[0]
 
 		return result
+
+	# 各ドメインの確率を推定する（線形モデルの場合のみ）
+	# 戻り値はラベルと確率の辞書
+	@tracer.trace('slu_ml.estimate_domain_proba')
+	def estimate_domain_proba(self, sentence):
+
+		if self.domain_model != 'linear':
+			raise ValueError('確率の推定には domain_model=\'linear\' を指定してください')
+
+		featvec = self._make_domain_features(sentence)
+		proba = self.model_domain_word2vec.predict_proba(featvec)[0]
+
+		return dict(zip(self.model_domain_word2vec.classes.tolist(), proba.tolist()))
+
+	# ドメイン推定の特徴量を作成する
+	def _make_domain_features(self, sentence):
+
+		words = self._parse_input(normalize(sentence))
+		featvec = np.array([self._make_sentence_vec_with_w2v(words)])
+
+		if self.domain_model == 'linear':
+			featvec = self.model_domain_word2vec.make_features([words], featvec)
+
+		return featvec
 	
 	# スロット値抽出を行う（レストラン検索）
 	def extract_slot_restaurant(self, sentence):
@@ -91,14 +161,56 @@ class SluML(object):
 
 		return self._extract_slot(sentence, self.model_slot_weather)
 
+	# 複数の入力文（音声認識のN-bestなど）に対してまとめてスロット値抽出を行う
+	# domain には 'restaurant' または 'weather' を指定する
+	# 同じ入力文は１回だけ処理し、CRFの推定は全ての入力文をまとめて１回で行う
+	@tracer.trace('slu_ml.extract_slot_batch')
+	def extract_slot_batch(self, sentences, domain='restaurant'):
+
+		if domain == 'restaurant':
+			model = self.model_slot_restaurant
+		elif domain == 'weather':
+			model = self.model_slot_weather
+		else:
+			raise ValueError('未対応のドメインです: %s' % domain)
+
+		sentences = [normalize(sentence) for sentence in sentences]
+		unique_sentences = list(dict.fromkeys(sentences))
+
+		inputs = [self._make_slot_features(sentence) for sentence in unique_sentences]
+		predict_ys = model.predict([features for words, features in inputs])
+
+		results = {}
+		for sentence, (words, features), predict_y in zip(unique_sentences, inputs, predict_ys):
+			results[sentence] = self._tags_to_slots(words, predict_y)
+
+		return [results[sentence] for sentence in sentences]
+
 	# スロット値抽出を行う
+	@tracer.trace('slu_ml.extract_slot')
 	def _extract_slot(self, sentence, model):
 
+		words, features = self._make_slot_features(normalize(sentence))
+		predict_y = model.predict([features])[0]
+
+		if self.verbose:
+			for word, tag in zip(words, predict_y):
+				print(word + "\t" + tag)
+
+		return self._tags_to_slots(words, predict_y)
+
+	# スロット値推定の入力（単語の系列とCRFの特徴量）を作成する
+	def _make_slot_features(self, sentence):
+
+		# 品詞・読みは単語分割と同じ解析で取得する
+		if self.crf_feature_extractor is not None:
+			return self.crf_feature_extractor.extract(sentence)
+
 		words = self._parse_input(sentence)
-		predict_y = model.predict([words])[0]
+		return words, words
 
-		for word, tag in zip(words, predict_y):
-			print(word + "\t" + tag)
+	# 推定したタグの系列からスロット値を取り出す
+	def _tags_to_slots(self, words, predict_y):
 
 		# 推定したタグの情報からスロット値を抽出する
 		slot_extracted = {}
@@ -156,7 +268,7 @@ class SluML(object):
 
 if __name__ == '__main__':
 
-	parser = SluML()
+	parser = SluML(verbose=True)
 
 	# 入力データを読み込む
 	with open('./data/slu-sample3.txt', 'r', encoding='utf-8') as f:
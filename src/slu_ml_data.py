@@ -0,0 +1,175 @@
+import os
+import csv
+import json
+import pickle
+import numpy as np
+
+#
+# 機械学習ベースの言語理解で使用するデータの読み込みと特徴量の作成
+# 学習（slu_ml_train.py）・評価（slu_ml_eval.py）・ベンチマークで共通に使用する
+#
+
+# ドメインのラベル
+LABEL_RESTAURANT = 0    # レストラン検索ドメインのラベル
+LABEL_WEATHER = 1       # 天気案内ドメインのラベル
+
+DOMAIN_NAMES = ['restaurant', 'weather']
+
+# アノテーション付きデータのファイル
+FILENAME_RESTAURANT = './data/slu-restaurant-annotated.csv'
+FILENAME_WEATHER = './data/slu-weather-annotated.csv'
+
+# 学習済みWord2vecファイル
+FILENAME_W2V = './data/entity_vector.model.bin'
+
+# アノテーション付きデータ（slu-*-annotated.csv）を読み込む
+# 戻り値は [文, 単語のlist, タグのlist] のlist
+def load_annotated(filename):
+
+	data = []
+	with open(filename, 'r', encoding='utf-8') as f:
+		for row in csv.reader(f):
+			if len(row) < 4:
+				continue
+			data.append([row[1], row[2].split('/'), row[3].split('/')])
+
+	return data
+
+# スロット値推定のデータを読み込む
+# 戻り値はCRFの入力（単語のlist、rich=True なら品詞・読みなどの特徴量のlist）のlistと、タグのlistのlist
+def load_slot_data(filename, rich=False):
+
+	data = load_annotated(filename)
+
+	if rich:
+		from slu_crf_features import CrfFeatureExtractor
+		extractor = CrfFeatureExtractor()
+		x = [extractor.extract_from_words(d[1]) for d in data]
+	else:
+		x = [d[1] for d in data]
+
+	y = [d[2] for d in data]
+
+	return x, y
+
+# ドメイン推定のデータを読み込む
+# 戻り値は単語のlistのlistと、ドメインのラベルのlist
+def load_domain_data():
+
+	words = []
+	labels = []
+
+	for filename, label in [[FILENAME_RESTAURANT, LABEL_RESTAURANT], [FILENAME_WEATHER, LABEL_WEATHER]]:
+		for d in load_annotated(filename):
+			words.append(d[1])
+			labels.append(label)
+
+	return words, labels
+
+# 学習済みWord2vecファイルを読み込む
+def load_w2v(filename=FILENAME_W2V):
+
+	from gensim.models import KeyedVectors
+	return KeyedVectors.load_word2vec_format(filename, binary=True)
+
+# Word2vecで特徴量を作成する
+# ここでは文内の各単語のWord2vecを足し合わせたものを文ベクトルとして利用する
+def make_sentence_vec_with_w2v(words, model_w2v):
+
+	sentence_vec = np.zeros(model_w2v.vector_size)
+	num_valid_word = 0
+	for w in words:
+		if w in model_w2v:
+			sentence_vec += model_w2v[w]
+			num_valid_word += 1
+
+	# 有効な単語数で割る（有効な単語がなければゼロベクトルのまま）
+	if num_valid_word > 0:
+		sentence_vec /= num_valid_word
+	return sentence_vec
+
+# 複数の文の特徴量をまとめて作成する（行列として返す）
+def make_sentence_matrix_with_w2v(list_words, model_w2v):
+
+	x = np.zeros((len(list_words), model_w2v.vector_size))
+	for i, words in enumerate(list_words):
+		x[i] = make_sentence_vec_with_w2v(words, model_w2v)
+
+	return x
+
+#
+# 学習済みモデル（slu_ml_train.py で作成）の保存場所
+# ./data/models/<バージョン>/ 以下にモデルと manifest.json を保存し、
+# 最新のバージョン名を ./data/models/LATEST に書いておく
+#
+
+MODEL_DIR = './data/models'
+
+# バージョンを指定しない場合に使用するモデル（ノートブックで作成したもの）
+DEFAULT_MODEL_FILENAMES = {
+	'domain': './data/slu-domain-svm-word2vec.model',
+	'domain_linear': './data/slu-domain-linear-word2vec.model',
+	'slot_restaurant': './data/slu-slot-restaurant-crf.model',
+	'slot_weather': './data/slu-slot-weather-crf.model',
+	'slot_restaurant_rich': './data/slu-slot-restaurant-crf-rich.model',
+	'slot_weather_rich': './data/slu-slot-weather-crf-rich.model',
+}
+
+# ノートブックで作成されないモデル（slu_ml_train.py でのみ学習される）
+TRAIN_ONLY_MODELS = ['domain_linear', 'slot_restaurant_rich', 'slot_weather_rich']
+
+# 学習済みモデルを読み込む
+# ファイルがなければ、作成方法（学習してバージョンを指定する）を示すエラーとする
+def load_model(filenames, name):
+
+	filename = filenames[name]
+	if not os.path.exists(filename):
+		if name in TRAIN_ONLY_MODELS:
+			raise FileNotFoundError('学習済みモデル [%s] がありません: %s\n'
+				'このモデルは python slu_ml_train.py で学習し、SluML(model_version=\'latest\') のようにバージョンを指定して読み込んでください' % (name, filename))
+		raise FileNotFoundError('学習済みモデル [%s] がありません: %s\n'
+			'ノートブックで学習するか、python slu_ml_train.py で学習して model_version を指定してください' % (name, filename))
+
+	with open(filename, 'rb') as f:
+		return pickle.load(f)
+
+# 最新のバージョン名を返す（なければNone）
+def latest_model_version():
+
+	path = os.path.join(MODEL_DIR, 'LATEST')
+	if not os.path.exists(path):
+		return None
+
+	with open(path, 'r', encoding='utf-8') as f:
+		return f.read().strip()
+
+# 指定したバージョンの manifest を読み込む（'latest' なら最新のバージョン）
+def load_manifest(version):
+
+	if version == 'latest':
+		version = latest_model_version()
+		if version is None:
+			return None
+
+	path = os.path.join(MODEL_DIR, version, 'manifest.json')
+	if not os.path.exists(path):
+		return None
+
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+# 指定したバージョンの各モデルのファイル名を返す
+def model_filenames(version=None):
+
+	if version is None:
+		return dict(DEFAULT_MODEL_FILENAMES)
+
+	manifest = load_manifest(version)
+	if manifest is None:
+		raise ValueError('学習済みモデルが見つかりません: %s' % version)
+
+	filenames = {}
+	for name, info in manifest['models'].items():
+		filenames[name] = os.path.join(MODEL_DIR, manifest['version'], info['filename'])
+
+	return filenames
@@ -0,0 +1,180 @@
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sklearn import svm
+from sklearn.metrics import classification_report
+from sklearn.model_selection import KFold, StratifiedKFold
+
+import sklearn_crfsuite
+from sklearn_crfsuite import metrics
+
+import slu_ml_data
+from slu_domain_linear import LinearDomainClassifier
+
+#
+# 機械学習ベースの言語理解の交差検定を行う
+# 各foldの学習と評価を複数のプロセスで並列に実行する
+#
+# 実行例（src ディレクトリで実行）
+#   python slu_ml_eval.py --task domain domain_linear slot_restaurant slot_weather --folds 5 --workers 4
+#   python slu_ml_eval.py --task slot_restaurant slot_restaurant_rich    # スロット値推定の特徴量の比較
+#
+
+# 各プロセスで共有する（読み込みのみの）データ
+# 特徴量は親プロセスで一度だけ作成し、fork時にコピーせず共有される
+_shared = {}
+
+# 各プロセスの初期化
+def _init_worker(task, x, y):
+
+	_shared['task'] = task
+	_shared['x'] = x
+	_shared['y'] = y
+
+# 1つのfoldの学習と評価を行う
+# 受け取るのはfoldのインデクスのみで、データは共有したものを使用する
+def _run_fold(fold):
+
+	idx_train, idx_test = fold
+	task = _shared['task']
+	x = _shared['x']
+	y = _shared['y']
+
+	# ドメイン推定（Word2vecの文ベクトル＋SVM、または線形モデル）
+	if task in ['domain', 'domain_linear']:
+		if task == 'domain':
+			clf = svm.SVC()
+		else:
+			clf = LinearDomainClassifier()
+
+		time_start = time.perf_counter()
+		clf.fit(x[idx_train], y[idx_train])
+		time_fit = time.perf_counter() - time_start
+
+		time_start = time.perf_counter()
+		predict_y = list(clf.predict(x[idx_test]))
+		time_predict = time.perf_counter() - time_start
+
+		test_y = list(y[idx_test])
+
+	# スロット値推定（CRF）
+	else:
+		clf = sklearn_crfsuite.CRF()
+
+		time_start = time.perf_counter()
+		clf.fit([x[i] for i in idx_train], [y[i] for i in idx_train])
+		time_fit = time.perf_counter() - time_start
+
+		time_start = time.perf_counter()
+		predict_y = clf.predict([x[i] for i in idx_test])
+		time_predict = time.perf_counter() - time_start
+
+		test_y = [y[i] for i in idx_test]
+
+	return test_y, predict_y, time_fit, time_predict
+
+# 評価に使用するデータを読み込み、特徴量を作成する
+def load_task(task, model_w2v=None):
+
+	if task == 'domain':
+		words, labels = slu_ml_data.load_domain_data()
+		x = slu_ml_data.make_sentence_matrix_with_w2v(words, model_w2v)
+		y = np.array(labels)
+
+	elif task == 'domain_linear':
+		words, labels = slu_ml_data.load_domain_data()
+		x = slu_ml_data.make_sentence_matrix_with_w2v(words, model_w2v)
+		x = LinearDomainClassifier().make_features(words, x)
+		y = np.array(labels)
+
+	elif task in ['slot_restaurant', 'slot_restaurant_rich']:
+		x, y = slu_ml_data.load_slot_data(slu_ml_data.FILENAME_RESTAURANT, rich=task.endswith('_rich'))
+
+	elif task in ['slot_weather', 'slot_weather_rich']:
+		x, y = slu_ml_data.load_slot_data(slu_ml_data.FILENAME_WEATHER, rich=task.endswith('_rich'))
+
+	return x, y
+
+# 交差検定を行い、評価結果と処理時間を返す
+def cross_validate(task, x, y, num_folds=5, num_workers=None, seed=0):
+
+	# ドメイン推定はラベルの比率を揃えて分割する
+	if task in ['domain', 'domain_linear']:
+		kfold = StratifiedKFold(n_splits=num_folds, shuffle=True, random_state=seed)
+		folds = list(kfold.split(x, y))
+	else:
+		kfold = KFold(n_splits=num_folds, shuffle=True, random_state=seed)
+		folds = list(kfold.split(x))
+
+	# forkが使える環境では特徴量をコピーせずに共有する
+	if 'fork' in multiprocessing.get_all_start_methods():
+		context = multiprocessing.get_context('fork')
+	else:
+		context = multiprocessing.get_context()
+
+	time_start = time.perf_counter()
+	with ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_init_worker, initargs=(task, x, y)) as executor:
+		fold_results = list(executor.map(_run_fold, folds))
+	time_total = time.perf_counter() - time_start
+
+	test_y = []
+	predict_y = []
+	for r in fold_results:
+		test_y.extend(r[0])
+		predict_y.extend(r[1])
+
+	times = {
+		'total': time_total,
+		'fit': [r[2] for r in fold_results],
+		'predict': [r[3] for r in fold_results],
+	}
+
+	return test_y, predict_y, times
+
+# 評価結果を表示する
+def print_report(task, test_y, predict_y):
+
+	if task in ['domain', 'domain_linear']:
+		print(classification_report(test_y, predict_y, target_names=slu_ml_data.DOMAIN_NAMES))
+	else:
+		labels = sorted(set(label for seq in test_y for label in seq) - set(['O']))
+		print(metrics.flat_classification_report(test_y, predict_y, labels=labels + ['O']))
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='機械学習ベースの言語理解の交差検定')
+	parser.add_argument('--task', nargs='+', choices=['domain', 'domain_linear', 'slot_restaurant', 'slot_weather', 'slot_restaurant_rich', 'slot_weather_rich'], default=['domain', 'domain_linear', 'slot_restaurant', 'slot_weather'])
+	parser.add_argument('--folds', type=int, default=5, help='分割数')
+	parser.add_argument('--workers', type=int, default=None, help='並列に実行するプロセス数（デフォルトはCPU数）')
+	parser.add_argument('--seed', type=int, default=0, help='分割の乱数シード')
+	args = parser.parse_args()
+
+	# Word2vecはドメイン推定のみで使用する
+	model_w2v = None
+	if 'domain' in args.task or 'domain_linear' in args.task:
+		time_start = time.perf_counter()
+		model_w2v = slu_ml_data.load_w2v()
+		print('Word2vecの読み込み : %.2f[sec]' % (time.perf_counter() - time_start))
+
+	for task in args.task:
+
+		print('-----------------------')
+		print('[%s]' % task)
+
+		time_start = time.perf_counter()
+		x, y = load_task(task, model_w2v)
+		time_feature = time.perf_counter() - time_start
+
+		test_y, predict_y, times = cross_validate(task, x, y, args.folds, args.workers, args.seed)
+
+		print_report(task, test_y, predict_y)
+		print('データ数 : %d, 分割数 : %d' % (len(y), args.folds))
+		print('特徴量の作成 : %.2f[sec]' % time_feature)
+		print('交差検定全体 : %.2f[sec]' % times['total'])
+		print('学習（fold毎の平均）: %.3f[sec]' % np.mean(times['fit']))
+		print('予測（fold毎の平均）: %.3f[sec]' % np.mean(times['predict']))
+		print()
@@ -0,0 +1,238 @@
+import os
+import time
+import json
+import pickle
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sklearn import svm
+
+import sklearn_crfsuite
+
+import slu_ml_data
+import slu_crf_features
+from slu_domain_linear import LinearDomainClassifier
+
+#
+# 機械学習ベースの言語理解（SluML）で使用するモデルを学習する
+# ドメイン推定（SVM・線形モデル）とスロット値推定（CRF、単語のみ・品詞や読みも使用）を並列に学習し、バージョン付きで保存する
+#
+# 特徴量はデータのハッシュ値をキーとしてキャッシュし、データが変わったモデルのみ学習し直す
+#
+# 実行例（src ディレクトリで実行）
+#   python slu_ml_train.py            # データが変わったモデルのみ学習
+#   python slu_ml_train.py --force    # 全てのモデルを学習
+#
+# 学習したモデルは SluML(model_version='latest') で読み込む
+#
+
+# 特徴量のキャッシュの保存先
+CACHE_DIR = './data/cache'
+
+# 学習するモデルと、その学習に使用するデータ
+MODELS = {
+	'domain': {
+		'filename': 'slu-domain-svm-word2vec.model',
+		'data': [slu_ml_data.FILENAME_RESTAURANT, slu_ml_data.FILENAME_WEATHER],
+	},
+	'domain_linear': {
+		'filename': 'slu-domain-linear-word2vec.model',
+		'data': [slu_ml_data.FILENAME_RESTAURANT, slu_ml_data.FILENAME_WEATHER],
+	},
+	'slot_restaurant': {
+		'filename': 'slu-slot-restaurant-crf.model',
+		'data': [slu_ml_data.FILENAME_RESTAURANT],
+	},
+	'slot_weather': {
+		'filename': 'slu-slot-weather-crf.model',
+		'data': [slu_ml_data.FILENAME_WEATHER],
+	},
+	'slot_restaurant_rich': {
+		'filename': 'slu-slot-restaurant-crf-rich.model',
+		'data': [slu_ml_data.FILENAME_RESTAURANT],
+	},
+	'slot_weather_rich': {
+		'filename': 'slu-slot-weather-crf-rich.model',
+		'data': [slu_ml_data.FILENAME_WEATHER],
+	},
+}
+
+# 学習データと特徴量の設定からハッシュ値を求める
+# データや設定が変わればハッシュ値も変わる
+def data_hash(name):
+
+	h = hashlib.sha256()
+	h.update(name.encode('utf-8'))
+
+	for filename in MODELS[name]['data']:
+		with open(filename, 'rb') as f:
+			h.update(f.read())
+
+	# ハッシュによるBag-of-Wordsの次元数
+	if name == 'domain_linear':
+		h.update(('%d' % LinearDomainClassifier().num_hash_features).encode('utf-8'))
+
+	# CRFの特徴量の種類
+	if name.endswith('_rich'):
+		h.update(('%d' % slu_crf_features.FEATURE_VERSION).encode('utf-8'))
+
+	# Word2vecのファイルは大きいので、ファイル名・サイズ・更新時刻で代用する
+	if name in ['domain', 'domain_linear']:
+		stat = os.stat(slu_ml_data.FILENAME_W2V)
+		h.update(('%s\t%d\t%d' % (slu_ml_data.FILENAME_W2V, stat.st_size, int(stat.st_mtime))).encode('utf-8'))
+
+	return h.hexdigest()
+
+# キャッシュがあれば読み込み、なければ作成して保存する
+def load_cached(name, key, func):
+
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	path = os.path.join(CACHE_DIR, '%s-%s.pkl' % (name, key[:16]))
+
+	if os.path.exists(path):
+		with open(path, 'rb') as f:
+			return pickle.load(f), True
+
+	value = func()
+	with open(path, 'wb') as f:
+		pickle.dump(value, f)
+
+	return value, False
+
+# 各モデルの学習データ（特徴量とラベル）を作成する
+# ドメイン推定の特徴量はWord2vecの読み込みが必要なため、必要になったときだけ読み込む
+def make_features(name, model_w2v_loader):
+
+	if name == 'domain':
+		words, labels = slu_ml_data.load_domain_data()
+		x = slu_ml_data.make_sentence_matrix_with_w2v(words, model_w2v_loader())
+		y = np.array(labels)
+
+	elif name == 'domain_linear':
+		words, labels = slu_ml_data.load_domain_data()
+		x = slu_ml_data.make_sentence_matrix_with_w2v(words, model_w2v_loader())
+		x = LinearDomainClassifier().make_features(words, x)
+		y = np.array(labels)
+
+	else:
+		x, y = slu_ml_data.load_slot_data(MODELS[name]['data'][0], rich=name.endswith('_rich'))
+
+	return x, y
+
+# モデルを学習する（別プロセスで実行される）
+def fit_model(args):
+
+	name, x, y = args
+
+	time_start = time.perf_counter()
+
+	if name == 'domain':
+		clf = svm.SVC()
+	elif name == 'domain_linear':
+		clf = LinearDomainClassifier()
+	else:
+		clf = sklearn_crfsuite.CRF()
+
+	clf.fit(x, y)
+
+	return name, pickle.dumps(clf), time.perf_counter() - time_start
+
+# データが変わったモデルを学習し、新しいバージョンとして保存する
+# 戻り値は保存したバージョン名（学習し直すモデルがなければNone）
+def train(force=False, num_workers=None):
+
+	previous = slu_ml_data.load_manifest('latest')
+
+	# 学習し直すモデルを決める
+	hashes = {}
+	names_train = []
+	for name in MODELS:
+		hashes[name] = data_hash(name)
+		if force or previous is None or name not in previous['models'] or previous['models'][name]['data_hash'] != hashes[name]:
+			names_train.append(name)
+
+	if len(names_train) == 0:
+		print('学習データに変更はありません（最新のバージョン : %s）' % previous['version'])
+		return None
+
+	# 特徴量を作成（キャッシュがあれば使用）
+	model_w2v = []
+	def model_w2v_loader():
+		if len(model_w2v) == 0:
+			print('Word2vecを読み込みます')
+			model_w2v.append(slu_ml_data.load_w2v())
+		return model_w2v[0]
+
+	jobs = []
+	for name in names_train:
+		time_start = time.perf_counter()
+		(x, y), hit = load_cached(name, hashes[name], lambda: make_features(name, model_w2v_loader))
+		print('特徴量 [%s] : %s %.2f[sec]' % (name, 'キャッシュ' if hit else '作成', time.perf_counter() - time_start))
+		jobs.append((name, x, y))
+
+	# 並列に学習
+	with ProcessPoolExecutor(max_workers=num_workers) as executor:
+		results = list(executor.map(fit_model, jobs))
+
+	# 新しいバージョンとして保存
+	version, dir_version = make_version_dir()
+
+	manifest = {'version': version, 'models': {}}
+
+	for name, model_data, time_fit in results:
+		with open(os.path.join(dir_version, MODELS[name]['filename']), 'wb') as f:
+			f.write(model_data)
+		manifest['models'][name] = {'filename': MODELS[name]['filename'], 'data_hash': hashes[name], 'trained_in': version}
+		print('学習 [%s] : %.2f[sec]' % (name, time_fit))
+
+	# 学習し直していないモデルは以前のバージョンからコピーする
+	for name in MODELS:
+		if name in manifest['models']:
+			continue
+		info = previous['models'][name]
+		shutil.copy2(os.path.join(slu_ml_data.MODEL_DIR, previous['version'], info['filename']), dir_version)
+		manifest['models'][name] = info
+		print('学習 [%s] : 変更なし（%s のモデルを使用）' % (name, info['trained_in']))
+
+	with open(os.path.join(dir_version, 'manifest.json'), 'w', encoding='utf-8') as f:
+		json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+	# 最新のバージョンを更新
+	with open(os.path.join(slu_ml_data.MODEL_DIR, 'LATEST'), 'w', encoding='utf-8') as f:
+		f.write(version)
+
+	return version
+
+# 新しいバージョンのディレクトリを作成し、バージョン名とディレクトリを返す
+# 同じ時刻（秒）に複数の学習が終わった場合は、末尾に番号を付けて重複しないようにする
+# ディレクトリの作成は既にあれば失敗するため、複数のプロセスが同時に作成しても重複しない
+def make_version_dir():
+
+	os.makedirs(slu_ml_data.MODEL_DIR, exist_ok=True)
+
+	base = time.strftime('%Y%m%d-%H%M%S')
+	version = base
+	number = 1
+	while True:
+		dir_version = os.path.join(slu_ml_data.MODEL_DIR, version)
+		try:
+			os.mkdir(dir_version)
+			return version, dir_version
+		except FileExistsError:
+			number += 1
+			version = '%s-%d' % (base, number)
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='機械学習ベースの言語理解のモデルを学習する')
+	parser.add_argument('--force', action='store_true', help='データの変更に関わらず全てのモデルを学習する')
+	parser.add_argument('--workers', type=int, default=None, help='並列に学習するプロセス数')
+	args = parser.parse_args()
+
+	version = train(args.force, args.workers)
+	if version is not None:
+		print('バージョン %s として保存しました' % version)
@@ -2,8 +2,16 @@ from __future__ import division
 
 import re
 
+# 処理時間の計測
+from tracer import tracer
+
+# 入力文の正規化
+from text_normalizer import normalize
+
 #
 # ルールベースの言語理解を行うクラス
+# 入力文は正規化（text_normalizer.py）してから処理する
+# 正規化は何度行っても結果が変わらないため、呼び出し側で正規化済みの文を渡してもよい
 #
 
 class SluRule(object):
@@ -21,6 +29,9 @@ class SluRule(object):
 		self.def_grammar()
 		self.def_frame()
 
+		# まとめて処理する場合に使用するフレームの正規表現
+		self.frame_regexes = [re.compile(frame[1]) for frame in self.frames]
+
 	
 	# 文法を定義
 	def def_grammar(self):
@@ -99,8 +110,11 @@ class SluRule(object):
 	
 	# 入力文に対して文法を用いてパージングする
 	# 戻り値は，マッチした文法の意図名と意図名，スロット名，スロット値のリスト
+	@tracer.trace('slu_rule.parse_grammar')
 	def parse_grammar(self, input_sentence):
 
+		input_sentence = normalize(input_sentence)
+
 		results = []
 		matched_grammer = None
 
@@ -131,7 +145,10 @@ class SluRule(object):
 
 	# 入力文に対して意味・格フレームを用いてパージングする
 	# 戻り値は，マッチしたスロット名とスロット値のリスト
+	@tracer.trace('slu_rule.parse_frame')
 	def parse_frame(self, input_sentence):
+
+		input_sentence = normalize(input_sentence)
 		
 		results = []
 
@@ -149,6 +166,45 @@ class SluRule(object):
 		
 		return results
 
+	# 複数の入力文（音声認識のN-bestなど）に対してまとめて意味・格フレームを用いてパージングする
+	# 戻り値は，入力文毎のマッチしたスロット名とスロット値のリストのリスト（parse_frameと同じ結果）
+	# 入力文を改行でつなげ，各フレームの正規表現での探索を１回にまとめる
+	@tracer.trace('slu_rule.parse_frame_batch')
+	def parse_frame_batch(self, input_sentences):
+
+		input_sentences = [normalize(sentence) for sentence in input_sentences]
+
+		results = [[] for _ in input_sentences]
+
+		# 各入力文の開始位置
+		starts = []
+		pos = 0
+		for sentence in input_sentences:
+			starts.append(pos)
+			pos += len(sentence) + 1
+		text = '\n'.join(input_sentences)
+
+		for frame, regex in zip(self.frames, self.frame_regexes):
+
+			# 入力文毎に最初にマッチしたものを取得・格納
+			idx = 0
+			matched = set()
+			for result in regex.finditer(text):
+
+				while idx + 1 < len(starts) and starts[idx + 1] <= result.start():
+					idx += 1
+
+				if idx in matched:
+					continue
+				matched.add(idx)
+
+				intent = None
+				slot_name = frame[0]
+				slot_value = result.group()
+				results[idx].append({'intent': intent, 'slot_name': slot_name, 'slot_value': slot_value})
+
+		return results
+
 if __name__ == '__main__':
 
 	# 入力データを読み込む
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# 認識結果の正規化
+from text_normalizer import normalize
+
+#
+# 音声認識の途中結果に対して言語理解と対話管理を投機的に実行し、
+# システム応答の音声合成を前もって行っておくクラス
+# 確定結果が投機的に処理した内容と一致すれば、用意しておいた音声をすぐに再生できる
+# 認識結果は正規化（text_normalizer.py）してから言語理解に渡す
+#
+class SpeculativeResponder(object):
+
+	# 言語理解を行う関数（文を受け取りスロットのlistを返す）、対話管理、音声合成のインスタンスを受け取る
+	# 対話管理は内部状態を変更しない peek 関数を持つ必要がある（DmFst, DmFrame）
+	def __init__(self, slu_function, dm, tts):
+
+		self.slu_function = slu_function
+		self.dm = dm
+		self.tts = tts
+
+		# 音声合成はバックグラウンドで１つずつ実行する
+		self.executor = ThreadPoolExecutor(max_workers=1)
+
+		self.reset()
+
+	# 投機的な処理の結果を破棄する
+	def reset(self):
+
+		self.speculated_utterance = None	# 投機的に生成したシステム発話
+		self.future = None					# 投機的な音声合成の処理
+
+	# 音声認識の途中結果を受け取ったときの処理
+	# GoogleStreamingASR の interim_callback として指定する
+	def on_interim(self, sentence):
+
+		# 言語理解の結果が得られなければ何もしない
+		slu_result = self.slu_function(normalize(sentence))
+		if not slu_result:
+			return
+
+		# 対話管理の状態を変更せずにシステム発話を得る
+		system_utterance = self.dm.peek(slu_result)
+		if not system_utterance or system_utterance == self.speculated_utterance:
+			return
+
+		# 以前の投機的な音声合成がまだ始まっていなければ取り消す
+		if self.future is not None:
+			self.future.cancel()
+
+		# 音声合成をバックグラウンドで開始
+		self.speculated_utterance = system_utterance
+
+		# 合成音声はメモリ上に保持するため、通常の音声合成の結果を上書きしない
+		self.future = self.executor.submit(self.tts.generate_audio, system_utterance)
+
+	# 音声認識の確定結果を受け取ったときの処理
+	# 対話管理の状態を更新し、言語理解結果・システム発話・再生する合成音声を返す
+	def on_final(self, sentence, slu_result=None):
+
+		# 早期終了などで言語理解結果が既に得られていれば再利用する
+		if slu_result is None:
+			slu_result = self.slu_function(normalize(sentence))
+
+		system_utterance = self.dm.enter(slu_result)
+
+		# 投機的に生成したシステム発話と一致すれば、合成済みの音声を使用する
+		if self.future is not None and system_utterance == self.speculated_utterance:
+			audio = self.future.result()
+
+		# 一致しなければ投機的な処理は破棄して、改めて音声合成を行う
+		else:
+			if self.future is not None:
+				self.future.cancel()
+			audio = self.tts.generate_audio(system_utterance)
+
+		self.reset()
+
+		return slu_result, system_utterance, audio
+
+if __name__ == '__main__':
+
+	from asr_google_streaming_vad import GoogleStreamingASR, MicrophoneStream
+	from tts_google import GoogleTextToSpeech
+	from dm_frame import DmFrame
+	from slu_rule import SluRule
+
+	# 音声認識クラスのパラメータ
+	RATE = 16000
+	CHUNK = int(RATE / 10)  # 100ms
+
+	tts = GoogleTextToSpeech(audio_encoding='LINEAR16')
+	slu_parser = SluRule()
+	dm = DmFrame()
+
+	responder = SpeculativeResponder(slu_parser.parse_frame, dm, tts)
+
+	# 初期状態の発話
+	system_utterance = dm.utterance_start
+	audio = tts.generate(system_utterance)
+	print("システム： " + system_utterance)
+	tts.play(audio=audio)
+
+	# 全てのフレームが埋まるまで対話を続ける
+	while dm.current_frame_filled == False:
+
+		# 音声認識の途中結果に対して投機的な処理を行う
+		micStream = MicrophoneStream(RATE, CHUNK)
+		asrStream = GoogleStreamingASR(RATE, micStream, interim_callback=responder.on_interim)
+		print('<<<please speak>>>')
+		result_asr = asrStream.get_asr_result()
+
+		if hasattr(result_asr, 'alternatives') == False:
+			print('Invalid ASR input')
+			responder.reset()
+			continue
+
+		result_asr_utterance = result_asr.alternatives[0].transcript
+		print("ユーザ： " + result_asr_utterance)
+
+		# 確定結果で対話管理を更新し、システム応答を再生
+		result_slu, system_utterance, audio = responder.on_final(result_asr_utterance)
+		print(result_slu)
+		print("システム： " + system_utterance)
+		tts.play(audio=audio)
+
+		print()
@@ -0,0 +1,184 @@
+import re
+import unicodedata
+
+#
+# 言語理解・用例ベースの前に行うテキストの正規化
+#
+# 音声認識の結果やテキスト入力では、同じ内容でも全角・半角（「１０００円」「1000円」）、
+# 漢数字（「三千円」）、長音の表記（「ラ－メン」「ラーーメン」）、単語間の空白などが異なる
+# 言語理解（SluRule の正規表現・SluML の学習データ）や用例で表記の揺れを列挙せずに済むよう、
+# 各ユーザ発話に対して１回だけ正規化を行い、以降の処理では正規化した文を使用する
+# 言語理解（SluRule・SluML）は入力文を自身でも正規化するため、正規化していない文を直接渡してもよい
+# （正規化は何度行っても結果が変わらない）
+#
+# ・NFKC（全角英数字・記号を半角に、半角カナを全角に）
+# ・数値の正規化（「3,000円」「三千円」→「3000円」、「一万円」→「1万円」）
+#   地名（「四条」「百万遍」）などを変えないよう、単位（NUMERAL_UNITS）が続く場合のみ変換する
+#   万の位は学習データ（「1万円」）に合わせて「万」のまま残す
+# ・長音の正規化（カナの後のハイフン・ダッシュ類を「ー」に、連続する「ー」を１つに）
+#   NFKCで全角の「～」は「~」になるが、範囲（「1000円～2000円」）などを表すため長音とはせず「〜」にそろえる
+# ・カナの表記の揺れ（KANA_TABLE）
+# ・ひらがなで書かれたカタカナ語（音声認識の結果の「らーめん」など）をカタカナに（KATAKANA_WORDS）
+#   文全体をカタカナにすると助詞なども変わってしまうため、言語理解・用例の語彙にある語のみを変換する
+# ・空白の除去（英数字の単語の間の空白のみ１つ残す）
+#
+# 正規表現や変換表は初期化時に作成しておく
+#
+# 使用例
+#   normalizer = TextNormalizer()
+#   normalizer.normalize('京都駅 周辺で、３０００円くらいのラ－メン')		# '京都駅周辺で、3000円くらいのラーメン'
+#
+
+# 漢数字を変換する単位
+NUMERAL_UNITS = ['円']
+
+# 漢数字とその値
+KANJI_DIGITS = {'〇': 0, '零': 0, '一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+KANJI_POWERS = {'十': 10, '百': 100, '千': 1000}
+
+# 長音として扱う文字（NFKCの後の文字）
+LONG_VOWEL_VARIANTS = '-‐‑‒–—―−'
+
+# 波線として扱う文字（NFKCの後の文字、「〜」にそろえる）
+WAVE_DASH_VARIANTS = '~'
+
+# カナの表記の揺れ（変換前の文字, 変換後の文字）
+KANA_TABLE = [
+	['ゐ', 'い'],
+	['ゑ', 'え'],
+	['ヰ', 'イ'],
+	['ヱ', 'エ'],
+	['ゔ', 'ヴ'],
+]
+
+# ひらがなでも書かれるカタカナ語（SluRule・SluMLの学習データのジャンルなど）
+# 短い語（「アイス」「スイス」など）は他の語の一部と一致しやすいため含めない
+KATAKANA_WORDS = [
+	'ラーメン', 'カレー', 'イタリアン', 'フレンチ', 'レストラン', 'カフェ', 'ケーキ', 'スイーツ',
+	'ステーキ', 'ハンバーグ', 'ハンバーガー', 'バーベキュー', 'ファーストフード', 'ビアガーデン',
+]
+
+# カタカナをひらがなにする（「ー」はそのまま）
+def katakana_to_hiragana(text):
+
+	return ''.join(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c for c in text)
+
+# 漢数字（万の位まで）を数値に変換する
+def kanji_to_number(text):
+
+	total = 0
+
+	for part_index, part in enumerate(text.split('万')):
+
+		value = 0
+		digit = None
+		for c in part:
+			if c in KANJI_DIGITS:
+				digit = (digit or 0) * 10 + KANJI_DIGITS[c]
+			elif c in KANJI_POWERS:
+				value += (digit if digit is not None else 1) * KANJI_POWERS[c]
+				digit = None
+			else:
+				digit = (digit or 0) * 10 + int(c)
+
+		if digit is not None:
+			value += digit
+
+		total = total * 10000 + value if part_index > 0 else value
+
+	return total
+
+class TextNormalizer(object):
+
+	# numeral_units : 漢数字を変換する単位のlist
+	# kana_table : カナの表記の揺れ（変換前の文字, 変換後の文字）のlist
+	# katakana_words : ひらがなで書かれていたらカタカナにする語のlist
+	def __init__(self, numeral_units=NUMERAL_UNITS, kana_table=KANA_TABLE, katakana_words=KATAKANA_WORDS):
+
+		# 数値の桁区切りのカンマ
+		self.re_digit_comma = re.compile(r'(?<=\d),(?=\d{3}(?!\d))')
+
+		# 単位の前の数値（漢数字・算用数字、万の位を含む）
+		units = '|'.join(re.escape(u) for u in numeral_units)
+		numerals = '[0-9%s%s]' % (''.join(KANJI_DIGITS.keys()), ''.join(KANJI_POWERS.keys()))
+		self.re_numeral = re.compile('(%s+(?:万%s*)?)(?=%s)' % (numerals, numerals, units))
+
+		# カナの後の長音
+		self.re_long_vowel = re.compile('(?<=[ぁ-ゖァ-ヺ])[%s]' % re.escape(LONG_VOWEL_VARIANTS))
+		self.re_long_vowels = re.compile('ー{2,}')
+
+		self.wave_dash_table = str.maketrans(dict((c, '〜') for c in WAVE_DASH_VARIANTS))
+
+		self.kana_table = str.maketrans(dict(kana_table))
+
+		# ひらがなで書かれたカタカナ語（長い語から一致させる）
+		self.katakana_words = dict((katakana_to_hiragana(w), w) for w in katakana_words)
+		self.re_katakana_words = None
+		if len(self.katakana_words) > 0:
+			hiragana_words = sorted(self.katakana_words.keys(), key=len, reverse=True)
+			self.re_katakana_words = re.compile('|'.join(re.escape(w) for w in hiragana_words))
+
+		# 空白（英数字の間以外は除く）
+		self.re_space = re.compile(r'\s+')
+		self.re_space_removed = re.compile(r'(?<![A-Za-z0-9]) | (?![A-Za-z0-9])')
+
+	# 数値を正規化する（万の位は「万」のまま残す）
+	def _normalize_numeral(self, match):
+
+		text = match.group(1)
+
+		# 算用数字のみの場合はそのまま（「1000000円」を「100万円」にはしない）
+		if text.isdigit():
+			return text
+
+		value = kanji_to_number(text)
+		man, rest = divmod(value, 10000)
+
+		if man == 0:
+			return str(rest)
+
+		return '%d万%s' % (man, str(rest) if rest > 0 else '')
+
+	# 文を正規化する
+	def normalize(self, text):
+
+		text = unicodedata.normalize('NFKC', text)
+
+		text = self.re_space.sub(' ', text).strip()
+		text = self.re_space_removed.sub('', text)
+
+		text = self.re_digit_comma.sub('', text)
+		text = self.re_numeral.sub(self._normalize_numeral, text)
+
+		text = text.translate(self.wave_dash_table)
+		text = text.translate(self.kana_table)
+		text = self.re_long_vowel.sub('ー', text)
+		text = self.re_long_vowels.sub('ー', text)
+
+		if self.re_katakana_words is not None:
+			text = self.re_katakana_words.sub(lambda m: self.katakana_words[m.group(0)], text)
+
+		return text
+
+# 既定の設定で正規化する
+_default_normalizer = None
+
+def normalize(text):
+
+	global _default_normalizer
+	if _default_normalizer is None:
+		_default_normalizer = TextNormalizer()
+
+	return _default_normalizer.normalize(text)
+
+if __name__ == '__main__':
+
+	from slu_rule import SluRule
+
+	slu_parser = SluRule()
+
+	for sentence in ['３０００円以下で', '三千円以下で', '3,000円 以下で', '一万五千円くらい', '百万遍の 近くの ラ－メン屋', 'ラーーメンがいいです', 'らーめんがいいです', '１０００円～２０００円', '烏丸 御池 で']:
+		normalized = normalize(sentence)
+		print('%s -> %s' % (sentence, normalized))
+		print('  正規化なし : %s' % slu_parser.parse_frame(sentence))
+		print('  正規化あり : %s' % slu_parser.parse_frame(normalized))
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+from collections import deque
+
+#
+# 対話の各処理（音声認識、言語理解、対話管理、音声合成）にかかる時間を計測するクラス
+# ターン毎に各処理の開始・終了時刻（単調増加する時計）を記録し、JSON Lines形式で書き出す
+# 無効のとき（デフォルト）はほとんど処理時間に影響しない
+#
+# 環境変数 SDS_TRACE に出力ファイル名を指定すると有効になり、記録が flush_size 件溜まる度と
+# プログラム終了時にファイルへ追記される
+# 複数のプロセス（対話サーバのワーカなど）で同じファイルに書き込まないよう、ファイル名にはプロセスIDを付ける
+#   SDS_TRACE=trace.jsonl -> trace.12345.jsonl
+#
+# 書き出さずに保持する記録は最新の max_records 件まで（長時間動作させてもメモリを使い続けない）
+#
+class Tracer(object):
+
+	def __init__(self, enabled=False, max_records=100000):
+
+		self.enabled = enabled
+
+		# 記録したデータ（1件ずつ辞書型で保持、古いものから捨てる）
+		self.records = deque(maxlen=max_records)
+
+		# 書き出すファイル（set_output で指定する）
+		self.output = None
+		self.flush_size = 1000
+
+		# ターン番号（スレッド毎に保持し、複数の対話を同時に扱えるようにする）
+		self._local = threading.local()
+		self._turn_counter = 0
+		self._lock = threading.Lock()
+
+	def enable(self):
+		self.enabled = True
+
+	def disable(self):
+		self.enabled = False
+
+	# 記録したデータを消去する
+	def reset(self):
+		self.records.clear()
+
+	# 記録を書き出すファイルを指定する（flush_size 件溜まる度に追記する）
+	def set_output(self, filename, flush_size=1000):
+		self.output = filename
+		self.flush_size = flush_size
+
+	# 書き出すファイル名（拡張子の前にプロセスIDを付ける）
+	def output_filename(self):
+
+		root, ext = os.path.splitext(self.output)
+		return '%s.%d%s' % (root, os.getpid(), ext)
+
+	# 保持している記録をファイルに追記して消去する
+	def flush(self):
+
+		if self.output is None or len(self.records) == 0:
+			return
+
+		with self._lock:
+			records = list(self.records)
+			self.records.clear()
+
+		with open(self.output_filename(), 'a', encoding='utf-8') as f:
+			for r in records:
+				f.write(json.dumps(r, ensure_ascii=False) + '\n')
+
+	# fork した子プロセスでは親プロセスの記録を引き継がない（重複して書き出さないように）
+	def _after_fork(self):
+
+		self._lock = threading.Lock()
+		self.records.clear()
+
+	# 新しいターンを開始し、ターン番号を返す
+	# ユーザの入力を受け付ける度に呼び出す
+	def new_turn(self):
+
+		with self._lock:
+			self._turn_counter += 1
+			turn = self._turn_counter
+
+		self._local.turn = turn
+		return turn
+
+	# 現在のスレッドのターン番号
+	def current_turn(self):
+
+		return getattr(self._local, 'turn', 0)
+
+	# 処理の区間を計測する
+	# with tracer.span('名前'): の形で使用する
+	def span(self, name):
+
+		if not self.enabled:
+			return _NULL_SPAN
+
+		return _Span(self, name)
+
+	# 関数の実行時間を計測するデコレータ
+	def trace(self, name):
+
+		def decorator(func):
+
+			@functools.wraps(func)
+			def wrapper(*args, **kwargs):
+
+				# 無効のときはそのまま実行する
+				if not self.enabled:
+					return func(*args, **kwargs)
+
+				start = time.perf_counter()
+				try:
+					return func(*args, **kwargs)
+				finally:
+					self.record(name, start, time.perf_counter())
+
+			return wrapper
+
+		return decorator
+
+	# 時点（発話区間の終了など）を記録する
+	# 別のスレッド（音声入力のコールバックなど）から呼び出す場合はターン番号を指定する
+	def event(self, name, turn=None):
+
+		if not self.enabled:
+			return
+
+		now = time.perf_counter()
+		self.record(name, now, now, turn)
+
+	# 区間を記録する
+	def record(self, name, start, end, turn=None):
+
+		if turn is None:
+			turn = self.current_turn()
+
+		with self._lock:
+			self.records.append({
+				'turn': turn,
+				'name': name,
+				'start': start,
+				'end': end,
+				'duration': end - start
+			})
+			num_records = len(self.records)
+
+		if self.output is not None and num_records >= self.flush_size:
+			self.flush()
+
+	# JSON Lines形式で書き出す
+	def export_jsonl(self, filename):
+
+		with open(filename, 'w', encoding='utf-8') as f:
+			for r in self.records:
+				f.write(json.dumps(r, ensure_ascii=False) + '\n')
+
+	# 処理毎の時間の分布（ミリ秒）を集計する
+	# ターン全体（ターン内の最初の記録の開始から最後の記録の終了まで）は 'turn' として集計する
+	# 複数のプロセスの記録をまとめる場合は、ジョブ番号 'job' とターン番号の組でターンを区別する
+	def summary(self, records=None):
+
+		if records is None:
+			records = self.records
+
+		durations = {}
+		turns = {}
+		for r in records:
+			durations.setdefault(r['name'], []).append(r['duration'] * 1000.0)
+
+			if r['turn'] > 0:
+				key = (r.get('job', 0), r['turn'])
+				start, end = turns.get(key, (r['start'], r['end']))
+				turns[key] = (min(start, r['start']), max(end, r['end']))
+
+		if len(turns) > 0:
+			durations['turn'] = [(end - start) * 1000.0 for start, end in turns.values()]
+
+		results = {}
+		for name, values in durations.items():
+			values.sort()
+			results[name] = {
+				'count': len(values),
+				'mean': sum(values) / len(values),
+				'p50': percentile(values, 50),
+				'p95': percentile(values, 95),
+				'p99': percentile(values, 99),
+			}
+
+		return results
+
+	# 集計結果を表示する
+	def print_summary(self, records=None):
+
+		results = self.summary(records)
+
+		print('%-32s %8s %10s %10s %10s %10s' % ('name', 'count', 'mean[ms]', 'p50[ms]', 'p95[ms]', 'p99[ms]'))
+		for name in sorted(results.keys()):
+			r = results[name]
+			print('%-32s %8d %10.2f %10.2f %10.2f %10.2f' % (name, r['count'], r['mean'], r['p50'], r['p95'], r['p99']))
+
+#
+# 計測を行う区間
+#
+class _Span(object):
+
+	def __init__(self, tracer, name):
+		self.tracer = tracer
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.tracer.record(self.name, self.start, time.perf_counter())
+		return False
+
+#
+# 無効のときに使用する何もしない区間
+#
+class _NullSpan(object):
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+_NULL_SPAN = _NullSpan()
+
+# ソート済みのリストからパーセンタイル値を求める（最近傍順位法）
+def percentile(sorted_values, p):
+
+	if len(sorted_values) == 0:
+		return 0.0
+
+	idx = max(0, int(-(-len(sorted_values) * p // 100)) - 1)
+	return sorted_values[min(idx, len(sorted_values) - 1)]
+
+# 各モジュールで共有するインスタンス
+tracer = Tracer()
+
+# 環境変数で出力ファイルが指定されていれば有効にする
+if os.environ.get('SDS_TRACE'):
+	tracer.enable()
+	tracer.set_output(os.environ['SDS_TRACE'])
+	atexit.register(tracer.flush)
+
+if hasattr(os, 'register_at_fork'):
+	os.register_at_fork(after_in_child=tracer._after_fork)
+
+if __name__ == '__main__':
+
+	# 書き出したファイルを読み込んで集計結果を表示する
+	# python tracer.py trace.jsonl
+	if len(sys.argv) < 2:
+		print('usage: python tracer.py <trace.jsonl>')
+		sys.exit(1)
+
+	records = []
+	with open(sys.argv[1], 'r', encoding='utf-8') as f:
+		for line in f:
+			if line.strip():
+				records.append(json.loads(line))
+
+	Tracer().print_summary(records)
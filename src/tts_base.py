@@ -0,0 +1,187 @@
+import io
+import re
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+# 処理時間の計測
+from tracer import tracer
+
+#
+# 音声合成を行うクラスの共通部分
+# キャッシュ、分割した音声合成、再生などを扱う
+# 実際の音声合成は継承したクラスの _synthesize 関数で行う（Google Text-to-Speech, ローカルの代替など）
+#
+# 音声データの変換・再生に使用する pydub・pyaudio は必要になった時点で読み込む
+# 音声合成とキャッシュのみ（synthesize）であれば、音声の環境がなくても使用できる
+#
+class TextToSpeechBase(object):
+
+	# cache に TtsCache のインスタンスを指定すると、同じテキスト・パラメータの合成結果を再利用する
+	# audio_encoding に 'LINEAR16' を指定すると、一時ファイルを使用せずにメモリ上で音声データを扱う
+	# max_workers は分割したテキストを並列に音声合成する数
+	def __init__(self, tts_name, pitch=0.0, cache=None, audio_encoding='MP3', max_workers=4):
+
+		# 合成音声のキャッシュ
+		self.cache = cache
+		self.tts_name = tts_name
+		self.pitch = pitch
+		self.audio_encoding = audio_encoding
+
+		# 音声データに影響するパラメータ（キャッシュのキーに使用する）
+		# 継承したクラスで声やサンプリングレートなどを追加する
+		self.audio_params = {'tts_name': tts_name, 'pitch': pitch, 'audio_encoding': audio_encoding}
+
+		# LINEAR16の場合はメモリ上で扱う
+		# 合成音声はインスタンスに保持せず呼び出し側に返す（複数のセッションや投機的な処理で共有できるように）
+		self.in_memory = (audio_encoding == 'LINEAR16')
+
+		# 分割したテキストを並列に音声合成するためのスレッド
+		self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+	# 音声合成を実行して音声データ（audio_encoding の形式）を返す
+	# 継承したクラスで実装する
+	def _synthesize(self, text):
+
+		raise NotImplementedError()
+
+	# 音声合成を行い音声データを返す
+	# キャッシュにあれば音声合成は行わない
+	@tracer.trace('tts.synthesize')
+	def synthesize(self, text):
+
+		if self.cache is not None:
+			key = self.cache.make_key(text, self.audio_params)
+			audio_content = self.cache.get(key)
+			if audio_content is not None:
+				return audio_content
+
+		audio_content = self._synthesize(text)
+
+		if self.cache is not None:
+			self.cache.put(key, audio_content)
+
+		return audio_content
+
+	# 音声合成のデータを再生できる形式（AudioSegment）に変換する
+	def to_audio(self, audio_content):
+
+		from pydub import AudioSegment
+
+		# LINEAR16の場合はWAVのヘッダを読むだけなのでデコードは不要
+		if self.in_memory:
+			with wave.open(io.BytesIO(audio_content), 'rb') as w:
+				return AudioSegment(
+					data = w.readframes(w.getnframes()),
+					sample_width = w.getsampwidth(),
+					frame_rate = w.getframerate(),
+					channels = w.getnchannels()
+				)
+
+		return AudioSegment.from_mp3(io.BytesIO(audio_content))
+
+	# 音声合成を行い、再生できる形式で返す（内部状態は変更しない）
+	def generate_audio(self, text):
+
+		return self.to_audio(self.synthesize(text))
+
+	# 音声合成
+	# メモリ上で扱う場合はファイルには書き出さず、合成音声（AudioSegment）を返す
+	@tracer.trace('tts.generate')
+	def generate(self, text, filename='./data/tts-temp.mp3'):
+
+		if self.in_memory:
+			return self.generate_audio(text)
+
+		audio_content = self.synthesize(text)
+
+		# 合成したデータをmp3ファイルとして書き出し
+		with open(filename, 'wb') as out:
+			out.write(audio_content)
+
+	# 複数の部分に分けられたテキスト（DmFrame.gen_utterance_last_segments など）を音声合成する
+	# 対話の流れからは呼ばれない、明示的に使用する関数（opt-in）
+	# メモリ上で扱う場合は部分毎に音声合成してつなげるため、固定の部分はキャッシュ（tts_warmup.py で事前に作成）
+	# から取得され、スロット値の部分だけ音声合成すればよい
+	# ただし部分の境目で抑揚が途切れるため、応答時間を優先する場合に使用する
+	# mp3の場合は部分毎のデータをつなげるとフレームの境目に無音や雑音が入るため、全体を１つのテキストとして音声合成する
+	@tracer.trace('tts.generate_segments')
+	def generate_segments(self, segments, filename='./data/tts-temp.mp3'):
+
+		# メモリ上で扱う場合は音声データをつなげる
+		if self.in_memory:
+			from pydub import AudioSegment
+
+			audio = AudioSegment.empty()
+			for segment in segments:
+				audio += self.generate_audio(segment)
+			return audio
+
+		return self.generate(''.join(segments), filename)
+
+	# テキストを句読点（。、）の位置で分割する
+	@staticmethod
+	def split_text(text):
+
+		chunks = re.findall(r'.+?[。、]+|.+$', text)
+		if len(chunks) == 0:
+			return [text]
+
+		return chunks
+
+	# テキストを分割して並列に音声合成し、先頭から順番に合成音声を返す
+	# 後ろの部分の音声合成は、前の部分を返している間も続けて行われる
+	def generate_stream(self, text):
+
+		futures = [self._executor.submit(self.generate_audio, chunk) for chunk in self.split_text(text)]
+
+		for future in futures:
+			yield future.result()
+
+	# テキストを分割して音声合成と再生を並行して行う
+	# 最初の部分の音声合成が終われば再生を開始するため、長い発話でも再生開始までの時間が短くなる
+	@tracer.trace('tts.play_stream')
+	def play_stream(self, text):
+
+		# 分割したテキストの音声を順番に再生するために使用
+		import pyaudio
+
+		audio_interface = pyaudio.PyAudio()
+		stream = None
+
+		try:
+			for audio in self.generate_stream(text):
+
+				# 最初の部分の音声の形式で再生を開始する
+				if stream is None:
+					stream = audio_interface.open(
+						format = audio_interface.get_format_from_width(audio.sample_width),
+						channels = audio.channels,
+						rate = audio.frame_rate,
+						output = True
+					)
+
+				# 同じストリームに順番に書き込むことで途切れずに再生される
+				stream.write(audio.raw_data)
+
+		finally:
+			if stream is not None:
+				stream.stop_stream()
+				stream.close()
+			audio_interface.terminate()
+
+	# 合成音声の再生
+	# audio（generate の戻り値）が指定されればそれを再生し、なければファイルを再生する
+	# メモリ上で扱う場合はファイルには書き出さないため、audio の指定が必要
+	@tracer.trace('tts.play')
+	def play(self, filename='./data/tts-temp.mp3', audio=None):
+
+		if audio is None and self.in_memory:
+			raise ValueError('メモリ上で扱う場合は再生する合成音声（generate の戻り値）を指定してください')
+
+		from pydub import AudioSegment
+		from pydub.playback import play
+
+		if audio is None:
+			audio = AudioSegment.from_mp3(filename)
+
+		play(audio)
@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+#
+# 合成音声のキャッシュを行うクラス
+# テキストと音声のパラメータから求めたハッシュ値をキーとして、合成済みの音声データを保持する
+# メモリ上（LRU）とディスク上（容量の上限を超えたら古いものから削除）の２段構成
+#
+class TtsCache(object):
+
+	# キャッシュの保存先と上限を指定する
+	# max_memory_items : メモリ上に保持する音声の数
+	# max_disk_bytes   : ディスク上に保持する音声データの合計サイズ [byte]（Noneならディスクは使用しない）
+	def __init__(self, cache_dir='./data/tts-cache', max_memory_items=128, max_disk_bytes=100 * 1024 * 1024):
+
+		self.cache_dir = cache_dir
+		self.max_memory_items = max_memory_items
+		self.max_disk_bytes = max_disk_bytes
+
+		# メモリ上のキャッシュ（参照された順に末尾へ移動する）
+		self._memory = OrderedDict()
+
+		# 複数のスレッドから同時に使用できるようにする
+		self._lock = threading.Lock()
+
+		# ヒット率の確認用
+		self.num_hit_memory = 0
+		self.num_hit_disk = 0
+		self.num_miss = 0
+
+		# ディスク上のキャッシュの合計サイズ
+		self._disk_bytes = 0
+		if self.max_disk_bytes is not None:
+			os.makedirs(self.cache_dir, exist_ok=True)
+			for name in os.listdir(self.cache_dir):
+				self._disk_bytes += os.path.getsize(os.path.join(self.cache_dir, name))
+
+	# テキストと音声のパラメータからキーを作成する
+	# params には音声データに影響する全てのパラメータ（声・ピッチ・形式・サンプリングレート・言語など）の辞書を指定する
+	@staticmethod
+	def make_key(text, params):
+
+		source = text + '\t' + json.dumps(params, sort_keys=True)
+		return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+	# キーに対応する音声データを取得する（なければNone）
+	def get(self, key):
+
+		with self._lock:
+
+			# メモリ上にあればそのまま返す
+			if key in self._memory:
+				self._memory.move_to_end(key)
+				self.num_hit_memory += 1
+				return self._memory[key]
+
+			# ディスク上にあればメモリ上にも保持する
+			if self.max_disk_bytes is not None:
+				path = self._path(key)
+				if os.path.exists(path):
+					with open(path, 'rb') as f:
+						data = f.read()
+
+					# 最近参照されたことを記録（削除の順番に使用する）
+					os.utime(path)
+
+					self._put_memory(key, data)
+					self.num_hit_disk += 1
+					return data
+
+			self.num_miss += 1
+			return None
+
+	# 音声データをキャッシュに追加する
+	def put(self, key, data):
+
+		with self._lock:
+
+			self._put_memory(key, data)
+
+			if self.max_disk_bytes is None:
+				return
+
+			path = self._path(key)
+			if os.path.exists(path):
+				return
+
+			# 書き込み途中のファイルを読み込まないように一時ファイルを経由する
+			path_tmp = '%s.%d.tmp' % (path, threading.get_ident())
+			with open(path_tmp, 'wb') as f:
+				f.write(data)
+			os.replace(path_tmp, path)
+
+			self._disk_bytes += len(data)
+			self._evict_disk()
+
+	# ヒット率を返す
+	def hit_rate(self):
+
+		num_total = self.num_hit_memory + self.num_hit_disk + self.num_miss
+		if num_total == 0:
+			return 0.0
+
+		return (self.num_hit_memory + self.num_hit_disk) / num_total
+
+	# メモリ上のキャッシュに追加し、上限を超えたら最も古いものを削除
+	def _put_memory(self, key, data):
+
+		self._memory[key] = data
+		self._memory.move_to_end(key)
+
+		while len(self._memory) > self.max_memory_items:
+			self._memory.popitem(last=False)
+
+	# ディスク上のキャッシュが上限を超えたら、最後に参照された時刻が古いものから削除
+	def _evict_disk(self):
+
+		if self._disk_bytes <= self.max_disk_bytes:
+			return
+
+		files = []
+		for name in os.listdir(self.cache_dir):
+			path = os.path.join(self.cache_dir, name)
+			stat = os.stat(path)
+			files.append([stat.st_mtime, stat.st_size, path])
+		files.sort()
+
+		for mtime, size, path in files:
+			if self._disk_bytes <= self.max_disk_bytes:
+				break
+			os.remove(path)
+			self._disk_bytes -= size
+
+	# キーに対応するファイルのパス
+	def _path(self, key):
+
+		return os.path.join(self.cache_dir, key)
@@ -1,16 +1,24 @@
 import os
 from google.cloud import texttospeech
 
-from pydub import AudioSegment
-from pydub.playback import play
+from tts_base import TextToSpeechBase
 
 #
 # Google Text-to-Speechを用いて音声合成を行うクラス
+# キャッシュや再生などの共通部分は TextToSpeechBase を参照
 #
-class GoogleTextToSpeech(object):
+class GoogleTextToSpeech(TextToSpeechBase):
 
-	def __init__(self, path_key='./google-credentials.json', language_code='ja-JP', tts_name='ja-JP-Wavenet-C', pitch=0.0):
+	# cache に TtsCache のインスタンスを指定すると、同じテキスト・パラメータの合成結果を再利用する
+	# audio_encoding に 'LINEAR16' を指定すると、一時ファイルを使用せずにメモリ上で音声データを扱う
+	# max_workers は分割したテキストを並列に音声合成する数
+	def __init__(self, path_key='./google-credentials.json', language_code='ja-JP', tts_name='ja-JP-Wavenet-C', pitch=0.0, cache=None,
+		audio_encoding='MP3', sample_rate=24000, max_workers=4):
 		
+		super(GoogleTextToSpeech, self).__init__(tts_name, pitch=pitch, cache=cache, audio_encoding=audio_encoding, max_workers=max_workers)
+
+		self.audio_params.update({'language_code': language_code, 'sample_rate': sample_rate})
+
 		# APIのパラメータ
 		os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = path_key
 
@@ -25,28 +33,29 @@ class GoogleTextToSpeech(object):
 
 		# 音声の設定
 		self._audio_config = texttospeech.AudioConfig(
-			audio_encoding = texttospeech.AudioEncoding.MP3,
+			audio_encoding = texttospeech.AudioEncoding[audio_encoding],
+			sample_rate_hertz = sample_rate,
 			pitch = pitch
 		)
 	
-	# 音声合成
-	def generate(self, text, filename='./data/tts-temp.mp3'):
+	# 音声合成を実行
+	def _synthesize(self, text):
 
-		# 音声合成を実行
 		synthesis_input = texttospeech.SynthesisInput(text=text)
 		response = self._client.synthesize_speech(input=synthesis_input, voice=self._voice, audio_config=self._audio_config)
 
-		# 合成したデータをmp3ファイルとして書き出し
-		with open(filename, 'wb') as out:
-			out.write(response.audio_content)
-
-	# 合成音声の再生
-	def play(self, filename='./data/tts-temp.mp3'):
-		audio_data = AudioSegment.from_mp3(filename)
-		play(audio_data)
+		return response.audio_content
 
 if __name__ == '__main__':
 	
 	tts = GoogleTextToSpeech()
 	tts.generate('京都大学へようこそ。')
 	tts.play()
+
+	# 一時ファイルを使用しない場合
+	tts = GoogleTextToSpeech(audio_encoding='LINEAR16')
+	audio = tts.generate('京都大学へようこそ。')
+	tts.play(audio=audio)
+
+	# 長い発話を分割して音声合成しながら再生する場合
+	tts.play_stream('地域は京都駅周辺で、ジャンルは和食、予算は3000円以下ですね。検索します。')
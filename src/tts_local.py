@@ -0,0 +1,82 @@
+import io
+import time
+import wave
+import zlib
+import numpy as np
+
+from tts_base import TextToSpeechBase
+
+#
+# ネットワークや認証キーなしで動作する音声合成の代替クラス
+# テキストの長さに比例した長さの音（正弦波と無音）を生成する
+# 同じテキストからは常に同じ音声データが生成されるため、キャッシュや再生、対話全体の性能評価に使用できる
+#
+class LocalTextToSpeech(TextToSpeechBase):
+
+	# sample_rate       : 生成する音声のサンプリングレート
+	# seconds_per_char  : 1文字あたりの音声の長さ [sec]
+	# latency           : 1回の音声合成にかかる時間として待つ時間 [sec]（クラウドの遅延を模擬する）
+	# latency_per_char  : 1文字あたりに追加で待つ時間 [sec]
+	def __init__(self, tts_name='local-tone', pitch=0.0, cache=None, sample_rate=24000, seconds_per_char=0.12,
+		latency=0.0, latency_per_char=0.0, max_workers=4):
+
+		# 生成する音声は常にLINEAR16（メモリ上で扱う）
+		super(LocalTextToSpeech, self).__init__(tts_name, pitch=pitch, cache=cache, audio_encoding='LINEAR16', max_workers=max_workers)
+
+		self.sample_rate = sample_rate
+		self.seconds_per_char = seconds_per_char
+		self.audio_params.update({'sample_rate': sample_rate, 'seconds_per_char': seconds_per_char})
+		self.latency = latency
+		self.latency_per_char = latency_per_char
+
+		# 音声合成を行った回数（キャッシュの効果の確認用）
+		self.num_synthesize = 0
+
+	# 音声合成の代わりに音を生成し、WAV形式のデータを返す
+	def _synthesize(self, text):
+
+		self.num_synthesize += 1
+
+		# 音声合成の遅延を模擬する
+		wait = self.latency + self.latency_per_char * len(text)
+		if wait > 0.0:
+			time.sleep(wait)
+
+		# 周波数はテキストから決める（同じテキストなら同じ音になる）
+		freq = 220.0 + zlib.crc32(text.encode('utf-8')) % 440
+		freq *= 2.0 ** (self.pitch / 12.0)
+
+		# 文字ごとに音を鳴らし、句読点は無音とする
+		num_samples_per_char = int(self.sample_rate * self.seconds_per_char)
+		t = np.arange(num_samples_per_char) / self.sample_rate
+		tone = (np.sin(2.0 * np.pi * freq * t) * 8000).astype(np.int16)
+		silence = np.zeros(num_samples_per_char, dtype=np.int16)
+
+		samples = [silence if c in '。、 　' else tone for c in text]
+		if len(samples) == 0:
+			samples = [silence]
+
+		out = io.BytesIO()
+		with wave.open(out, 'wb') as w:
+			w.setnchannels(1)
+			w.setsampwidth(2)
+			w.setframerate(self.sample_rate)
+			w.writeframes(np.concatenate(samples).tobytes())
+
+		return out.getvalue()
+
+if __name__ == '__main__':
+
+	from tts_cache import TtsCache
+
+	# ディスクは使用せずメモリ上のみキャッシュする
+	tts = LocalTextToSpeech(cache=TtsCache(max_disk_bytes=None), latency=0.2)
+
+	text = '地域は京都駅周辺で、ジャンルは和食、予算は3000円以下ですね。検索します。'
+
+	for i in range(3):
+		time_start = time.monotonic()
+		audio = tts.generate(text)
+		print('%d回目 : %.3f[sec] 音声の長さ %.2f[sec]' % (i + 1, time.monotonic() - time_start, audio.duration_seconds))
+
+	print('音声合成の回数 = %d, キャッシュのヒット率 = %.2f' % (tts.num_synthesize, tts.cache.hit_rate()))
@@ -0,0 +1,92 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+#
+# 対話管理で使用するシステム発話を事前に音声合成し、キャッシュに保存しておく
+# 起動時に実行しておくことで、対話中（特に最初のターン）の音声合成の待ち時間をなくす
+#
+# キャッシュのキーには声・ピッチ・形式・サンプリングレートなどが含まれるため、
+# 対話中に使用する音声合成と同じパラメータ（--encoding・--voice・--pitch・--sample-rate）を指定する
+# 実行例（speculative_response.py・audio_player.py と同じ LINEAR16 の場合）
+#   python tts_warmup.py --dm frame --encoding LINEAR16 --split
+#
+
+# 対話管理のインスタンスから、事前に分かっているシステム発話を全て取り出す
+# segments : 最後の発話の固定の部分も含めるかどうか（部分毎に音声合成する LINEAR16 の場合のみ使用される）
+# split : 句読点で分割した部分も含めるかどうか（play_stream・generate_stream は分割して音声合成する）
+def collect_prompts(dm, segments=False, split=False):
+
+	texts = []
+
+	# 有限オートマトン（DmFst）：各状態のシステム発話
+	if hasattr(dm, 'states'):
+		for state_ in dm.states:
+			texts.append(state_[1])
+
+	# フレーム（DmFrame）：最初の発話と不足している項目を尋ねる発話
+	if hasattr(dm, 'utterance_start'):
+		texts.append(dm.utterance_start)
+
+	if hasattr(dm, 'utterances'):
+		texts.extend(dm.utterances.values())
+
+	# フレーム（DmFrame）：最後の発話の固定の部分
+	# 最後の発話を generate_segments で音声合成する場合に使用される
+	# mp3の場合は generate_segments でも全体を１つのテキストとして音声合成するため使用されない
+	if segments and hasattr(dm, 'utterances_last'):
+		for template in dm.utterances_last.values():
+			for segment in template:
+				if not segment.startswith('$'):
+					texts.append(segment)
+
+	if split:
+		from tts_base import TextToSpeechBase
+		texts = texts + [chunk for text in texts for chunk in TextToSpeechBase.split_text(text)]
+
+	# 重複を除く（順番は保持）
+	return list(dict.fromkeys(texts))
+
+# 複数のテキストを並列に音声合成してキャッシュに保存する
+# 音声合成のインスタンスにはキャッシュが設定されている必要がある
+def warmup(tts, texts, max_workers=8):
+
+	if tts.cache is None:
+		raise ValueError('音声合成のキャッシュが設定されていません')
+
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		for text, audio_content in zip(texts, executor.map(tts.synthesize, texts)):
+			print('%6d bytes : %s' % (len(audio_content), text))
+
+if __name__ == '__main__':
+
+	from tts_google import GoogleTextToSpeech
+	from tts_cache import TtsCache
+
+	parser = argparse.ArgumentParser(description='システム発話を事前に音声合成してキャッシュに保存する')
+	parser.add_argument('--dm', choices=['fst', 'fst_weather', 'frame'], default='fst', help='対話管理の種類')
+	parser.add_argument('--workers', type=int, default=8, help='並列に実行する音声合成の数')
+	parser.add_argument('--encoding', choices=['MP3', 'LINEAR16'], default='LINEAR16', help='音声の形式（対話中の音声合成と同じもの）')
+	parser.add_argument('--voice', default='ja-JP-Wavenet-C', help='声の名前')
+	parser.add_argument('--language', default='ja-JP', help='言語')
+	parser.add_argument('--pitch', type=float, default=0.0, help='ピッチ')
+	parser.add_argument('--sample-rate', type=int, default=24000, help='サンプリングレート')
+	parser.add_argument('--split', action='store_true', help='句読点で分割した部分も音声合成する（play_stream を使用する場合）')
+	args = parser.parse_args()
+
+	# 対話管理の初期化
+	if args.dm == 'fst':
+		from dm_fst import DmFst
+		dm = DmFst()
+	elif args.dm == 'fst_weather':
+		from dm_fst_weather import DmFst
+		dm = DmFst()
+	elif args.dm == 'frame':
+		from dm_frame import DmFrame
+		dm = DmFrame()
+
+	tts = GoogleTextToSpeech(language_code=args.language, tts_name=args.voice, pitch=args.pitch, cache=TtsCache(),
+		audio_encoding=args.encoding, sample_rate=args.sample_rate)
+
+	texts = collect_prompts(dm, segments=(args.encoding == 'LINEAR16'), split=args.split)
+	print('事前に音声合成する発話の数 = %d' % len(texts))
+	warmup(tts, texts, max_workers=args.workers)